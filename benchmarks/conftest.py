@@ -0,0 +1,160 @@
+"""Fixtures for the Elisa Kotiakku microbenchmarks.
+
+The benchmarks use pytest-benchmark for timing (ops/sec) and tracemalloc for
+the memory one call allocates. Allocations are machine independent enough to
+be checked against benchmarks/allocations.json on every run; timings are
+compared against a baseline saved on the same machine, see README.md.
+"""
+import json
+import re
+import tracemalloc
+from datetime import timedelta
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+from pytest_homeassistant_custom_component.common import MockConfigEntry
+
+from homeassistant.util import dt as dt_util
+
+from custom_components.elisa_kotiakku.const import DOMAIN
+from custom_components.elisa_kotiakku.fetcher import async_get_fetch_scheduler
+
+BENCHMARK_DIR = Path(__file__).parent
+ALLOCATION_BASELINE = BENCHMARK_DIR / "allocations.json"
+
+# A benchmark fails when one call allocates this much more than the baseline
+ALLOCATION_TOLERANCE = 1.25
+ALLOCATION_SLACK = 2048
+
+URL = "http://127.0.0.1:8000/api/public/measurements"
+
+_measured_allocations = {}
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--update-allocations",
+        action="store_true",
+        default=False,
+        help="Store the measured allocations as the new baseline",
+    )
+
+
+def pytest_sessionfinish(session):
+    if session.config.getoption("--update-allocations") and _measured_allocations:
+        baseline = {}
+        if ALLOCATION_BASELINE.exists():
+            baseline = json.loads(ALLOCATION_BASELINE.read_text())
+        baseline.update(_measured_allocations)
+        ALLOCATION_BASELINE.write_text(json.dumps(dict(sorted(baseline.items())), indent=2) + "\n")
+
+
+@pytest.fixture(autouse=True)
+def auto_enable_custom_integrations(enable_custom_integrations):
+    """Enable custom integrations for all benchmarks."""
+    yield
+
+
+def load_payload(name="measurements.json"):
+    """Return a recorded API response."""
+    return json.loads((BENCHMARK_DIR / "payloads" / name).read_text())
+
+
+def shifted_payload(payload, periods):
+    """Return the payload moved 'periods' five-minute periods forward in time.
+
+    Every benchmark round gets measurements newer than the last one, so the
+    full update path runs instead of the unchanged-period shortcut.
+    """
+    shift = timedelta(minutes=5 * periods)
+    result = []
+    for item in payload:
+        item = dict(item)
+        for key in ("period_start", "period_end"):
+            if key in item:
+                item[key] = (dt_util.parse_datetime(item[key]) + shift).isoformat()
+        result.append(item)
+    return result
+
+
+class PayloadSequence:
+    """Hands out the recorded payload, one period later on every call."""
+
+    def __init__(self, payload=None):
+        self.payload = payload or load_payload()
+        self.round = 0
+
+    def next(self):
+        self.round += 1
+        return shifted_payload(self.payload, self.round)
+
+
+@pytest.fixture
+def payloads():
+    return PayloadSequence()
+
+
+@pytest.fixture
+def setup_entries(hass):
+    """Return a function that sets up N config entries sharing one URL and key."""
+
+    def setup(count, payload):
+        entries = []
+        scheduler = async_get_fetch_scheduler(hass)
+        with patch.object(scheduler, "_async_request", return_value=(payload, True)):
+            for index in range(count):
+                entry = MockConfigEntry(
+                    domain=DOMAIN,
+                    title=f"Kotiakku {index}",
+                    data={"name": f"Kotiakku {index}", "url": URL, "api_key": "bench_key"},
+                    entry_id=f"bench_{index}",
+                )
+                entry.add_to_hass(hass)
+                hass.loop.run_until_complete(hass.config_entries.async_setup(entry.entry_id))
+                entries.append(entry)
+            hass.loop.run_until_complete(hass.async_block_till_done())
+        return [hass.data[DOMAIN][entry.entry_id] for entry in entries]
+
+    return setup
+
+
+@pytest.fixture
+def measure(benchmark, request):
+    """Benchmark a callable, then record and check what one call allocates.
+
+    With 'setup', every round calls setup() first (untimed) and passes its
+    (args, kwargs) to the callable.
+    """
+
+    def run(func, setup=None, rounds=200):
+        if setup is None:
+            benchmark(func)
+            args, kwargs = (), {}
+        else:
+            benchmark.pedantic(func, setup=setup, rounds=rounds, warmup_rounds=5)
+            args, kwargs = setup()
+
+        tracemalloc.start()
+        try:
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            func(*args, **kwargs)
+            allocated = tracemalloc.get_traced_memory()[1] - before
+        finally:
+            tracemalloc.stop()
+
+        name = re.sub(r"^test_", "", request.node.name)
+        benchmark.extra_info["allocated_bytes"] = allocated
+        _measured_allocations[name] = allocated
+
+        if request.config.getoption("--update-allocations") or not ALLOCATION_BASELINE.exists():
+            return
+        baseline = json.loads(ALLOCATION_BASELINE.read_text()).get(name)
+        if baseline is not None:
+            limit = baseline * ALLOCATION_TOLERANCE + ALLOCATION_SLACK
+            assert allocated <= limit, (
+                f"{name} allocates {allocated} bytes per call, baseline {baseline}"
+            )
+
+    return run
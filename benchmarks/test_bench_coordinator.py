@@ -0,0 +1,36 @@
+"""Benchmarks for the coordinator update path."""
+from unittest.mock import patch
+
+from custom_components.elisa_kotiakku.fetcher import async_get_fetch_scheduler
+
+
+def test_update_data(hass, setup_entries, payloads, measure):
+    """_async_update_data: parse the recorded list and derive the newest period."""
+    coordinator = setup_entries(1, payloads.payload)[0]
+    scheduler = async_get_fetch_scheduler(hass)
+    current = {}
+
+    async def fetch(coordinator, jitter=False):
+        return current["payload"]
+
+    def setup():
+        current["payload"] = payloads.next()
+        return (), {}
+
+    with patch.object(scheduler, "async_fetch", side_effect=fetch):
+        measure(lambda: hass.loop.run_until_complete(coordinator._async_update_data()), setup)
+
+
+def test_process_unchanged_period(hass, setup_entries, payloads, measure):
+    """_process_payload for a poll that returns the period we already have."""
+    coordinator = setup_entries(1, payloads.payload)[0]
+    payload = payloads.payload
+
+    measure(lambda: coordinator._process_payload(payload))
+
+
+def test_calculate_target_time(hass, setup_entries, payloads, measure):
+    """calculate_target_time while charging towards 90 %."""
+    coordinator = setup_entries(1, payloads.payload)[0]
+
+    measure(lambda: coordinator.calculate_target_time(56.9, -2.1, 90, 21.0))
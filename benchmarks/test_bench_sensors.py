@@ -0,0 +1,62 @@
+"""Benchmarks for the sensor entities and the fan-out to many config entries."""
+import pytest
+
+from homeassistant.helpers.entity_platform import DATA_ENTITY_PLATFORM
+
+from custom_components.elisa_kotiakku.const import DOMAIN
+from custom_components.elisa_kotiakku.fetcher import async_get_fetch_scheduler
+
+# One entity of every sensor class
+SENSOR_KEYS = [
+    "solar_power_kw",
+    "solar_energy_kwh",
+    "state_of_charge_percent",
+    "battery_temperature_celsius",
+    "spot_price_cents_per_kwh",
+    "battery_efficiency_ratio",
+    "battery_charge_efficiency",
+    "time_to_90_percent",
+    "net_savings_rate",
+    "battery_cycle_count",
+    "battery_state",
+    "total_savings_eur",
+]
+
+
+def _entity(hass, key):
+    for platform in hass.data[DATA_ENTITY_PLATFORM][DOMAIN]:
+        for entity in platform.entities.values():
+            if entity.key == key:
+                return entity
+    raise LookupError(key)
+
+
+@pytest.mark.parametrize("key", SENSOR_KEYS)
+def test_handle_coordinator_update(hass, setup_entries, payloads, measure, key):
+    """_handle_coordinator_update of one entity, including the state write."""
+    setup_entries(1, payloads.payload)
+    entity = _entity(hass, key)
+
+    measure(entity._handle_coordinator_update)
+
+
+@pytest.mark.parametrize("key", SENSOR_KEYS)
+def test_native_value(hass, setup_entries, payloads, measure, key):
+    """native_value of one entity."""
+    setup_entries(1, payloads.payload)
+    entity = _entity(hass, key)
+
+    measure(lambda: entity.native_value)
+
+
+@pytest.mark.parametrize("entries", [1, 10, 100])
+def test_fan_out(hass, setup_entries, payloads, measure, entries):
+    """A new response handed to every entry polling the same URL and key."""
+    coordinators = setup_entries(entries, payloads.payload)
+    scheduler = async_get_fetch_scheduler(hass)
+    group = (coordinators[0].api_url, coordinators[0].api_key)
+
+    def setup():
+        return (group, payloads.next(), set()), {}
+
+    measure(scheduler._async_fan_out, setup, rounds=20 if entries == 100 else 100)
@@ -4,15 +4,18 @@ This file initializes the integration and manages the DataUpdateCoordinator.
 """
 
 import logging
+import os
 import asyncio
 from datetime import timedelta
 import aiohttp
 
 from homeassistant.core import HomeAssistant
 from homeassistant.config_entries import ConfigEntry
+from homeassistant.helpers.storage import Store
 from homeassistant.helpers.update_coordinator import UpdateFailed
-from .coordinator import KotiakkuDataUpdateCoordinator
-from .const import DOMAIN, PLATFORMS, CONF_API_KEY, CONF_URL, CONF_SCAN_INTERVAL, DEFAULT_SCAN_INTERVAL
+from .coordinator import KotiakkuDataUpdateCoordinator, history_path
+from .fetcher import async_get_fetch_scheduler
+from .const import DOMAIN, PLATFORMS, CONF_API_KEY, CONF_URL, CONF_SCAN_INTERVAL, DEFAULT_SCAN_INTERVAL, STORAGE_VERSION
 
 # Define the logger for this integration using the module name
 _LOGGER = logging.getLogger(__name__)
@@ -24,11 +27,31 @@ async def async_setup_entry(hass, entry):
     coordinator = KotiakkuDataUpdateCoordinator(hass, entry)
     device_slug = entry.data.get("device_slug", "kotiakku")
     
-    # Fetch initial data before finishing setup
-    await coordinator.async_config_entry_first_refresh()
+    # Open the measurement history file, the integration works without it
+    try:
+        await hass.async_add_executor_job(coordinator.history.open)
+    except OSError as err:
+        _LOGGER.warning("Measurement history not available: %s", err)
+
+    # Start from the stored measurement if there is a recent one, and only
+    # wait for the API when there is nothing to show yet
+    if await coordinator.async_restore():
+        coordinator.refresh_task = entry.async_create_background_task(
+            hass, coordinator.async_refresh(), f"{DOMAIN} {entry.entry_id} first refresh"
+        )
+    else:
+        try:
+            await coordinator.async_config_entry_first_refresh()
+        except Exception:
+            await coordinator.history.async_close()
+            raise
     
     hass.data.setdefault(DOMAIN, {})[entry.entry_id] = coordinator
 
+    # Share responses with other entries polling the same URL and API key
+    entry.async_on_unload(async_get_fetch_scheduler(hass).async_subscribe(coordinator))
+    entry.async_on_unload(coordinator.recovery.async_cancel)
+
     # Forwarding to PLATFORMS (currently just ["sensor"])
     await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
     
@@ -48,6 +71,10 @@ async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     if unload_ok:
         # This removes the coordinator from memory
         coordinator = hass.data[DOMAIN].pop(entry.entry_id)
+        # Nothing may change the state or read the history once it is saved and closed
+        await coordinator.async_shutdown()
+        await coordinator.async_save()
+        await coordinator.history.async_close()
         
         # If your coordinator or API client has a close method, call it here:
         # await coordinator.api.async_close_session()
@@ -58,9 +85,20 @@ async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
 
     return unload_ok
 
+async def async_remove_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Delete the stored state and the measurement history file when the entry is removed."""
+    await Store(hass, STORAGE_VERSION, f"{DOMAIN}.{entry.entry_id}").async_remove()
+    path = history_path(hass, entry)
+    if await hass.async_add_executor_job(os.path.exists, path):
+        await hass.async_add_executor_job(os.remove, path)
+
 async def update_listener(hass, entry):
     """
     Handle configuration options updates.
-    Reloads the entire integration when the user saves new settings.
+    Scan interval, battery capacity, power unit, integration method and the
+    tariff are applied in place (the sensors pick up their own settings); anything else
+    reloads the entire integration.
     """
-    await hass.config_entries.async_reload(entry.entry_id)
\ No newline at end of file
+    coordinator = hass.data.get(DOMAIN, {}).get(entry.entry_id)
+    if coordinator is None or not coordinator.async_apply_options():
+        await hass.config_entries.async_reload(entry.entry_id)
\ No newline at end of file
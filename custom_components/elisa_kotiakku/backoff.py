@@ -0,0 +1,200 @@
+"""Backoff, adaptive timeouts and circuit breaking for Elisa Kotiakku.
+
+Failed requests are classified by what went wrong (see KotiakkuFetchError).
+The fetch scheduler keeps one KotiakkuBackoff per (url, api key):
+
+- After a failure the next attempt waits BACKOFF_BASE seconds, doubling with
+  every further failure up to BACKOFF_MAX. Part of the delay is random, so
+  installations that failed together during an outage don't retry together.
+  A Retry-After sent by the server is the minimum delay. Auth failures wait
+  BACKOFF_MAX right away.
+- After BREAKER_THRESHOLD failures in a row the circuit breaker opens:
+  requests are refused without calling the API until the retry time. Then a
+  single trial request is let through (half-open); its success closes the
+  breaker, its failure keeps it open for the next, longer delay.
+- The request timeout follows the observed latency, TIMEOUT_FACTOR times the
+  95th percentile within TIMEOUT_MIN..TIMEOUT_MAX. After a timeout the next
+  attempt gets TIMEOUT_MAX.
+"""
+
+import asyncio
+import random
+from datetime import datetime, timedelta
+from email.utils import parsedate_to_datetime
+
+import aiohttp
+
+from homeassistant.helpers.update_coordinator import UpdateFailed
+from homeassistant.util import dt as dt_util
+
+from .const import (
+    BACKOFF_BASE,
+    BACKOFF_JITTER,
+    BACKOFF_MAX,
+    BREAKER_THRESHOLD,
+    FETCH_TIMEOUT,
+    RETRY_AFTER_MAX,
+    TIMEOUT_FACTOR,
+    TIMEOUT_MAX,
+    TIMEOUT_MIN,
+    TIMEOUT_SAMPLES,
+)
+from .timing import DURATION_BUCKETS, KotiakkuHistogram
+
+# Failure kinds
+ERROR_AUTH = "auth"
+ERROR_RATE_LIMITED = "rate_limited"
+ERROR_SERVER = "server"
+ERROR_CLIENT = "client"
+ERROR_TIMEOUT = "timeout"
+ERROR_NETWORK = "network"
+ERROR_PAYLOAD = "payload"
+ERROR_CIRCUIT_OPEN = "circuit_open"
+ERROR_CANCELLED = "cancelled"  # the shared request was cancelled, nothing failed
+
+BREAKER_CLOSED = "closed"
+BREAKER_OPEN = "open"
+BREAKER_HALF_OPEN = "half_open"
+
+
+class KotiakkuFetchError(UpdateFailed):
+    """A failed request, with its kind and the Retry-After (seconds) of the server."""
+
+    def __init__(self, message, kind, status=None, retry_after=None):
+        super().__init__(message)
+        self.kind = kind
+        self.status = status
+        self.retry_after = retry_after
+
+
+def status_kind(status: int) -> str:
+    """Return the failure kind of an HTTP error status."""
+    if status in (401, 403):
+        return ERROR_AUTH
+    if status == 429:
+        return ERROR_RATE_LIMITED
+    if status >= 500:
+        return ERROR_SERVER
+    return ERROR_CLIENT
+
+
+def classify_exception(err: Exception, timeout: float) -> KotiakkuFetchError:
+    """Return the KotiakkuFetchError for an exception raised by a request."""
+    if isinstance(err, asyncio.TimeoutError):
+        return KotiakkuFetchError(f"No response within {timeout:.0f} s", ERROR_TIMEOUT)
+    if isinstance(err, aiohttp.ClientResponseError):
+        return KotiakkuFetchError(str(err), status_kind(err.status), err.status)
+    if isinstance(err, aiohttp.ClientError):
+        return KotiakkuFetchError(f"Connection failed: {err}", ERROR_NETWORK)
+    return KotiakkuFetchError(f"Invalid response: {err}", ERROR_PAYLOAD)
+
+
+def parse_retry_after(value: str | None, now: datetime) -> float | None:
+    """Return the seconds of a Retry-After header (delay seconds or an HTTP date)."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=dt_util.UTC)
+    return max(0.0, (when - now).total_seconds())
+
+
+class KotiakkuBackoff:
+    """Failure state, retry time and latency of one API endpoint and key."""
+
+    def __init__(self):
+        self.failures = 0  # in a row
+        self.kind = None  # of the last failure
+        self.retry_at: datetime | None = None
+        self.trial = False  # a half-open trial request is in flight
+        self.opened = 0  # times the breaker opened
+        self.latency = KotiakkuHistogram(*DURATION_BUCKETS)
+        self._timed_out = False
+
+    def state(self, now: datetime) -> str:
+        if self.failures < BREAKER_THRESHOLD:
+            return BREAKER_CLOSED
+        if self.trial or now >= self.retry_at:
+            return BREAKER_HALF_OPEN
+        return BREAKER_OPEN
+
+    def check(self, now: datetime) -> bool:
+        """Raise KotiakkuFetchError if the breaker refuses a request now.
+
+        Returns True if the request is the trial of a half-open breaker, which
+        must call end_trial() once it is done.
+        """
+        state = self.state(now)
+        if state == BREAKER_CLOSED:
+            return False
+        if state == BREAKER_OPEN or self.trial:
+            raise KotiakkuFetchError(
+                f"Circuit breaker open after {self.failures} failures ({self.kind}), "
+                f"next try at {self.retry_at.isoformat()}",
+                ERROR_CIRCUIT_OPEN,
+                retry_after=max(0.0, (self.retry_at - now).total_seconds()),
+            )
+        self.trial = True
+        return True
+
+    def end_trial(self) -> None:
+        self.trial = False
+
+    def timeout(self) -> float:
+        """Return the timeout (seconds) for the next request."""
+        if self._timed_out:
+            return TIMEOUT_MAX
+        if self.latency.count < TIMEOUT_SAMPLES:
+            return FETCH_TIMEOUT
+        p95 = self.latency.percentile(0.95) / 1000
+        return min(TIMEOUT_MAX, max(TIMEOUT_MIN, p95 * TIMEOUT_FACTOR))
+
+    def record_success(self, elapsed: float | None = None) -> None:
+        """Record a successful request, taking 'elapsed' (ms) into the latency."""
+        self.failures = 0
+        self.kind = self.retry_at = None
+        self._timed_out = False
+        if elapsed is not None:
+            self.latency.add(elapsed)
+
+    def record_failure(self, err: KotiakkuFetchError, now: datetime) -> None:
+        """Record a failed request and set the time of the next attempt."""
+        self.failures += 1
+        self.kind = err.kind
+        self._timed_out = err.kind == ERROR_TIMEOUT
+        if self.failures == BREAKER_THRESHOLD:
+            self.opened += 1
+
+        if err.kind == ERROR_AUTH:
+            # A wrong key stays wrong, retrying sooner only adds rejected requests
+            delay = BACKOFF_MAX
+        else:
+            delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (self.failures - 1))
+            delay *= 1 - BACKOFF_JITTER * random.random()
+        if err.retry_after is not None:
+            delay = max(delay, min(err.retry_after, RETRY_AFTER_MAX))
+        self.retry_at = now + timedelta(seconds=delay)
+
+    def delay(self, now: datetime) -> timedelta | None:
+        """Return the time until the next attempt is due, None when not failing."""
+        if self.retry_at is None:
+            return None
+        return max(timedelta(0), self.retry_at - now)
+
+    def as_dict(self, now: datetime) -> dict:
+        return {
+            "breaker": self.state(now),
+            "failures": self.failures,
+            "last_error": self.kind,
+            "retry_at": self.retry_at.isoformat() if self.retry_at else None,
+            "breaker_opened": self.opened,
+            "timeout": self.timeout(),
+            "latency": self.latency.as_dict(),
+        }
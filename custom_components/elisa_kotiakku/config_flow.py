@@ -6,6 +6,7 @@ import voluptuous as vol
 from homeassistant import config_entries
 from homeassistant.core import callback
 from homeassistant.helpers.aiohttp_client import async_get_clientsession
+from homeassistant.util.json import json_loads
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -26,10 +27,30 @@ from .const import (
     CONF_BATTERY_CAPACITY,
     DEFAULT_BATTERY_CAPACITY,
     MIN_BATTERY_CAPACITY,
-    MAX_BATTERY_CAPACITY
+    MAX_BATTERY_CAPACITY,
+    CONF_INTEGRATION_METHOD,
+    DEFAULT_INTEGRATION_METHOD,
+    INTEGRATION_LEFT,
+    INTEGRATION_TRAPEZOIDAL,
+    CONF_TARIFF_MARGIN,
+    CONF_TARIFF_TRANSFER_DAY,
+    CONF_TARIFF_TRANSFER_NIGHT,
+    CONF_TARIFF_TAX,
+    CONF_TARIFF_VAT,
+    CONF_TARIFF_DAY_START,
+    CONF_TARIFF_DAY_END,
+    CONF_TARIFF_WEEKEND_NIGHT,
+    DEFAULT_TARIFF_DAY_START,
+    DEFAULT_TARIFF_DAY_END,
 )
+from .fetcher import async_get_fetch_scheduler, async_read_body
 
 async def validate_input(hass, data):
+    """Check the URL and API key; returns an error key, or None if they work.
+
+    The response is handed to the fetch scheduler, so the first update of
+    the new entry doesn't have to fetch it again.
+    """
     session = async_get_clientsession(hass)
     headers = {
         "x-api-key": data[CONF_API_KEY],
@@ -38,12 +59,7 @@ async def validate_input(hass, data):
     
     try:
         async with session.get(data[CONF_URL], headers=headers, timeout=10) as response:
-            # --- DEBUGGING SECTION ---
-            # We read the body regardless of status to see error messages
-            response_text = await response.text()
             _LOGGER.debug("API Response Status: %s", response.status)
-            _LOGGER.debug("API Response Body: %s", response_text)
-            # -------------------------
 
             if response.status == 401:
                 return "invalid_auth"
@@ -51,6 +67,19 @@ async def validate_input(hass, data):
             # If status is 4xx or 5xx, this raises an exception
             response.raise_for_status()
 
+            try:
+                raw_data = json_loads(await async_read_body(response))
+            except ValueError as err:
+                _LOGGER.debug("Validation response not kept for the first update: %s", err)
+            else:
+                async_get_fetch_scheduler(hass).async_seed(
+                    data[CONF_URL],
+                    data[CONF_API_KEY],
+                    raw_data,
+                    response.headers.get("ETag"),
+                    response.headers.get("Last-Modified"),
+                )
+
     except aiohttp.ClientConnectorError as err:
         # This catches DNS or "No route to host" errors
         _LOGGER.error("Connection error: %s", err)
@@ -111,10 +140,17 @@ class ElisaKotiakkuConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
 class ElisaKotiakkuOptionsFlowHandler(config_entries.OptionsFlow):
     """Handle options flow for Elisa Kotiakku."""
 
+    def __init__(self):
+        self._options = {}
+
+    def _current(self, key, default):
+        return self.config_entry.options.get(key, self.config_entry.data.get(key, default))
+
     async def async_step_init(self, user_input=None):
         """Manage the options."""
         if user_input is not None:
-            return self.async_create_entry(title="", data=user_input)
+            self._options.update(user_input)
+            return await self.async_step_tariff()
 
         # We pull the current values so the form is pre-filled
         return self.async_show_form(
@@ -134,5 +170,42 @@ class ElisaKotiakkuOptionsFlowHandler(config_entries.OptionsFlow):
                         self.config_entry.data.get(CONF_SCAN_INTERVAL, DEFAULT_SCAN_INTERVAL)
                     )
                 ): vol.All(vol.Coerce(int), vol.Range(min=MIN_SCAN_INTERVAL)),
+                vol.Optional(
+                    CONF_INTEGRATION_METHOD,
+                    default=self.config_entry.options.get(
+                        CONF_INTEGRATION_METHOD,
+                        self.config_entry.data.get(CONF_INTEGRATION_METHOD, DEFAULT_INTEGRATION_METHOD)
+                    )
+                ): vol.In([INTEGRATION_LEFT, INTEGRATION_TRAPEZOIDAL]),
+                vol.Optional(
+                    CONF_POWER_UNIT,
+                    default=self.config_entry.options.get(
+                        CONF_POWER_UNIT,
+                        self.config_entry.data.get(CONF_POWER_UNIT, DEFAULT_POWER_UNIT)
+                    )
+                ): vol.In([UNIT_W, UNIT_KW]),
+            }),
+        )
+
+    async def async_step_tariff(self, user_input=None):
+        """Manage the electricity tariff the savings are priced with."""
+        if user_input is not None:
+            return self.async_create_entry(title="", data={**self._options, **user_input})
+
+        price = vol.All(vol.Coerce(float), vol.Range(min=0))
+        hour = vol.All(vol.Coerce(int), vol.Range(min=0, max=24))
+        return self.async_show_form(
+            step_id="tariff",
+            data_schema=vol.Schema({
+                vol.Optional(CONF_TARIFF_MARGIN, default=self._current(CONF_TARIFF_MARGIN, 0.0)): price,
+                vol.Optional(CONF_TARIFF_TRANSFER_DAY, default=self._current(CONF_TARIFF_TRANSFER_DAY, 0.0)): price,
+                vol.Optional(CONF_TARIFF_TRANSFER_NIGHT, default=self._current(CONF_TARIFF_TRANSFER_NIGHT, 0.0)): price,
+                vol.Optional(CONF_TARIFF_TAX, default=self._current(CONF_TARIFF_TAX, 0.0)): price,
+                vol.Optional(CONF_TARIFF_VAT, default=self._current(CONF_TARIFF_VAT, 0.0)): vol.All(
+                    vol.Coerce(float), vol.Range(min=0, max=100)
+                ),
+                vol.Optional(CONF_TARIFF_DAY_START, default=self._current(CONF_TARIFF_DAY_START, DEFAULT_TARIFF_DAY_START)): hour,
+                vol.Optional(CONF_TARIFF_DAY_END, default=self._current(CONF_TARIFF_DAY_END, DEFAULT_TARIFF_DAY_END)): hour,
+                vol.Optional(CONF_TARIFF_WEEKEND_NIGHT, default=self._current(CONF_TARIFF_WEEKEND_NIGHT, False)): bool,
             }),
         )
\ No newline at end of file
@@ -43,4 +43,141 @@ MIN_SCAN_INTERVAL = 300
 CONF_BATTERY_CAPACITY = "battery_capacity"
 DEFAULT_BATTERY_CAPACITY = 21.0
 MIN_BATTERY_CAPACITY = 14.0
-MAX_BATTERY_CAPACITY = 42.0
\ No newline at end of file
+MAX_BATTERY_CAPACITY = 42.0
+
+# Electricity tariff (see tariff.py), all prices in c/kWh without VAT
+# The transfer fee is CONF_TARIFF_TRANSFER_DAY from DAY_START to DAY_END (local
+# hours), CONF_TARIFF_TRANSFER_NIGHT otherwise, and all weekend with WEEKEND_NIGHT
+CONF_TARIFF_MARGIN = "tariff_margin"
+CONF_TARIFF_TRANSFER_DAY = "tariff_transfer_day"
+CONF_TARIFF_TRANSFER_NIGHT = "tariff_transfer_night"
+CONF_TARIFF_TAX = "tariff_electricity_tax"
+CONF_TARIFF_VAT = "tariff_vat_percent"
+CONF_TARIFF_DAY_START = "tariff_day_start"
+CONF_TARIFF_DAY_END = "tariff_day_end"
+CONF_TARIFF_WEEKEND_NIGHT = "tariff_weekend_night"
+DEFAULT_TARIFF_DAY_START = 7
+DEFAULT_TARIFF_DAY_END = 22
+
+# Measurement period timestamps in the API response
+# Every item in the measurements list covers one period [period_start, period_end)
+ATTR_PERIOD_START = "period_start"
+ATTR_PERIOD_END = "period_end"
+
+# Energy integration (Riemann sum) rule
+# left: each measurement's power holds until the next period starts
+# trapezoidal: the power changes linearly between two measurements
+CONF_INTEGRATION_METHOD = "integration_method"
+INTEGRATION_LEFT = "left"
+INTEGRATION_TRAPEZOIDAL = "trapezoidal"
+DEFAULT_INTEGRATION_METHOD = INTEGRATION_LEFT
+
+# Longest interval (in seconds) between two measurements that is still integrated
+MAX_INTEGRATION_GAP = 7200
+
+# Shared fetch scheduler (one per Home Assistant instance)
+# MAX_CONCURRENT_FETCHES: requests in flight at once across all config entries
+# FETCH_JITTER: scheduled polls are spread out by a random delay of up to this many seconds
+# FETCH_TIMEOUT: request timeout (seconds) until enough requests have been timed, see below
+# MAX_PAYLOAD_BYTES: responses are read in chunks and refused once larger than this
+# SEED_MAX_AGE: seconds the response read by the config flow may be old to serve the first update
+DATA_FETCH_SCHEDULER = f"{DOMAIN}_fetch_scheduler"
+MAX_CONCURRENT_FETCHES = 4
+FETCH_JITTER = 10
+FETCH_TIMEOUT = 10
+MAX_PAYLOAD_BYTES = 4 * 1024 * 1024
+SEED_MAX_AGE = 60
+
+# Backoff and circuit breaker (per URL and API key)
+# BACKOFF_BASE / BACKOFF_MAX: seconds before the retry after the first failure, doubling up to the
+# max; the coordinator never retries sooner than its scan interval, and auth failures wait the max
+# BACKOFF_JITTER: share of the delay that is randomized
+# RETRY_AFTER_MAX: longest Retry-After (seconds) of the server that is honoured
+# BREAKER_THRESHOLD: failures in a row that open the circuit breaker
+# TIMEOUT_MIN / TIMEOUT_MAX / TIMEOUT_FACTOR: request timeout (seconds), TIMEOUT_FACTOR times the 95th
+# percentile latency once TIMEOUT_SAMPLES requests have been timed, FETCH_TIMEOUT before that
+BACKOFF_BASE = MIN_SCAN_INTERVAL
+BACKOFF_MAX = 1800
+BACKOFF_JITTER = 0.5
+RETRY_AFTER_MAX = 3600
+BREAKER_THRESHOLD = 5
+TIMEOUT_MIN = 5
+TIMEOUT_MAX = 30
+TIMEOUT_FACTOR = 4
+TIMEOUT_SAMPLES = 20
+
+# Adaptive polling
+# PUBLISH_MARGIN: seconds to wait after the expected publish time before polling
+# LATE_RETRY_DELAYS: how much later (seconds) than the poll that missed it a late measurement
+# is looked for, per late poll in a row; the polls stay a scan interval apart
+# POLL_LATENESS: seconds a poll may land after its planned time (jitter, request timeout)
+# and still be on schedule
+PUBLISH_MARGIN = 5
+LATE_RETRY_DELAYS = (15, 30, 60)
+POLL_LATENESS = FETCH_JITTER + TIMEOUT_MAX
+
+
+# Gap recovery
+# RANGE_PARAM_START / RANGE_PARAM_END: query parameters for requesting a time range of measurements
+# RECOVERY_CHUNK: seconds of measurements requested at once
+# MAX_RECOVERY_AGE: seconds back from now that a gap is still recovered
+RANGE_PARAM_START = "start_time"
+RANGE_PARAM_END = "end_time"
+RECOVERY_CHUNK = 86400
+MAX_RECOVERY_AGE = 7 * 86400
+
+
+# Measurement history file
+# HISTORY_DAYS: how many days of measurement periods are kept
+# HISTORY_CAPACITY: records in the ring buffer, sized for one period every DEFAULT_SCAN_INTERVAL
+HISTORY_DAYS = 7
+HISTORY_CAPACITY = HISTORY_DAYS * 86400 // DEFAULT_SCAN_INTERVAL
+
+
+# Power tariff peaks
+# PEAK_HOURS: highest hourly average grid imports kept per month
+PEAK_HOURS = 3
+
+
+# Rolling self-sufficiency and self-consumption
+# RATIO_WINDOWS: window name -> seconds
+# RATIO_WINDOW_SAMPLES: energy total samples kept per window, the window end is that precise
+# RATIO_MIN_ENERGY: kWh of house or solar energy below which a window has no ratio
+RATIO_WINDOWS = {"1h": 3600, "24h": 86400, "7d": 7 * 86400, "30d": 30 * 86400}
+RATIO_WINDOW_SAMPLES = 96
+RATIO_MIN_ENERGY = 0.01
+
+
+# Long-term statistics import
+# STATISTICS_WINDOW: hours kept in hourly buckets, so late periods can still update them
+# STATISTICS_PERIOD: seconds a measurement period covers when the API doesn't send its end
+STATISTICS_WINDOW = MAX_RECOVERY_AGE // 3600
+STATISTICS_PERIOD = DEFAULT_SCAN_INTERVAL
+
+
+# Warm start
+# STORAGE_VERSION: version of the stored coordinator state (last measurement, integrator state)
+# STORAGE_SAVE_DELAY: seconds the state save is delayed, to batch consecutive updates
+# WARM_START_MAX_AGE: seconds a stored measurement may be old to still be shown at startup
+STORAGE_VERSION = 1
+STORAGE_SAVE_DELAY = 60
+WARM_START_MAX_AGE = 6 * 3600
+
+
+# Diagnostics
+# DIAGNOSTIC_CYCLES: update cycles (timings, status, deltas) kept for the diagnostics download
+DIAGNOSTIC_CYCLES = 50
+
+
+# State write deadbands
+# A sensor writes its state only when the value moved further than the deadband
+# of its class from the value it wrote last, or after STATE_HEARTBEAT seconds
+# without a write. Sensors without a deadband write whenever the value changes.
+# Availability changes are always written.
+STATE_HEARTBEAT = 1800
+DEADBAND_POWER = 0.01  # kW
+DEADBAND_ENERGY = 0.01  # kWh
+DEADBAND_TEMPERATURE = 0.2  # °C
+DEADBAND_PERCENT = 0.5  # %, state of charge, efficiencies and self-sufficiency
+DEADBAND_SAVINGS_RATE = 0.005  # €/h
+DEADBAND_SAVINGS = 0.01  # €
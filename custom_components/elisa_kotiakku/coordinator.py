@@ -1,19 +1,41 @@
 """DataUpdateCoordinator for Elisa Kotiakku."""
 
+import asyncio
+import contextlib
+import json
 import logging
+import time
 from datetime import timedelta
 import aiohttp
 
 from homeassistant.util import dt as dt_util
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.helpers import entity_registry as er
 
+from homeassistant.helpers.storage import Store
 from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
-from homeassistant.helpers.aiohttp_client import async_get_clientsession
-from .const import DOMAIN, CONF_API_KEY, CONF_URL, DEFAULT_SCAN_INTERVAL, CONF_POWER_UNIT, DEFAULT_POWER_UNIT, UNIT_W, CONF_BATTERY_CAPACITY, DEFAULT_BATTERY_CAPACITY
+from homeassistant.util import slugify
+from .const import DOMAIN, CONF_API_KEY, CONF_URL, CONF_NAME, DEFAULT_NAME, CONF_SCAN_INTERVAL, DEFAULT_SCAN_INTERVAL, CONF_BATTERY_CAPACITY, DEFAULT_BATTERY_CAPACITY, ATTR_PERIOD_START, ATTR_PERIOD_END, CONF_INTEGRATION_METHOD, DEFAULT_INTEGRATION_METHOD, STORAGE_VERSION, STORAGE_SAVE_DELAY, WARM_START_MAX_AGE
+from .statistics import KotiakkuStatisticsImporter
+from .derivation import DerivationContext, derive, format_target_time, target_minutes
+from .integrator import KotiakkuEnergyIntegrator
+from .measurement import MeasurementRecord, parse_measurements, parse_period_time
+from .fetcher import async_get_fetch_scheduler
+from .history import KotiakkuHistory
+from .meters import KotiakkuPeriodMeters
+from .peaks import KotiakkuPeakTracker
+from .ratios import KotiakkuRollingRatios
+from .polling import KotiakkuPollPlanner
+from .recovery import KotiakkuGapRecovery
+from .tariff import KotiakkuTariff
+from .timing import KotiakkuUpdateTimings
 
 _LOGGER = logging.getLogger(__name__)
 
+def history_path(hass, entry):
+    """Return the path of the measurement history file of a config entry."""
+    return hass.config.path(".storage", f"{DOMAIN}.{entry.entry_id}.history")
+
 class KotiakkuDataUpdateCoordinator(DataUpdateCoordinator):
     """Class to manage fetching data from the Elisa Kotiakku API."""
 
@@ -24,194 +46,351 @@ class KotiakkuDataUpdateCoordinator(DataUpdateCoordinator):
         self.api_url = entry.data[CONF_URL]
         self.api_key = entry.data[CONF_API_KEY]
         self._primed = False
+
+        # Identifies the newest measurement we have processed, see _process_payload
+        self._fingerprint = None
+        self.skipped_updates = 0
+
+        # Phase timings of every update, see timing.py
+        self.timings = KotiakkuUpdateTimings()
+        self.next_poll = None
+
+        # The newest measurement and the integrator state are stored, so the
+        # next start can create the entities without waiting for the API
+        self._store = Store(hass, STORAGE_VERSION, f"{DOMAIN}.{entry.entry_id}")
+        self._measurement = None
+        self._fetched = None
+
+        device_name = entry.title or entry.data.get(CONF_NAME, DEFAULT_NAME)
+        self.statistics = KotiakkuStatisticsImporter(hass, slugify(device_name), device_name)
         
-        self._solar_energy_kwh = 0.0
-        self._solar_to_house_kwh = 0.0
-        self._solar_to_battery_kwh = 0.0
-        self._solar_to_grid_kwh = 0.0
-        self._grid_to_house_kwh = 0.0
-        self._grid_to_battery_kwh = 0.0
-        self._battery_to_house_kwh = 0.0
-        self._battery_to_grid_kwh = 0.0
-        self._house_energy_kwh = 0.0
-        self._total_battery_charge_kwh = 0.0
-        self._total_battery_discharge_kwh = 0.0
-        self._total_grid_import_kwh = 0.0
-        self._total_grid_export_kwh = 0.0
-        self._battery_loss_kwh = 0.0
-        self._last_energy_run = None
+        # One integrator advances every energy and savings total per measurement
+        self.integrator = KotiakkuEnergyIntegrator(
+            method=self._option(CONF_INTEGRATION_METHOD, DEFAULT_INTEGRATION_METHOD)
+        )
         
-        # Pull scan interval from config or use default
-        scan_interval = entry.data.get("scan_interval", DEFAULT_SCAN_INTERVAL)
+        # Prices every period (see tariff.py), compiled again when the options change
+        self.tariff = KotiakkuTariff.from_options(self._option)
+
+        # Hourly average grid import and the month's peak hours
+        self.peaks = KotiakkuPeakTracker()
+
+        # Daily, weekly and monthly meters on the energy totals
+        self.meters = KotiakkuPeriodMeters(self.integrator)
+
+        # Self-sufficiency and self-consumption over rolling windows
+        self.ratios = KotiakkuRollingRatios(self.integrator)
+
+        # Raw measurements of the last days, kept in a ring buffer file
+        self.history = KotiakkuHistory(hass, history_path(hass, entry))
+
+        # Fetches and integrates the measurements of gaps in the data
+        self.recovery = KotiakkuGapRecovery(hass, self)
+
+        # First refresh running in the background after a warm start
+        self.refresh_task: asyncio.Task | None = None
+        
+        # Pull scan interval from the options, then the config, or use default
+        scan_interval = self._option(CONF_SCAN_INTERVAL, DEFAULT_SCAN_INTERVAL)
+
+        # A change to any of these needs a reload, see async_apply_options
+        self._identity = (self.api_url, self.api_key, entry.title)
+
+        # Times each poll just after the API is expected to publish a new period
+        self.poll_planner = KotiakkuPollPlanner(scan_interval)
 
         super().__init__(
             hass,
             _LOGGER,
             name=f"{DOMAIN}_{entry.entry_id}",
             update_interval=timedelta(seconds=scan_interval),
+            # Returning the previous data object for an unchanged payload
+            # then doesn't notify any entity
+            always_update=False,
         )
 
+    async def _async_refresh(self, *args, **kwargs):
+        """Refresh data, timing the whole update from the request to the last entity written."""
+        self.timings.async_begin("poll")
+        totals = self.integrator.snapshot()
+        try:
+            await super()._async_refresh(*args, **kwargs)
+        finally:
+            self._async_finish_cycle(totals)
+            _LOGGER.debug("%s updated in %.1f ms", self.name, self.timings.last_update)
+
+    @callback
+    def _async_finish_cycle(self, totals):
+        """Record what the update did and when the next poll is, then stop timing it."""
+        self.next_poll = dt_util.utcnow() + self.update_interval
+        self.timings.note(deltas=self.integrator.deltas(totals), next_poll=self.next_poll)
+        if not self.last_update_success and self.last_exception is not None:
+            cause = self.last_exception.__cause__
+            self.timings.note(error=str(self.last_exception), error_kind=getattr(cause, "kind", None))
+        self.timings.async_finish()
+
+    @callback
+    def async_update_listeners(self):
+        """Update all registered listeners, timing the fan-out."""
+        started = time.perf_counter()
+        super().async_update_listeners()
+        self.timings.add("fan_out", (time.perf_counter() - started) * 1000)
+
     async def _async_update_data(self):
         """Fetch data from API endpoint.
         
         This is the core method that HA calls automatically based on 
         the update_interval.
         """
-        headers = {
-            "x-api-key": self.api_key,
-            "accept": "application/json"
-        }
-        
         try:
-            # We use the hass-provided helper for aiohttp sessions
-            session = async_get_clientsession(self.hass)
-            
-            async with session.get(self.api_url, headers=headers, timeout=10) as response:
-                if response.status == 401:
-                    raise UpdateFailed("Invalid API Key - Authentication failed")
-                
-                response.raise_for_status()
-                raw_data = await response.json()
-                
-                data = raw_data[0] if isinstance(raw_data, list) and len(raw_data) > 0 else raw_data
-                if not data:
-                    raise UpdateFailed("API returned empty data")
-                
-                power_unit_pref = self.entry.options.get(CONF_POWER_UNIT, self.entry.data.get(CONF_POWER_UNIT, DEFAULT_POWER_UNIT))
-                power_display_multiplier = 1000.0 if power_unit_pref == "W" else 1.0
-                data["power_display_unit"] = power_unit_pref
-                data["power_decimals"] = 0 if power_unit_pref == UNIT_W else 3
-                
-                # Power values
-                power_keys = [
-                    "battery_power_kw", 
-                    "solar_power_kw", 
-                    "grid_power_kw",
-                    "house_power_kw",
-                    "solar_to_house_kw",
-                    "solar_to_battery_kw",
-                    "solar_to_grid_kw",
-                    "grid_to_house_kw",
-                    "grid_to_battery_kw",
-                    "battery_to_house_kw",
-                    "battery_to_grid_kw"
-                ]
-                for key in power_keys:
-                    if key in data:
-                        data[f"{key}_display"] = data[key] * power_display_multiplier 
-                
-                # Power sums
-                data["battery_charge_total_kw"] = data.get("solar_to_battery_kw", 0) + data.get("grid_to_battery_kw", 0)
-                data["battery_charge_total_kw_display"] = data.get("solar_to_battery_kw_display", 0) + data.get("grid_to_battery_kw_display", 0)
-                data["battery_discharge_total_kw"] = data.get("battery_to_house_kw", 0) + data.get("battery_to_grid_kw", 0)
-                data["battery_discharge_total_kw_display"] = data.get("battery_to_house_kw_display", 0) + data.get("battery_to_grid_kw_display", 0)
-                data["total_grid_import_kw"] = data.get("grid_to_house_kw", 0) + data.get("grid_to_battery_kw", 0)
-                data["total_grid_import_kw_display"] = data.get("total_grid_import_kw", 0) * power_display_multiplier 
-                data["total_grid_export_kw"] = data.get("battery_to_grid_kw", 0) + data.get("solar_to_grid_kw", 0)
-                data["total_grid_export_kw_display"] = data.get("total_grid_export_kw", 0) * power_display_multiplier 
-                              
-                # Loss power
-                battery_power = data.get("battery_power_kw", 0)
-                
-                loss = 0
-                if battery_power < 0:
-                    charge_input = data.get("solar_to_battery_kw", 0) + data.get("grid_to_battery_kw", 0)
-                    stored = abs(battery_power)
-                    loss = charge_input - stored
-                elif battery_power > 0:
-                    delivered = data.get("battery_to_house_kw", 0) + data.get("battery_to_grid_kw", 0)
-                    loss = battery_power - delivered
-                
-                data["battery_loss_kw"] = max(loss, 0)
-                data["battery_loss_kw_display"] = data.get("battery_loss_kw", 0) * power_display_multiplier 
-                
-                # Costs
-                price_eur_kwh = data.get("spot_price_cents_per_kwh", 0) / 100
-                data["net_savings_rate"] = (data["battery_discharge_total_kw"] * price_eur_kwh) - (data.get("grid_to_battery_kw", 0) * price_eur_kwh)
-                
-                # Charge efficiency
-                solar = data.get("solar_to_battery_kw", 0)
-                grid = data.get("grid_to_battery_kw", 0)
-                battery_power = data.get("battery_power_kw")
-
-                charge_input = solar + grid
-                stored_power = abs(min(0, float(battery_power)))
-
-                eff = 0
-                if charge_input > 0:
-                    eff = (stored_power / charge_input) * 100
-                    
-                data["battery_charge_efficiency"] = round(min(eff, 100), 1)
-                    
-                # Discharge efficiency
-                house = data.get("battery_to_house_kw", 0)
-                grid = data.get("battery_to_grid_kw", 0)
-                battery_power = data.get("battery_power_kw")
-
-                battery_output = max(0, float(battery_power))
-                delivered = house + grid
-
-                eff = 0
-                if battery_output > 0:
-                    eff = (delivered / battery_output) * 100
-                    
-                data["battery_discharge_efficiency"] = round(min(eff, 100), 1)
-                    
-                # Time-to-target sensors
-                battery_capacity = self.entry.options.get(CONF_BATTERY_CAPACITY, self.entry.data.get(CONF_BATTERY_CAPACITY, DEFAULT_BATTERY_CAPACITY))
-
-                # Time to 90% charge
-                data["time_to_90_percent"] = self.calculate_target_time(
-                    data.get("state_of_charge_percent", 0),
-                    battery_power,
-                    90,
-                    battery_capacity
-                )
-                
-                # Time to 15% discharge
-                data["time_to_15_percent"] = self.calculate_target_time(
-                    data.get("state_of_charge_percent", 0),
-                    battery_power,
-                    15,
-                    battery_capacity
-                )
-    
-                _LOGGER.debug("Kotiakku data received: %s", data)
-
-                return data
+            # Requests go through the shared fetch scheduler, which coalesces
+            # entries with the same URL and key. Only polls after the first
+            # successful one are jittered, so startup gets live data right away.
+            scheduler = async_get_fetch_scheduler(self.hass)
+            raw_data = await scheduler.async_fetch(self, jitter=self._primed)
+            data = self._process_payload(raw_data)
+            self._primed = True
+            return data
 
         except Exception as err:
+            # Retry when the backoff of the API (and key) allows, never sooner
+            # than the scan interval
+            delay = async_get_fetch_scheduler(self.hass).retry_delay(self)
+            self.update_interval = max(delay or timedelta(0), self.poll_planner.scan_interval)
             raise UpdateFailed(f"Error communicating with API: {err}") from err
-        
-    def calculate_target_time(self, current_soc, power_kw, target_soc, battery_capacity):
-        if abs(current_soc - target_soc) < 0.5:
-            return "-"
-
-        if (target_soc > current_soc and power_kw >= 0) or \
-        (target_soc < current_soc and power_kw <= 0):
-            if abs(current_soc - target_soc) < 0.5:
-                return "-"
-            
-        is_charging = power_kw < 0
-        is_discharging = power_kw > 0
-        
-        moving_to_target = (target_soc > current_soc and is_charging) or \
-                        (target_soc < current_soc and is_discharging)
 
-        if not moving_to_target or abs(power_kw) < 0.05:
-            return "-"
+    @callback
+    def async_handle_shared_payload(self, raw_data):
+        """Take in a response that was fetched for another entry with the same URL and key."""
+        if self._shutdown_requested:
+            return
+        self.timings.async_begin("shared")
+        totals = self.integrator.snapshot()
+        try:
+            data = self._process_payload(raw_data)
+        except UpdateFailed as err:
+            _LOGGER.debug("Ignoring shared payload: %s", err)
+            self.timings.note(error=str(err))
+            return
+        else:
+            if data is not self.data:
+                # This also pushes our own next poll back by a full interval
+                self.async_set_updated_data(data)
+        finally:
+            self._async_finish_cycle(totals)
+
+    def _process_payload(self, raw_data):
+        """Turn a decoded API response into the coordinator data."""
+        started = time.perf_counter()
+        try:
+            return self._derive_payload(raw_data)
+        finally:
+            self.timings.add("derive", (time.perf_counter() - started) * 1000)
+
+    def _derive_payload(self, raw_data):
+        # The API returns a list of measurement periods. Every period goes to
+        # long-term statistics, the newest one becomes the current state.
+        measurements, untimed = parse_measurements(raw_data)
+        if measurements:
+            self.statistics.async_add_measurements(measurements)
+            self.history.async_append(measurements)
+        elif not untimed:
+            raise UpdateFailed("API returned empty data")
 
-        target_energy = battery_capacity * (target_soc / 100.0)
-        current_energy = battery_capacity * (current_soc / 100.0)
-        energy_diff = abs(target_energy - current_energy)
+        # Plan the next poll from the publish cadence seen in the timestamps
+        now = dt_util.utcnow()
+        new_data = measurements and self.poll_planner.observe(
+            now,
+            [start for start, _ in measurements],
+            parse_period_time(measurements[-1][1], ATTR_PERIOD_END),
+        )
+        self.update_interval = self.poll_planner.next_interval(now, bool(new_data))
+
+        # The API is reachable again, pick up any gaps that failed to recover
+        self.recovery.async_retry()
+
+        # The API only publishes a new measurement every few minutes. A poll that
+        # returns the same measurement period changes nothing, so hand back the
+        # previous data object and no entity is updated.
+        if measurements:
+            fingerprint = measurements[-1][0]
+        else:
+            fingerprint = hash(json.dumps(untimed[0], sort_keys=True, default=str))
+
+        self.timings.note(period=measurements[-1][0] if measurements else None, skipped=False)
+        if self.data is not None and fingerprint == self._fingerprint:
+            self.skipped_updates += 1
+            self.timings.note(skipped=True)
+            if not measurements:
+                # Keep wall-clock integration exact across the repeated values
+                self.integrator.advance(now, self.data)
+                self.meters.advance(now)
+                self.ratios.advance(now)
+                self.peaks.add(now, self.data.get("total_grid_import_kw"))
+                self.async_schedule_save()
+            return self.data
         
-        hours_remaining = energy_diff / abs(power_kw)
-        if hours_remaining is None or hours_remaining == 0:
-            return "-"
+        # Sums, losses, costs, efficiencies and time-to-target all come
+        # from the derivation table in one pass
+        ctx = self.derivation_context()
+
+        # Each period becomes a compact record; the raw payload (which may be
+        # shared with other entries) is never modified
+        if measurements:
+            last_time = self.integrator.last_time
+            if last_time is None:
+                # The first measurement of this run is the baseline. Whatever
+                # came before it is restored and recovered, not integrated here.
+                measurements = measurements[-1:]
+                resume_from, self.recovery.resume_from = self.recovery.resume_from, None
+                if resume_from is not None and measurements[0][0] > resume_from:
+                    self.recovery.async_add_gap(resume_from, measurements[0][0])
+
+            # Integrate every period we haven't seen yet, at its own timestamp
+            max_step = (self.poll_planner.cadence or self.poll_planner.scan_interval) * 1.5
+            newest = measurements[-1][1]
+            for start, measurement in measurements:
+                if last_time is not None and start <= last_time and measurement is not newest:
+                    continue
+                data = derive(MeasurementRecord.from_raw(start, measurement), ctx)
+
+                # Periods are missing in between, fetch them instead of
+                # stretching the previous measurement over the gap
+                bridge = last_time is None or start - last_time <= max_step
+                if not bridge:
+                    self.recovery.async_add_gap(last_time, start)
+                if self.integrator.advance(start, data, bridge=bridge):
+                    last_time = start
+                    self.meters.advance(start)
+                    self.ratios.advance(start)
+                self.peaks.add(start, data.get("total_grid_import_kw"))
+        else:
+            # Without period timestamps the poll time is the best we have
+            data = derive(MeasurementRecord.from_raw(None, untimed[0]), ctx)
+            self.integrator.advance(now, data)
+            self.meters.advance(now)
+            self.ratios.advance(now)
+            self.peaks.add(now, data.get("total_grid_import_kw"))
+
+        self._fingerprint = fingerprint
+        self._measurement = measurements[-1][1] if measurements else untimed[0]
+        self._fetched = now
+        self.async_schedule_save()
+        return data
+
+    async def async_restore(self) -> bool:
+        """Load the state stored by the previous run.
+
+        The integrator continues from its stored state. Returns True if the
+        stored measurement is recent enough to become the initial data, so the
+        first refresh doesn't have to hold up setup.
+        """
+        stored = await self._store.async_load()
+        if not stored:
+            return False
+
+        if stored.get("integrator") and self.integrator.last_time is None:
+            self.integrator.load(stored["integrator"])
+            self.recovery.async_restore_gaps(
+                [
+                    (dt_util.parse_datetime(start), dt_util.parse_datetime(end))
+                    for start, end in stored.get("gaps", [])
+                ]
+            )
+
+        if stored.get("statistics"):
+            self.statistics.load(stored["statistics"])
+        if stored.get("peaks"):
+            self.peaks.load(stored["peaks"])
+        if stored.get("meters"):
+            self.meters.load(stored["meters"])
+        if stored.get("ratios"):
+            self.ratios.load(stored["ratios"])
+
+        measurement = stored.get("measurement")
+        fetched = dt_util.parse_datetime(stored["fetched"]) if stored.get("fetched") else None
+        if not isinstance(measurement, dict) or fetched is None:
+            return False
+        if (dt_util.utcnow() - fetched).total_seconds() > WARM_START_MAX_AGE:
+            return False
 
-        total_minutes = int(hours_remaining * 60)
-        hours, mins = divmod(total_minutes, 60)
+        start = parse_period_time(measurement, ATTR_PERIOD_START)
+        self.data = derive(MeasurementRecord.from_raw(start, measurement), self.derivation_context())
+        if start is not None:
+            self._fingerprint = start
+        else:
+            self._fingerprint = hash(json.dumps(measurement, sort_keys=True, default=str))
+        self._measurement, self._fetched = measurement, fetched
+        return True
 
-        if hours > 0:
-            return f"{hours}h {mins}m"
-        return f"{mins}m"
+    @callback
+    def async_schedule_save(self):
+        """Store the current state after a short delay."""
+        self._store.async_delay_save(self._state_to_store, STORAGE_SAVE_DELAY)
+
+    async def async_shutdown(self):
+        """Stop polling, the background refresh and gap recovery, so the state no longer changes."""
+        await super().async_shutdown()
+        if self.refresh_task is not None:
+            self.refresh_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self.refresh_task
+        await self.recovery.async_stop()
+
+    async def async_save(self):
+        """Store the current state now, e.g. before the entry is unloaded."""
+        await self._store.async_save(self._state_to_store())
+
+    @callback
+    def _state_to_store(self):
+        return {
+            "fetched": self._fetched.isoformat() if self._fetched else None,
+            "measurement": self._measurement,
+            "integrator": self.integrator.as_dict(),
+            "gaps": [[start.isoformat(), end.isoformat()] for start, end in self.recovery.gaps],
+            "statistics": self.statistics.as_dict(),
+            "peaks": self.peaks.as_dict(),
+            "meters": self.meters.as_dict(),
+            "ratios": self.ratios.as_dict(),
+        }
+
+    def _option(self, key, default):
+        """Return a setting from the entry options, then the entry data, or the default."""
+        return self.entry.options.get(key, self.entry.data.get(key, default))
+
+    @callback
+    def async_apply_options(self) -> bool:
+        """Apply changed settings to the running coordinator.
+
+        The scan interval, the integration method and the tariff take effect
+        from the next poll and period. The current measurement is derived again
+        with the new battery capacity and tariff, without fetching it. Returns False when the URL, the
+        API key or the name changed, which needs a reload instead.
+        """
+        entry = self.entry
+        if (entry.data[CONF_URL], entry.data[CONF_API_KEY], entry.title) != self._identity:
+            return False
+
+        # The poll already scheduled keeps its time
+        self.poll_planner.scan_interval = timedelta(seconds=self._option(CONF_SCAN_INTERVAL, DEFAULT_SCAN_INTERVAL))
+        self.integrator.method = self._option(CONF_INTEGRATION_METHOD, DEFAULT_INTEGRATION_METHOD)
+        self.tariff = KotiakkuTariff.from_options(self._option)
+
+        if self.data is not None and self._measurement is not None:
+            self.timings.async_begin("options")
+            start = parse_period_time(self._measurement, ATTR_PERIOD_START)
+            self.data = derive(MeasurementRecord.from_raw(start, self._measurement), self.derivation_context())
+            self.async_update_listeners()
+            self.timings.async_finish()
+        return True
+
+    def derivation_context(self):
+        """Return the per-entry settings the derivation table depends on."""
+        return DerivationContext(
+            battery_capacity=self._option(CONF_BATTERY_CAPACITY, DEFAULT_BATTERY_CAPACITY),
+            tariff=self.tariff,
+        )
+        
+    def calculate_target_time(self, current_soc, power_kw, target_soc, battery_capacity):
+        """Return the time to reach target_soc as 'Xh Ym' / 'Ym', or '-'."""
+        return format_target_time(target_minutes(current_soc, power_kw, target_soc, battery_capacity))
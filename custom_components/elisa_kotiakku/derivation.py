@@ -0,0 +1,222 @@
+"""Derived measurement fields for Elisa Kotiakku.
+
+Every value the integration computes on top of a raw API measurement is declared
+once in DERIVED_FIELDS. The same table drives two evaluators:
+
+- derive() fills in the derived fields of a single measurement record (live path).
+- derive_columns() evaluates the table over NumPy column arrays, so thousands of
+  historical measurements cost one vectorized pass per field (backfill/replay).
+
+Field functions only use arithmetic operators and the helpers on the `ops`
+argument, which is either the scalar or the NumPy implementation below.
+"""
+
+import math
+from collections import namedtuple
+
+import numpy as np
+
+from .tariff import SPOT_TARIFF
+
+# Per-entry settings the derivations depend on
+DerivationContext = namedtuple("DerivationContext", ["battery_capacity", "tariff"], defaults=[SPOT_TARIFF])
+
+# One row of the derivation table. Results are always numeric, 'formatter'
+# (optional) turns the number into its presentation value when it is read.
+DerivedField = namedtuple("DerivedField", ["key", "func", "formatter"], defaults=[None])
+
+
+class _ScalarOps:
+    """Helpers for evaluating the table on plain floats."""
+
+    nan = math.nan
+    maximum = staticmethod(max)
+    minimum = staticmethod(min)
+    absolute = staticmethod(abs)
+    floor = staticmethod(math.floor)
+
+    @staticmethod
+    def where(condition, if_true, if_false):
+        return if_true if condition else if_false
+
+    @staticmethod
+    def divide(numerator, denominator):
+        """Division that returns 0 instead of failing on a zero denominator."""
+        return numerator / denominator if denominator != 0 else 0.0
+
+    @staticmethod
+    def round(value, decimals):
+        return round(value, decimals)
+
+    @staticmethod
+    def take(table, index):
+        return float(table[int(index)])
+
+
+class _VectorOps:
+    """Helpers for evaluating the table on NumPy column arrays."""
+
+    nan = np.nan
+    maximum = staticmethod(np.maximum)
+    minimum = staticmethod(np.minimum)
+    absolute = staticmethod(np.abs)
+    floor = staticmethod(np.floor)
+    where = staticmethod(np.where)
+    round = staticmethod(np.round)
+
+    @staticmethod
+    def take(table, index):
+        return np.take(table, np.asarray(index, dtype=int))
+
+    @staticmethod
+    def divide(numerator, denominator):
+        """Element-wise division that yields 0 where the denominator is 0."""
+        numerator, denominator = np.broadcast_arrays(
+            np.asarray(numerator, dtype=float), np.asarray(denominator, dtype=float)
+        )
+        out = np.zeros(numerator.shape)
+        np.divide(numerator, denominator, out=out, where=denominator != 0)
+        return out
+
+
+SCALAR_OPS = _ScalarOps()
+VECTOR_OPS = _VectorOps()
+
+
+def target_minutes(current_soc, power_kw, target_soc, battery_capacity, ops=SCALAR_OPS):
+    """Minutes until target_soc is reached at the current power, NaN if never.
+
+    Negative power means charging, positive power means discharging. The
+    battery has to be moving towards the target with at least 50 W.
+    """
+    moving_to_target = ops.where(target_soc > current_soc, power_kw < 0, power_kw > 0)
+    valid = (ops.absolute(current_soc - target_soc) >= 0.5) & moving_to_target & (ops.absolute(power_kw) >= 0.05)
+
+    energy_diff = ops.absolute(battery_capacity * (target_soc / 100.0) - battery_capacity * (current_soc / 100.0))
+    hours_remaining = ops.divide(energy_diff, ops.where(valid, ops.absolute(power_kw), 0))
+    return ops.where(valid, ops.floor(hours_remaining * 60), ops.nan)
+
+
+def format_target_time(minutes):
+    """Format minutes as 'Xh Ym' / 'Ym', or '-' when the target is not reached."""
+    if minutes is None or math.isnan(minutes):
+        return "-"
+
+    hours, mins = divmod(int(minutes), 60)
+    if hours > 0:
+        return f"{hours}h {mins}m"
+    return f"{mins}m"
+
+
+def _battery_loss(v, ops, ctx):
+    """Power lost in the battery: charge input not stored, or output not delivered."""
+    battery_power = v.get("battery_power_kw", 0)
+    charging_loss = v["battery_charge_total_kw"] + battery_power
+    discharging_loss = battery_power - v["battery_discharge_total_kw"]
+    loss = ops.where(battery_power < 0, charging_loss, ops.where(battery_power > 0, discharging_loss, 0))
+    return ops.maximum(loss, 0)
+
+
+def _import_price(v, ops, ctx):
+    """Price (c/kWh) of grid energy in the measurement period, from the tariff table."""
+    return ctx.tariff.import_price(v.get("spot_price_cents_per_kwh", 0), v.get("tariff_slot", 0), ops)
+
+
+def _net_savings_rate(v, ops, ctx):
+    """Value of the battery output minus grid charging cost, in €/h."""
+    import_eur_kwh = v["import_price_cents_per_kwh"] / 100
+    export_eur_kwh = v["export_price_cents_per_kwh"] / 100
+    return (
+        v.get("battery_to_house_kw", 0) * import_eur_kwh
+        + v.get("battery_to_grid_kw", 0) * export_eur_kwh
+        - v.get("grid_to_battery_kw", 0) * import_eur_kwh
+    )
+
+
+def _flow_value(flow, price):
+    """€/h of a power flow at the price of its own measurement period."""
+    def func(v, ops, ctx):
+        return v.get(flow, 0) * v[price] / 100
+    return func
+
+
+def _charge_efficiency(v, ops, ctx):
+    """Share of the charge input that ended up stored in the battery (%)."""
+    charge_input = v["battery_charge_total_kw"]
+    stored = ops.absolute(ops.minimum(v.get("battery_power_kw", 0), 0))
+    eff = ops.where(charge_input > 0, ops.divide(stored, charge_input) * 100, 0)
+    return ops.round(ops.minimum(eff, 100), 1)
+
+
+def _discharge_efficiency(v, ops, ctx):
+    """Share of the battery output that was delivered to house or grid (%)."""
+    battery_output = ops.maximum(v.get("battery_power_kw", 0), 0)
+    eff = ops.where(battery_output > 0, ops.divide(v["battery_discharge_total_kw"], battery_output) * 100, 0)
+    return ops.round(ops.minimum(eff, 100), 1)
+
+
+def _time_to(target_soc):
+    def func(v, ops, ctx):
+        return target_minutes(
+            v.get("state_of_charge_percent", 0),
+            v.get("battery_power_kw", 0),
+            target_soc,
+            ctx.battery_capacity,
+            ops,
+        )
+    return func
+
+
+# The derivation table, evaluated top to bottom. Later rows may use earlier ones.
+DERIVED_FIELDS = (
+    # Power sums
+    DerivedField("battery_charge_total_kw", lambda v, ops, ctx: v.get("solar_to_battery_kw", 0) + v.get("grid_to_battery_kw", 0)),
+    DerivedField("battery_discharge_total_kw", lambda v, ops, ctx: v.get("battery_to_house_kw", 0) + v.get("battery_to_grid_kw", 0)),
+    DerivedField("total_grid_import_kw", lambda v, ops, ctx: v.get("grid_to_house_kw", 0) + v.get("grid_to_battery_kw", 0)),
+    DerivedField("total_grid_export_kw", lambda v, ops, ctx: v.get("battery_to_grid_kw", 0) + v.get("solar_to_grid_kw", 0)),
+    # Loss power
+    DerivedField("battery_loss_kw", _battery_loss),
+    # Prices, grid energy priced by the tariff, exports at the spot price
+    DerivedField("import_price_cents_per_kwh", _import_price),
+    DerivedField("export_price_cents_per_kwh", lambda v, ops, ctx: v.get("spot_price_cents_per_kwh", 0)),
+    # Costs
+    DerivedField("net_savings_rate", _net_savings_rate),
+    DerivedField("grid_to_house_cost_rate", _flow_value("grid_to_house_kw", "import_price_cents_per_kwh")),
+    DerivedField("grid_to_battery_cost_rate", _flow_value("grid_to_battery_kw", "import_price_cents_per_kwh")),
+    DerivedField("battery_to_house_savings_rate", _flow_value("battery_to_house_kw", "import_price_cents_per_kwh")),
+    DerivedField("solar_to_grid_value_rate", _flow_value("solar_to_grid_kw", "export_price_cents_per_kwh")),
+    # Efficiencies
+    DerivedField("battery_charge_efficiency", _charge_efficiency),
+    DerivedField("battery_discharge_efficiency", _discharge_efficiency),
+    # Time-to-target (minutes, presented as text)
+    DerivedField("time_to_90_percent", _time_to(90), format_target_time),
+    DerivedField("time_to_15_percent", _time_to(15), format_target_time),
+)
+
+
+def derive(data, ctx):
+    """Fill in every derived field of a single measurement in one pass.
+
+    'data' is a MeasurementRecord (or any mapping supporting get and item
+    assignment).
+    """
+    for field in DERIVED_FIELDS:
+        data[field.key] = field.func(data, SCALAR_OPS, ctx)
+    return data
+
+
+def derive_columns(columns, ctx):
+    """Evaluate the derivation table over column arrays of many measurements.
+
+    'columns' maps raw field keys to equally long sequences. Missing fields
+    count as 0, like on the live path. Returns a new dict with the raw columns
+    as float arrays plus every derived column. Time-to-target columns hold
+    minutes, NaN where the target is not being approached.
+    """
+    values = {key: np.asarray(column, dtype=float) for key, column in columns.items()}
+    length = len(next(iter(values.values()))) if values else 0
+
+    for field in DERIVED_FIELDS:
+        values[field.key] = np.broadcast_to(field.func(values, VECTOR_OPS, ctx), (length,))
+
+    return values
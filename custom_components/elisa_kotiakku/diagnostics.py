@@ -4,7 +4,7 @@ from typing import Any
 from homeassistant.components.diagnostics import async_redact_data
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.core import HomeAssistant
-from .const import CONF_API_KEY, DOMAIN
+from .const import CONF_API_KEY, DATA_FETCH_SCHEDULER, DOMAIN
 
 # List of keys to hide from the download
 TO_REDACT = {CONF_API_KEY, "api_key", "password"}
@@ -14,8 +14,19 @@ async def async_get_config_entry_diagnostics(
 ) -> dict[str, Any]:
     """Return diagnostics for a config entry."""
     coordinator = hass.data[DOMAIN][entry.entry_id]
-    
+    data = coordinator.data.as_dict() if coordinator.data is not None else None
+    scheduler = hass.data.get(DATA_FETCH_SCHEDULER)
+
     return {
         "entry": async_redact_data(entry.as_dict(), TO_REDACT),
-        "data": async_redact_data(coordinator.data, TO_REDACT),
+        "data": async_redact_data(data, TO_REDACT),
+        "scheduler": {
+            "update_interval": coordinator.update_interval.total_seconds(),
+            "next_poll": coordinator.next_poll.isoformat() if coordinator.next_poll else None,
+            "skipped_updates": coordinator.skipped_updates,
+            "poll_planner": coordinator.poll_planner.as_dict(),
+            "fetch": scheduler.as_dict() if scheduler is not None else None,
+            "backoff": scheduler.backoff_state(coordinator) if scheduler is not None else None,
+        },
+        "timings": coordinator.timings.as_dict(),
     }
\ No newline at end of file
@@ -0,0 +1,364 @@
+"""Shared fetch scheduler for Elisa Kotiakku.
+
+All config entries fetch through one scheduler per Home Assistant instance:
+
+- Coordinators polling the same (url, api key) share one request.
+- A successful response is fanned out to every coordinator subscribed to that
+  (url, api key), which pushes their own next poll back by a full interval.
+- Scheduled polls are spread out with a random jitter, once per (url, api
+  key): coordinators polling while it runs wait for the same request.
+- At most MAX_CONCURRENT_FETCHES requests run at once on a keep-alive
+  session sharing the connection pool of Home Assistant, with compressed
+  responses. The session traces every request, so each waiting coordinator
+  gets the phase timings (see timing.py).
+- Requests are conditional (If-None-Match / If-Modified-Since) when the
+  server sent validators. A 304 response returns the previous payload object
+  unchanged and is not fanned out.
+- Time range requests for gap recovery share the concurrency limit but are
+  never coalesced, conditional or fanned out.
+- The response the config flow validated the URL and key with is handed over
+  and serves the first fetch of the new entry, if it is recent enough. It is
+  dropped after SEED_MAX_AGE when no entry takes it.
+- Bodies are read in chunks, up to MAX_PAYLOAD_BYTES.
+- Failures back off per (url, api key), with a circuit breaker and a timeout
+  that follows the observed latency (see backoff.py). Range requests don't
+  count towards it.
+"""
+
+import asyncio
+import logging
+import random
+import time
+from datetime import timedelta
+
+import aiohttp
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.aiohttp_client import async_create_clientsession
+from homeassistant.helpers.event import async_call_later
+from homeassistant.util import dt as dt_util
+from homeassistant.util.json import json_loads
+
+from .backoff import (
+    ERROR_AUTH,
+    ERROR_CANCELLED,
+    KotiakkuBackoff,
+    KotiakkuFetchError,
+    classify_exception,
+    parse_retry_after,
+    status_kind,
+)
+from .const import (
+    DATA_FETCH_SCHEDULER,
+    FETCH_JITTER,
+    MAX_CONCURRENT_FETCHES,
+    MAX_PAYLOAD_BYTES,
+    RANGE_PARAM_END,
+    RANGE_PARAM_START,
+    SEED_MAX_AGE,
+    TIMEOUT_MAX,
+)
+from .timing import KotiakkuFetchTrace, request_trace_config
+
+_LOGGER = logging.getLogger(__name__)
+
+# Bytes read at a time from a response body
+READ_CHUNK = 64 * 1024
+
+
+@callback
+def async_get_fetch_scheduler(hass: HomeAssistant) -> "KotiakkuFetchScheduler":
+    """Return the fetch scheduler shared by all config entries."""
+    scheduler = hass.data.get(DATA_FETCH_SCHEDULER)
+    if scheduler is None:
+        scheduler = hass.data[DATA_FETCH_SCHEDULER] = KotiakkuFetchScheduler(hass)
+    return scheduler
+
+
+async def async_read_body(response) -> bytes:
+    """Read a response body in chunks, raising ValueError once it is larger than MAX_PAYLOAD_BYTES."""
+    limit = MAX_PAYLOAD_BYTES
+    if response.content_length is not None and response.content_length > limit:
+        raise ValueError(f"Response of {response.content_length} bytes is larger than {limit}")
+    body = bytearray()
+    async for chunk in response.content.iter_chunked(READ_CHUNK):
+        body += chunk
+        if len(body) > limit:
+            raise ValueError(f"Response is larger than {limit} bytes")
+    return bytes(body)
+
+
+class _InflightFetch:
+    """A request in progress, its timings and the coordinators waiting for it."""
+
+    __slots__ = ("future", "waiters", "trace")
+
+    def __init__(self, future):
+        self.future = future
+        self.waiters = set()
+        self.trace = KotiakkuFetchTrace()
+
+
+class KotiakkuFetchScheduler:
+    """Coalesces, spreads out and limits API requests across config entries."""
+
+    def __init__(self, hass: HomeAssistant):
+        self.hass = hass
+        self._semaphore = asyncio.Semaphore(MAX_CONCURRENT_FETCHES)
+        self._inflight: dict[tuple[str, str], _InflightFetch] = {}
+        self._subscribers: dict[tuple[str, str], set] = {}
+        # (ETag, Last-Modified, payload) of the last full response per group
+        self._validators: dict[tuple[str, str], tuple[str | None, str | None, object]] = {}
+        self._backoff: dict[tuple[str, str], KotiakkuBackoff] = {}
+        # (fetched, payload, ETag, Last-Modified) handed over by the config flow
+        self._seeds: dict[tuple[str, str], tuple] = {}
+        self._seed_expiry: dict[tuple[str, str], object] = {}
+        self._session = None
+
+    @callback
+    def async_subscribe(self, coordinator):
+        """Subscribe a coordinator to the results for its (url, api key).
+
+        Returns a callback that removes the subscription.
+        """
+        group = (coordinator.api_url, coordinator.api_key)
+        self._subscribers.setdefault(group, set()).add(coordinator)
+
+        @callback
+        def unsubscribe():
+            subscribers = self._subscribers.get(group)
+            if subscribers is not None:
+                subscribers.discard(coordinator)
+                if not subscribers:
+                    del self._subscribers[group]
+                    self._validators.pop(group, None)
+                    self._backoff.pop(group, None)
+                    self._async_take_seed(group)
+            self._async_release_if_unused()
+
+        return unsubscribe
+
+    @callback
+    def _async_release_if_unused(self):
+        """Drop the scheduler once no entry, request or seed uses it."""
+        if self._subscribers or self._inflight or self._seeds:
+            return
+        self.hass.data.pop(DATA_FETCH_SCHEDULER, None)
+        if self._session is not None:
+            # The connection pool is Home Assistant's, only the session goes
+            self._session.detach()
+            self._session = None
+
+    async def async_fetch(self, coordinator, jitter=False):
+        """Return the decoded API response for the coordinator's (url, api key).
+
+        If a request for the same (url, api key) is already in flight, its result
+        is shared instead of making another call.
+        """
+        group = (coordinator.api_url, coordinator.api_key)
+
+        seed = self._async_take_seed(group)
+        if seed is not None and dt_util.utcnow() - seed[0] <= timedelta(seconds=SEED_MAX_AGE):
+            _, raw_data, etag, last_modified = seed
+            if etag or last_modified:
+                self._validators[group] = (etag, last_modified, raw_data)
+            coordinator.timings.note(seeded=True)
+            return raw_data
+
+        inflight = self._inflight.get(group)
+        if inflight is None:
+            inflight = self._inflight[group] = _InflightFetch(self.hass.loop.create_future())
+            inflight.waiters.add(coordinator)
+            try:
+                if jitter:
+                    # Once per group: coordinators polling meanwhile wait for this request
+                    await asyncio.sleep(random.uniform(0, FETCH_JITTER))
+                raw_data, modified = await self._async_request(*group)
+            except Exception as err:
+                inflight.future.set_exception(err)
+                # Mark retrieved, the waiters (if any) get it from their own await
+                inflight.future.exception()
+                raise
+            else:
+                inflight.future.set_result(raw_data)
+                if modified:
+                    self._async_fan_out(group, raw_data, inflight.waiters)
+                return raw_data
+            finally:
+                del self._inflight[group]
+                if not inflight.future.done():
+                    # The leader was cancelled, its waiters must not wait forever
+                    inflight.future.set_exception(
+                        KotiakkuFetchError("Request cancelled", ERROR_CANCELLED)
+                    )
+                    inflight.future.exception()
+                for waiter in inflight.waiters:
+                    waiter.timings.add_fetch(inflight.trace)
+
+        inflight.waiters.add(coordinator)
+        return await asyncio.shield(inflight.future)
+
+    @callback
+    def async_seed(self, url, api_key, raw_data, etag=None, last_modified=None):
+        """Keep a response fetched outside the scheduler to serve the next fetch for (url, api key).
+
+        The seed is dropped after SEED_MAX_AGE if no fetch took it, e.g. when
+        the config flow was abandoned.
+        """
+        group = (url, api_key)
+        self._async_take_seed(group)
+        self._seeds[group] = (dt_util.utcnow(), raw_data, etag, last_modified)
+
+        @callback
+        def expire(_now):
+            self._seed_expiry.pop(group, None)
+            self._seeds.pop(group, None)
+            self._async_release_if_unused()
+
+        self._seed_expiry[group] = async_call_later(self.hass, SEED_MAX_AGE, expire)
+
+    @callback
+    def _async_take_seed(self, group):
+        """Remove and return the seed of group, if any."""
+        cancel = self._seed_expiry.pop(group, None)
+        if cancel is not None:
+            cancel()
+        return self._seeds.pop(group, None)
+
+    async def async_fetch_range(self, coordinator, start, end):
+        """Return the decoded API response for the measurements between start and end."""
+        params = {
+            RANGE_PARAM_START: start.isoformat(),
+            RANGE_PARAM_END: end.isoformat(),
+        }
+        raw_data, _ = await self._async_request(coordinator.api_url, coordinator.api_key, params)
+        return raw_data
+
+    async def _async_request(self, url, api_key, params=None):
+        """Perform one request within the concurrency limit and the backoff of its group.
+
+        Returns (payload, modified). 'modified' is False when the server
+        answered 304 Not Modified and the previous payload was reused.
+        Requests with query 'params' are never conditional, nor timed, get
+        the longest timeout and stay out of the backoff of the group; gap
+        recovery backs off on its own. Failures raise KotiakkuFetchError.
+        """
+        group = (url, api_key)
+        backoff, trial, timeout = None, False, TIMEOUT_MAX
+        if params is None:
+            backoff = self._backoff.get(group)
+            if backoff is None:
+                backoff = self._backoff[group] = KotiakkuBackoff()
+            trial = backoff.check(dt_util.utcnow())
+            timeout = backoff.timeout()
+
+        try:
+            async with self._semaphore:
+                started = time.perf_counter()
+                result = await self._async_send(group, params, timeout)
+        except KotiakkuFetchError as err:
+            if backoff is not None:
+                backoff.record_failure(err, dt_util.utcnow())
+            raise
+        except (asyncio.TimeoutError, aiohttp.ClientError, ValueError) as err:
+            error = classify_exception(err, timeout)
+            if backoff is not None:
+                backoff.record_failure(error, dt_util.utcnow())
+            raise error from err
+        finally:
+            if trial:
+                backoff.end_trial()
+
+        if backoff is not None:
+            backoff.record_success((time.perf_counter() - started) * 1000)
+        return result
+
+    async def _async_send(self, group, params, timeout):
+        """Send the request of _async_request() and read the response."""
+        url, api_key = group
+        inflight = self._inflight.get(group) if params is None else None
+        trace = inflight.trace if inflight is not None else None
+        headers = {
+            "x-api-key": api_key,
+            "accept": "application/json",
+            "accept-encoding": "gzip, deflate",
+        }
+
+        etag, last_modified, previous = (None, None, None)
+        if params is None:
+            etag, last_modified, previous = self._validators.get(group, (None, None, None))
+        if previous is not None:
+            if etag:
+                headers["if-none-match"] = etag
+            if last_modified:
+                headers["if-modified-since"] = last_modified
+
+        if self._session is None:
+            # Home Assistant's connection pool keeps connections alive between polls
+            self._session = async_create_clientsession(
+                self.hass, auto_cleanup=False, trace_configs=[request_trace_config()]
+            )
+        if trace is not None:
+            trace.start()
+        async with self._session.get(
+            url, headers=headers, params=params, timeout=timeout, trace_request_ctx=trace
+        ) as response:
+            if trace is not None:
+                trace.status = response.status
+            if response.status == 401:
+                raise KotiakkuFetchError("Invalid API Key - Authentication failed", ERROR_AUTH, 401)
+
+            if response.status == 304 and previous is not None:
+                if trace is not None:
+                    trace.finish()
+                return previous, False
+
+            if response.status >= 400:
+                raise KotiakkuFetchError(
+                    f"{response.status}, message={response.reason!r}",
+                    status_kind(response.status),
+                    response.status,
+                    parse_retry_after(response.headers.get("Retry-After"), dt_util.utcnow()),
+                )
+
+            # Read and decoded separately, to time both
+            body = await async_read_body(response)
+            if trace is not None:
+                trace.body = trace.lap()
+                trace.bytes = len(body)
+            raw_data = json_loads(body)
+            if trace is not None:
+                trace.decode = trace.lap()
+                trace.finish()
+
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+            if params is None and (etag or last_modified):
+                self._validators[group] = (etag, last_modified, raw_data)
+            return raw_data, True
+
+    def retry_delay(self, coordinator) -> timedelta | None:
+        """Return the time until the coordinator's group may be polled again, None when not failing."""
+        backoff = self._backoff.get((coordinator.api_url, coordinator.api_key))
+        return backoff.delay(dt_util.utcnow()) if backoff is not None else None
+
+    def backoff_state(self, coordinator) -> dict | None:
+        """Return the backoff and circuit breaker state of the coordinator's group, for diagnostics."""
+        backoff = self._backoff.get((coordinator.api_url, coordinator.api_key))
+        return backoff.as_dict(dt_util.utcnow()) if backoff is not None else None
+
+    def as_dict(self) -> dict:
+        """Return the scheduler state, for diagnostics. Groups are counted, keys are not shown."""
+        return {
+            "groups": len(self._subscribers),
+            "subscribers": sum(len(subscribers) for subscribers in self._subscribers.values()),
+            "in_flight": len(self._inflight),
+            "conditional_groups": len(self._validators),
+        }
+
+    @callback
+    def _async_fan_out(self, group, raw_data, waiters):
+        """Hand a response to the subscribers that did not ask for it themselves."""
+        for coordinator in self._subscribers.get(group, ()):
+            if coordinator not in waiters:
+                coordinator.async_handle_shared_payload(raw_data)
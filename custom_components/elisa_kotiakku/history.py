@@ -0,0 +1,216 @@
+"""On-disk measurement history for Elisa Kotiakku.
+
+The raw numeric fields of the last HISTORY_DAYS of measurement periods are kept
+in a fixed-record ring buffer file next to the other integration storage. The
+file is memory-mapped and viewed as a NumPy structured array, so history reads
+(gap recovery, diagnostics, rolling statistics) are slices of the mapping
+instead of recorder queries.
+
+File layout:
+
+- A header with a magic, the format version, the record layout (field count,
+  record size, a hash of the field names) and the ring capacity. The header is
+  only written when the file is created; a file with another header is replaced.
+- 'capacity' records of: period start (epoch seconds), one float64 per field of
+  RAW_FIELDS (NaN when missing), and a CRC32 of the preceding bytes.
+
+Records are only ever appended, in period order, into the slot after the newest
+one. There is no write pointer in the file: on open, the newest record with a
+valid checksum marks the head. A crash can therefore only leave the record being
+written torn, and a torn record fails its checksum and is treated as empty.
+
+File access blocks, so the methods named async_* are the ones to call from the
+event loop; everything else runs in the executor.
+"""
+
+from __future__ import annotations
+
+import logging
+import mmap
+import os
+import struct
+import threading
+import zlib
+from datetime import datetime, timezone
+
+import numpy as np
+
+from homeassistant.core import HomeAssistant, callback
+
+from .const import ATTR_PERIOD_START, HISTORY_CAPACITY
+from .measurement import RAW_FIELDS, to_float
+
+_LOGGER = logging.getLogger(__name__)
+
+_MAGIC = b"KTAK"
+_VERSION = 1
+# magic, version, field count, record size, field name hash, capacity
+_HEADER = struct.Struct("<4sHHIII")
+_HEADER_SIZE = 64
+
+_RECORD_DTYPE = np.dtype(
+    [("start", "<f8")] + [(key, "<f8") for key in RAW_FIELDS] + [("crc", "<u4")]
+)
+_PAYLOAD_SIZE = _RECORD_DTYPE.itemsize - 4
+_FIELDS_HASH = zlib.crc32(",".join(RAW_FIELDS).encode())
+
+
+class KotiakkuHistory:
+    """Ring buffer file of raw measurements, indexed by period start."""
+
+    def __init__(self, hass: HomeAssistant, path: str, capacity: int = HISTORY_CAPACITY):
+        self.hass = hass
+        self.path = path
+        self.capacity = capacity
+        self._file = None
+        self._mmap = None
+        self._records = None
+        self._valid = None
+        self._head = 0
+        self.newest: float | None = None
+        self._lock = threading.Lock()
+        self._pending = []
+        self._writer = None
+
+    # --- Executor side ---
+
+    def open(self):
+        """Open (or create) the file and find the newest record."""
+        header = _HEADER.pack(
+            _MAGIC, _VERSION, len(RAW_FIELDS), _RECORD_DTYPE.itemsize, _FIELDS_HASH, self.capacity
+        )
+        size = _HEADER_SIZE + self.capacity * _RECORD_DTYPE.itemsize
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        mode = "r+b" if os.path.exists(self.path) else "w+b"
+        handle = open(self.path, mode)
+        try:
+            if handle.read(_HEADER.size) != header or os.fstat(handle.fileno()).st_size != size:
+                _LOGGER.debug("Creating measurement history file %s", self.path)
+                handle.seek(0)
+                handle.truncate(0)
+                handle.write(header.ljust(_HEADER_SIZE, b"\0"))
+                handle.truncate(size)
+                handle.flush()
+                os.fsync(handle.fileno())
+            mapping = mmap.mmap(handle.fileno(), size)
+        except Exception:
+            handle.close()
+            raise
+
+        with self._lock:
+            self._file = handle
+            self._mmap = mapping
+            self._records = np.frombuffer(
+                mapping, dtype=_RECORD_DTYPE, count=self.capacity, offset=_HEADER_SIZE
+            )
+            # Checksums are only verified here, later appends are ours
+            raw = np.frombuffer(mapping, dtype=np.uint8, offset=_HEADER_SIZE)
+            self._valid = np.array(
+                [
+                    self._records["start"][slot] > 0
+                    and zlib.crc32(raw[slot * _RECORD_DTYPE.itemsize:][:_PAYLOAD_SIZE])
+                    == self._records["crc"][slot]
+                    for slot in range(self.capacity)
+                ],
+                dtype=bool,
+            )
+            if self._valid.any():
+                starts = np.where(self._valid, self._records["start"], -np.inf)
+                newest = int(np.argmax(starts))
+                self._head = (newest + 1) % self.capacity
+                self.newest = float(starts[newest])
+            else:
+                self._head = 0
+                self.newest = None
+
+    def close(self):
+        """Flush and close the file."""
+        with self._lock:
+            if self._mmap is None:
+                return
+            self._records = None
+            self._mmap.flush()
+            self._mmap.close()
+            self._file.close()
+            self._mmap = self._file = None
+
+    def append(self, measurements):
+        """Write (period start, measurement) pairs newer than the newest record."""
+        with self._lock:
+            if self._mmap is None:
+                return 0
+            written = 0
+            for start, measurement in measurements:
+                timestamp = start.timestamp()
+                if self.newest is not None and timestamp <= self.newest:
+                    continue
+                slot = self._head
+                record = self._records[slot : slot + 1]
+                # Invalidate first, so a crash mid-write leaves a torn (invalid) record
+                self._valid[slot] = False
+                record["crc"] = 0
+                record["start"] = timestamp
+                for key in RAW_FIELDS:
+                    record[key] = to_float(measurement.get(key))
+                record["crc"] = zlib.crc32(record.tobytes()[:_PAYLOAD_SIZE])
+                self._valid[slot] = True
+                self._head = (slot + 1) % self.capacity
+                self.newest = timestamp
+                written += 1
+            if written:
+                self._mmap.flush()
+            return written
+
+    def read(self, start: datetime, end: datetime) -> np.ndarray:
+        """Return a copy of the records with start <= period start <= end, oldest first."""
+        with self._lock:
+            if self._records is None:
+                return np.empty(0, dtype=_RECORD_DTYPE)
+            # Slots in logical order, the oldest one is at the head
+            order = np.roll(np.arange(self.capacity), -self._head)
+            order = order[self._valid[order]]
+            starts = self._records["start"][order]
+            first = np.searchsorted(starts, start.timestamp(), side="left")
+            last = np.searchsorted(starts, end.timestamp(), side="right")
+            return self._records[order[first:last]].copy()
+
+    def measurements(self, start: datetime, end: datetime) -> list[dict]:
+        """Return the records in [start, end] as API-style measurement dicts."""
+        result = []
+        for record in self.read(start, end):
+            item = {
+                ATTR_PERIOD_START: datetime.fromtimestamp(record["start"], timezone.utc).isoformat()
+            }
+            for key in RAW_FIELDS:
+                if not np.isnan(record[key]):
+                    item[key] = float(record[key])
+            result.append(item)
+        return result
+
+    # --- Event loop side ---
+
+    @callback
+    def async_append(self, measurements):
+        """Queue measurements to be written, in order, by one executor job at a time."""
+        self._pending.extend(measurements)
+        if self._writer is None:
+            self._writer = self.hass.async_create_background_task(
+                self._async_write(), f"{self.path} writer"
+            )
+
+    async def _async_write(self):
+        try:
+            while self._pending:
+                batch, self._pending = self._pending, []
+                await self.hass.async_add_executor_job(self.append, batch)
+        except OSError as err:
+            _LOGGER.warning("Could not write measurement history: %s", err)
+        finally:
+            self._writer = None
+
+    async def async_close(self):
+        """Finish queued writes and close the file."""
+        if self._writer is not None:
+            await self._writer
+        await self.hass.async_add_executor_job(self.close)
@@ -0,0 +1,203 @@
+"""Energy integrator for Elisa Kotiakku.
+
+All energy and savings totals are Riemann sums of a power (or rate) field over
+time. They are advanced together by one integrator owned by the coordinator, so
+every accumulator integrates over exactly the same intervals and the totals
+always equal the sum of their parts. The sensors only read the results.
+"""
+
+from datetime import datetime
+
+import numpy as np
+
+from homeassistant.util import dt as dt_util
+
+from .const import (
+    DEFAULT_INTEGRATION_METHOD,
+    INTEGRATION_TRAPEZOIDAL,
+    MAX_INTEGRATION_GAP,
+)
+
+# Energy accumulators (kWh) and the power field (kW) they integrate
+ENERGY_ACCUMULATORS = {
+    "solar_energy_kwh": "solar_power_kw",
+    "solar_to_house_kwh": "solar_to_house_kw",
+    "solar_to_battery_kwh": "solar_to_battery_kw",
+    "solar_to_grid_kwh": "solar_to_grid_kw",
+    "grid_to_house_kwh": "grid_to_house_kw",
+    "grid_to_battery_kwh": "grid_to_battery_kw",
+    "battery_to_house_kwh": "battery_to_house_kw",
+    "battery_to_grid_kwh": "battery_to_grid_kw",
+    "house_energy_kwh": "house_power_kw",
+    "total_battery_charge_kwh": "battery_charge_total_kw",
+    "total_battery_discharge_kwh": "battery_discharge_total_kw",
+    "total_grid_import_kwh": "total_grid_import_kw",
+    "total_grid_export_kwh": "total_grid_export_kw",
+    "battery_loss_kwh": "battery_loss_kw",
+}
+
+# Signed accumulators (€) and the rate field (€/h) they integrate
+RATE_ACCUMULATORS = {
+    "total_savings_eur": "net_savings_rate",
+    # Per flow, each period priced at its own spot price
+    "grid_to_house_cost_eur": "grid_to_house_cost_rate",
+    "grid_to_battery_cost_eur": "grid_to_battery_cost_rate",
+    "battery_to_house_savings_eur": "battery_to_house_savings_rate",
+    "solar_to_grid_value_eur": "solar_to_grid_value_rate",
+}
+
+
+class Accumulator:
+    """One running total, integrating a single source field."""
+
+    __slots__ = ("key", "source", "absolute", "value", "restored")
+
+    def __init__(self, key, source, absolute):
+        self.key = key
+        self.source = source
+        # Energy totals only ever grow, so they integrate the magnitude
+        self.absolute = absolute
+        self.value = 0.0
+        self.restored = False
+
+    def rate(self, data):
+        """Return the source value of this accumulator from a measurement."""
+        value = data.get(self.source)
+        if value is None:
+            return None
+        return abs(value) if self.absolute else float(value)
+
+
+class KotiakkuEnergyIntegrator:
+    """Advances every accumulator in a single pass per measurement."""
+
+    def __init__(self, method=DEFAULT_INTEGRATION_METHOD, max_gap=MAX_INTEGRATION_GAP):
+        self.method = method
+        self.max_gap = max_gap
+        self.accumulators = {
+            key: Accumulator(key, source, True) for key, source in ENERGY_ACCUMULATORS.items()
+        }
+        self.accumulators.update(
+            {key: Accumulator(key, source, False) for key, source in RATE_ACCUMULATORS.items()}
+        )
+        self._accumulators = tuple(self.accumulators.values())
+        self.last_time: datetime | None = None
+        # Baseline of this run, everything before it is restored or recovered
+        self.first_time: datetime | None = None
+        self._last_rates = None
+
+    def resolve(self, *keys):
+        """Return the accumulators for 'keys', for consumers to hold on to.
+        
+        Derived sensors resolve their inputs once at construction time and then
+        read the accumulator values directly on every state write.
+        """
+        return tuple(self.accumulators[key] for key in keys)
+
+    def snapshot(self) -> tuple[float, ...]:
+        """Return the accumulator values, to compare against with deltas()."""
+        return tuple(accumulator.value for accumulator in self._accumulators)
+
+    def deltas(self, snapshot) -> dict[str, float]:
+        """Return what the accumulators changed by since snapshot(), leaving out the unchanged ones."""
+        return {
+            accumulator.key: accumulator.value - before
+            for accumulator, before in zip(self._accumulators, snapshot)
+            if accumulator.value != before
+        }
+
+    def restore(self, key, value):
+        """Add a total restored from the previous run to an accumulator (once)."""
+        accumulator = self.accumulators[key]
+        if accumulator.restored:
+            return
+        accumulator.value += value
+        accumulator.restored = True
+
+    def as_dict(self) -> dict:
+        """Return the integrator state, to continue exactly where it stopped."""
+        return {
+            "last_time": self.last_time.isoformat() if self.last_time else None,
+            "rates": list(self._last_rates) if self._last_rates is not None else None,
+            "values": {key: accumulator.value for key, accumulator in self.accumulators.items()},
+        }
+
+    def load(self, state: dict):
+        """Continue from a state saved by as_dict(), instead of restoring sensor totals."""
+        for key, value in state.get("values", {}).items():
+            accumulator = self.accumulators.get(key)
+            if accumulator is not None:
+                accumulator.value = float(value)
+                accumulator.restored = True
+
+        rates = state.get("rates")
+        last_time = dt_util.parse_datetime(state["last_time"]) if state.get("last_time") else None
+        if last_time is not None and rates is not None and len(rates) == len(self._accumulators):
+            self.last_time = self.first_time = last_time
+            self._last_rates = tuple(rates)
+
+    def advance(self, timestamp: datetime, data, bridge=True) -> bool:
+        """Integrate up to 'timestamp', where the measurement 'data' begins.
+
+        The interval since the previous measurement is integrated using the
+        configured rule, unless 'bridge' is False (the interval is a gap that
+        is recovered separately). The first measurement only sets the baseline,
+        and measurements that are not newer than the last one are ignored.
+        Returns True if the measurement was taken into use.
+        """
+        if self.last_time is not None and timestamp <= self.last_time:
+            return False
+
+        rates = tuple(accumulator.rate(data) for accumulator in self._accumulators)
+
+        if self.last_time is None:
+            self.first_time = timestamp
+        elif bridge:
+            seconds = (timestamp - self.last_time).total_seconds()
+            if seconds < self.max_gap:
+                hours = seconds / 3600
+                trapezoidal = self.method == INTEGRATION_TRAPEZOIDAL
+                for accumulator, previous, current in zip(self._accumulators, self._last_rates, rates):
+                    if previous is None:
+                        continue
+                    if trapezoidal and current is not None:
+                        previous = (previous + current) / 2
+                    accumulator.value += previous * hours
+
+        self.last_time = timestamp
+        self._last_rates = rates
+        return True
+
+    def integrate_columns(self, times, columns) -> dict[str, float]:
+        """Return what every accumulator gains over a run of past measurements.
+
+        'times' holds the period starts in seconds, strictly increasing, and
+        'columns' the source fields as float arrays (NaN where missing). The
+        intervals between consecutive measurements are integrated like
+        advance() would, but in one vectorized pass and without touching the
+        accumulators, so this can run in an executor. Apply the result with add().
+        """
+        seconds = np.diff(np.asarray(times, dtype=float))
+        hours = np.where((seconds > 0) & (seconds < self.max_gap), seconds / 3600, 0.0)
+        trapezoidal = self.method == INTEGRATION_TRAPEZOIDAL
+
+        totals = {}
+        for accumulator in self._accumulators:
+            column = columns.get(accumulator.source)
+            if column is None or len(column) < 2:
+                totals[accumulator.key] = 0.0
+                continue
+            rates = np.asarray(column, dtype=float)
+            if accumulator.absolute:
+                rates = np.abs(rates)
+            previous = rates[:-1]
+            if trapezoidal:
+                current = rates[1:]
+                previous = np.where(np.isnan(current), previous, (previous + current) / 2)
+            totals[accumulator.key] = float(np.nansum(previous * hours))
+        return totals
+
+    def add(self, totals):
+        """Add recovered amounts (see integrate_columns) to the accumulators."""
+        for key, value in totals.items():
+            self.accumulators[key].value += value
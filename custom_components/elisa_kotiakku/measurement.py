@@ -0,0 +1,178 @@
+"""Compact measurement record for Elisa Kotiakku.
+
+The coordinator data used to be the raw JSON dict with every derived value
+written into it under another string key. A MeasurementRecord instead keeps
+the raw and derived numeric fields in one flat float array, addressed by field
+indices that are computed once at import time. The decoded JSON item is kept
+as is (never modified) for fields the integration doesn't know about.
+
+Missing values are stored as NaN and read back as None.
+"""
+
+from array import array
+from datetime import datetime
+
+from homeassistant.util import dt as dt_util
+
+from .const import ATTR_PERIOD_START
+from .derivation import DERIVED_FIELDS
+from .tariff import tariff_slot
+
+# Numeric fields read from the API measurement
+RAW_FIELDS = (
+    "battery_power_kw",
+    "solar_power_kw",
+    "grid_power_kw",
+    "house_power_kw",
+    "solar_to_house_kw",
+    "solar_to_battery_kw",
+    "solar_to_grid_kw",
+    "grid_to_house_kw",
+    "grid_to_battery_kw",
+    "battery_to_house_kw",
+    "battery_to_grid_kw",
+    "state_of_charge_percent",
+    "battery_temperature_celsius",
+    "spot_price_cents_per_kwh",
+)
+
+# Fields set from the period start, see tariff.py
+TIME_FIELDS = ("tariff_slot",)
+
+# Every field of a record, raw fields first, then the time fields and the
+# derivation table's fields
+FIELDS = RAW_FIELDS + TIME_FIELDS + tuple(field.key for field in DERIVED_FIELDS)
+FIELD_INDEX = {key: index for index, key in enumerate(FIELDS)}
+
+# Fields presented as text, e.g. time-to-target minutes as "1h 45m"
+FORMATTERS = {
+    FIELD_INDEX[field.key]: field.formatter for field in DERIVED_FIELDS if field.formatter
+}
+
+_EMPTY = array("d", [float("nan")]) * len(FIELDS)
+_SLOT_INDEX = FIELD_INDEX["tariff_slot"]
+
+
+class MeasurementRecord:
+    """One measurement period with its derived fields."""
+
+    __slots__ = ("start", "values", "raw")
+
+    def __init__(self, start: datetime | None, values: array, raw: dict):
+        self.start = start
+        self.values = values
+        self.raw = raw
+
+    @classmethod
+    def from_raw(cls, start: datetime | None, raw: dict) -> "MeasurementRecord":
+        """Create a record from a decoded API measurement."""
+        values = array("d", _EMPTY)
+        for index, key in enumerate(RAW_FIELDS):
+            value = raw.get(key)
+            if value is not None:
+                values[index] = value
+        values[_SLOT_INDEX] = tariff_slot(start)
+        return cls(start, values, raw)
+
+    def value(self, index):
+        """Return the numeric value at a precomputed field index, or None."""
+        value = self.values[index]
+        return None if value != value else value
+
+    def get(self, key, default=None):
+        """Dict-style read. Text fields are returned formatted."""
+        index = FIELD_INDEX.get(key)
+        if index is None:
+            return self.raw.get(key, default)
+
+        value = self.values[index]
+        formatter = FORMATTERS.get(index)
+        if formatter is not None:
+            return formatter(value)
+        return default if value != value else value
+
+    def __getitem__(self, key):
+        """Dict-style read like get(), a missing numeric value raises KeyError."""
+        index = FIELD_INDEX.get(key)
+        if index is None:
+            return self.raw[key]
+        value = self.values[index]
+        formatter = FORMATTERS.get(index)
+        if formatter is not None:
+            return formatter(value)
+        if value != value:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        # Only known fields can be written, the raw item stays untouched
+        self.values[FIELD_INDEX[key]] = value
+
+    def __contains__(self, key):
+        index = FIELD_INDEX.get(key)
+        if index is None:
+            return key in self.raw
+        return self.values[index] == self.values[index]
+
+    def as_dict(self) -> dict:
+        """Return the raw item merged with every known field, e.g. for diagnostics."""
+        result = dict(self.raw)
+        for index, key in enumerate(FIELDS):
+            value = self.values[index]
+            formatter = FORMATTERS.get(index)
+            if formatter is not None:
+                result[key] = formatter(value)
+            elif value == value:
+                result[key] = value
+        return result
+
+    def __repr__(self):
+        return f"MeasurementRecord({self.start}, {self.as_dict()})"
+
+
+def to_float(value):
+    """Return value as float, NaN if it is missing or not a number."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float("nan")
+
+
+def parse_period_time(measurement, key):
+    """Return a period timestamp of a measurement as aware UTC datetime, or None."""
+    value = measurement.get(key)
+    if value is None:
+        return None
+    timestamp = dt_util.parse_datetime(str(value))
+    if timestamp is None or timestamp.tzinfo is None:
+        return None
+    return dt_util.as_utc(timestamp)
+
+
+def parse_measurements(raw_data):
+    """Split an API response into timestamped and untimestamped measurements.
+    
+    Returns a tuple (timed, untimed). 'timed' is a list of (period start, measurement)
+    pairs sorted oldest first and de-duplicated by period start. 'untimed' keeps
+    the items without a usable timestamp in their original order.
+    """
+    if isinstance(raw_data, dict):
+        raw_data = [raw_data]
+    if not isinstance(raw_data, list):
+        return [], []
+
+    timed = {}
+    untimed = []
+    for measurement in raw_data:
+        if not isinstance(measurement, dict) or not measurement:
+            continue
+
+        start = parse_period_time(measurement, ATTR_PERIOD_START)
+        if start is None:
+            untimed.append(measurement)
+            continue
+
+        # The API lists the newest period first, keep the first copy we see
+        timed.setdefault(start, measurement)
+
+    return sorted(timed.items(), key=lambda item: item[0]), untimed
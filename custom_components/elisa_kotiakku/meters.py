@@ -0,0 +1,106 @@
+"""Daily, weekly and monthly energy meters for Elisa Kotiakku.
+
+Instead of a utility_meter helper per total and period, each listening to state
+changes, every meter is the difference between an integrator accumulator and
+its value at the start of the period. The coordinator moves the meters along
+with the measurements it integrates; the calendar periods (local time) are
+only worked out again when the local date changes, and a new period takes the
+current totals as its baselines in one pass.
+"""
+
+from datetime import date, datetime, timedelta
+
+from homeassistant.util import dt as dt_util
+
+PERIOD_DAILY = "daily"
+PERIOD_WEEKLY = "weekly"
+PERIOD_MONTHLY = "monthly"
+PERIODS = (PERIOD_DAILY, PERIOD_WEEKLY, PERIOD_MONTHLY)
+
+# Energy totals that get period meters
+METERED_KEYS = (
+    "solar_energy_kwh",
+    "house_energy_kwh",
+    "total_grid_import_kwh",
+    "total_grid_export_kwh",
+    "total_battery_charge_kwh",
+    "total_battery_discharge_kwh",
+)
+
+
+def meter_key(key: str, period: str) -> str:
+    """Return the sensor key of a period meter, e.g. solar_energy_daily_kwh."""
+    return f"{key.removesuffix('_kwh')}_{period}_kwh"
+
+
+def period_start(timestamp: datetime, period: str) -> datetime:
+    """Return the local start of the calendar period that contains timestamp."""
+    start = dt_util.as_local(timestamp).replace(hour=0, minute=0, second=0, microsecond=0)
+    if period == PERIOD_WEEKLY:
+        start -= timedelta(days=start.weekday())
+    elif period == PERIOD_MONTHLY:
+        start = start.replace(day=1)
+    return start
+
+
+class KotiakkuPeriodMeters:
+    """Energy of the current day, week and month for the METERED_KEYS totals."""
+
+    def __init__(self, integrator):
+        self._accumulators = dict(zip(METERED_KEYS, integrator.resolve(*METERED_KEYS)))
+        self.starts: dict[str, datetime] = {}
+        # Accumulator values at the start of each period
+        self._baselines: dict[str, dict[str, float]] = {period: {} for period in PERIODS}
+        self._day: date | None = None
+        self._pending = True  # some baselines wait for their total to be restored
+
+    def advance(self, timestamp: datetime) -> None:
+        """Move on to timestamp, the newest measurement integrated."""
+        day = dt_util.as_local(timestamp).date()
+        if day != self._day:
+            self._day = day
+            for period in PERIODS:
+                start = period_start(timestamp, period)
+                if start != self.starts.get(period):
+                    self.starts[period] = start
+                    self._baselines[period] = {}
+                    self._pending = True
+
+        if self._pending:
+            self._pending = False
+            for baselines in self._baselines.values():
+                for key, accumulator in self._accumulators.items():
+                    if key in baselines:
+                        continue
+                    if accumulator.restored:
+                        baselines[key] = accumulator.value
+                    else:
+                        self._pending = True
+
+    def value(self, key: str, period: str) -> float | None:
+        """Return the energy (kWh) of 'key' in the current period."""
+        baseline = self._baselines[period].get(key)
+        if baseline is None:
+            return None
+        return round(max(0.0, self._accumulators[key].value - baseline), 3)
+
+    def as_dict(self) -> dict:
+        """Return the periods and baselines, to continue after a restart."""
+        return {
+            "starts": {period: start.isoformat() for period, start in self.starts.items()},
+            "baselines": self._baselines,
+        }
+
+    def load(self, state: dict) -> None:
+        """Continue from a state saved by as_dict()."""
+        for period, start in state.get("starts", {}).items():
+            if period in self._baselines:
+                self.starts[period] = dt_util.as_local(dt_util.parse_datetime(start))
+                self._baselines[period] = {
+                    key: float(value)
+                    for key, value in state.get("baselines", {}).get(period, {}).items()
+                    if key in self._accumulators
+                }
+        if PERIOD_DAILY in self.starts:
+            self._day = self.starts[PERIOD_DAILY].date()
+        self._pending = True
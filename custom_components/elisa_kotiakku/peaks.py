@@ -0,0 +1,132 @@
+"""Power tariff peak tracking for Elisa Kotiakku.
+
+Many distribution companies bill by the highest hourly average grid import of
+the month. The tracker integrates total_grid_import_kw into local clock hours
+as measurements arrive, with the same left rule as the energy integrator: each
+measurement's power holds until the next one. When an hour is over, its
+average goes into the month's PEAK_HOURS highest hours, a short sorted list.
+Every measurement costs the same, however long the month has been running.
+Periods older than the newest one are not taken in.
+"""
+
+from bisect import insort
+from datetime import datetime, timedelta
+
+from homeassistant.util import dt as dt_util
+
+from .const import MAX_INTEGRATION_GAP, PEAK_HOURS
+
+HOUR = timedelta(hours=1)
+
+
+def clock_hour(timestamp: datetime) -> datetime:
+    """Return the start (UTC) of the local clock hour that contains timestamp."""
+    return dt_util.as_utc(dt_util.as_local(timestamp).replace(minute=0, second=0, microsecond=0))
+
+
+def _month(hour: datetime) -> tuple[int, int]:
+    local = dt_util.as_local(hour)
+    return local.year, local.month
+
+
+class KotiakkuPeakTracker:
+    """Hourly average grid import of the current hour and the month's highest hours."""
+
+    def __init__(self):
+        self.hour: datetime | None = None  # start of the hour being filled
+        self.energy = 0.0  # kWh of the hour up to last_time
+        self.covered = 0.0  # seconds of the hour with data
+        self.last_time: datetime | None = None
+        self.last_power: float | None = None
+        self.month: tuple[int, int] | None = None
+        # (-average kW, hour start), highest first
+        self._peaks: list[tuple[float, datetime]] = []
+        self.previous_month_peak: float | None = None
+
+    def add(self, timestamp: datetime, power: float | None) -> bool:
+        """Take in the grid import (kW) of a measurement starting at timestamp."""
+        if self.last_time is not None and timestamp <= self.last_time:
+            return False
+
+        if self.last_power is not None and (timestamp - self.last_time).total_seconds() < MAX_INTEGRATION_GAP:
+            # At most a few hour boundaries lie in between
+            start = self.last_time
+            while start < timestamp:
+                self._roll(start)
+                end = min(timestamp, self.hour + HOUR)
+                seconds = (end - start).total_seconds()
+                self.energy += self.last_power * seconds / 3600
+                self.covered += seconds
+                start = end
+        self._roll(timestamp)
+
+        self.last_time = timestamp
+        self.last_power = power
+        return True
+
+    def _roll(self, timestamp: datetime) -> None:
+        """Move on to the hour of timestamp, closing the current one."""
+        hour = clock_hour(timestamp)
+        if self.hour is not None and hour <= self.hour:
+            return
+        if self.hour is not None and self.covered > 0:
+            self._add_peak(self.energy * 3600 / self.covered, self.hour)
+        month = _month(hour)
+        if month != self.month:
+            if self.month is not None:
+                self.previous_month_peak = self.peak
+            self.month = month
+            self._peaks = []
+        self.hour = hour
+        self.energy = self.covered = 0.0
+
+    def _add_peak(self, average: float, hour: datetime) -> None:
+        if len(self._peaks) < PEAK_HOURS or -average < self._peaks[-1][0]:
+            insort(self._peaks, (-average, hour))
+            del self._peaks[PEAK_HOURS:]
+
+    @property
+    def peak(self) -> float | None:
+        """Return the highest hourly average (kW) of the month's finished hours."""
+        return -self._peaks[0][0] if self._peaks else None
+
+    @property
+    def peaks(self) -> list[tuple[datetime, float]]:
+        """Return the month's highest hours as (hour start, average kW), highest first."""
+        return [(hour, -average) for average, hour in self._peaks]
+
+    def projection(self) -> float | None:
+        """Return the average (kW) the current hour ends up with if the import stays as it is now."""
+        if self.hour is None or self.last_power is None:
+            return None
+        remaining = max(0.0, (self.hour + HOUR - self.last_time).total_seconds())
+        seconds = self.covered + remaining
+        if seconds <= 0:
+            return self.last_power
+        return (self.energy + self.last_power * remaining / 3600) * 3600 / seconds
+
+    def as_dict(self) -> dict:
+        """Return the tracker state, to continue after a restart."""
+        return {
+            "hour": self.hour.isoformat() if self.hour else None,
+            "energy": self.energy,
+            "covered": self.covered,
+            "last_time": self.last_time.isoformat() if self.last_time else None,
+            "last_power": self.last_power,
+            "month": list(self.month) if self.month else None,
+            "peaks": [[hour.isoformat(), average] for hour, average in self.peaks],
+            "previous_month_peak": self.previous_month_peak,
+        }
+
+    def load(self, state: dict) -> None:
+        """Continue from a state saved by as_dict()."""
+        self.hour = dt_util.parse_datetime(state["hour"]) if state.get("hour") else None
+        self.energy = float(state.get("energy", 0.0))
+        self.covered = float(state.get("covered", 0.0))
+        self.last_time = dt_util.parse_datetime(state["last_time"]) if state.get("last_time") else None
+        self.last_power = state.get("last_power")
+        self.month = tuple(state["month"]) if state.get("month") else None
+        self._peaks = sorted(
+            (-float(average), dt_util.parse_datetime(hour)) for hour, average in state.get("peaks", [])
+        )[:PEAK_HOURS]
+        self.previous_month_peak = state.get("previous_month_peak")
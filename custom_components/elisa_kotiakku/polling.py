@@ -0,0 +1,167 @@
+"""Measurement-aligned poll planning for Elisa Kotiakku.
+
+The API publishes one measurement period at a fixed cadence, some time after
+the period has ended. Polling on a fixed timer started at an arbitrary moment
+picks the data up half an interval late on average. The planner learns the
+publish cadence and lag from the measurement timestamps and times the next
+poll just after the next expected publish, while keeping polls at least one
+scan interval apart. When an expected measurement is late, the publish is
+looked for a little later with every following poll (LATE_RETRY_DELAYS), so
+the polls move after the new publish time without extra requests: late or
+not, there is never more than one request per scan interval.
+"""
+
+from collections import deque
+from datetime import datetime, timedelta
+from statistics import median
+
+from .const import LATE_RETRY_DELAYS, POLL_LATENESS, PUBLISH_MARGIN
+
+# How many cadence and lag observations are kept
+_SAMPLES = 12
+
+
+class KotiakkuPollPlanner:
+    """Learns the publish cadence/offset and plans the next poll."""
+
+    def __init__(self, scan_interval):
+        self.scan_interval = timedelta(seconds=scan_interval)
+        self._cadences = deque(maxlen=_SAMPLES)
+        self._lags = deque(maxlen=_SAMPLES)
+        self._newest_end: datetime | None = None
+        self._late_retries = 0
+        # Lag (seconds) to look for the publish at least, since a measurement
+        # was late, until _floor_polls more new periods have come in
+        self._floor: float | None = None
+        self._floor_polls = 0
+        # Poll time handed out last, publish margin included, and the end of
+        # the period it is meant to pick up
+        self._planned: datetime | None = None
+        self._planned_end: datetime | None = None
+
+    @property
+    def cadence(self) -> timedelta | None:
+        """Typical time between two published measurement periods."""
+        if not self._cadences:
+            return None
+        return timedelta(seconds=median(self._cadences))
+
+    @property
+    def publish_lag(self) -> timedelta | None:
+        """How long after the end of a period it becomes available."""
+        if not self._lags and self._floor is None:
+            return None
+        # Every observation is the true lag plus however long the poll came
+        # after the publish, so the smallest one is the best estimate. A late
+        # measurement proved it too short, look later for a while.
+        lag = max(0.0, min(self._lags, default=0.0))
+        if self._floor is not None:
+            lag = max(lag, self._floor)
+        return timedelta(seconds=lag)
+
+    def expected_publish(self) -> datetime | None:
+        """When the period after the newest known one should be available."""
+        cadence = self.cadence
+        if self._newest_end is None or cadence is None or self.publish_lag is None:
+            return None
+        return self._newest_end + cadence + self.publish_lag
+
+    def _on_schedule(self, now: datetime, planned: datetime | None = None) -> bool:
+        """Return True if a poll at 'now' is the one planned (last), landing at most POLL_LATENESS late."""
+        planned = planned or self._planned
+        return planned is not None and planned <= now <= planned + timedelta(seconds=POLL_LATENESS)
+
+    def observe(self, now: datetime, starts: list[datetime], newest_end: datetime | None) -> bool:
+        """Record a poll made at 'now' returning periods beginning at 'starts'.
+
+        'starts' is sorted oldest first. 'newest_end' is the end of the newest
+        period, if the API reported it. Returns True if the poll brought a
+        period newer than any seen before.
+        """
+        if not starts:
+            return False
+
+        for previous, current in zip(starts, starts[1:]):
+            self._cadences.append((current - previous).total_seconds())
+
+        cadence = self.cadence
+        if newest_end is None:
+            if cadence is None:
+                return False
+            newest_end = starts[-1] + cadence
+
+        if self._newest_end is not None and newest_end <= self._newest_end:
+            return False
+
+        if self._newest_end is not None and len(starts) == 1:
+            # Single-item responses only reveal the cadence across polls
+            self._cadences.append((newest_end - self._newest_end).total_seconds())
+
+        # Only a poll that directly follows the previous period says anything
+        # about the publish lag, after a gap the period may have been waiting
+        if self._newest_end is None or cadence is None or newest_end - self._newest_end <= cadence * 1.5:
+            if not self._on_schedule(now):
+                self._lags.append((now - newest_end).total_seconds())
+            elif newest_end >= self._planned_end:
+                # The margin, and however late the poll landed, were our own
+                # doing. Counting them as lag would push every following poll
+                # later, until they slip a period.
+                self._lags.append((self._planned - newest_end).total_seconds() - PUBLISH_MARGIN)
+            # Otherwise the period the poll was meant for is late, see next_interval()
+
+        self._newest_end = newest_end
+        if self._floor is not None:
+            self._floor_polls -= 1
+            if self._floor_polls <= 0:
+                self._floor = None
+        return True
+
+    def next_interval(self, now: datetime, new_data: bool) -> timedelta:
+        """Return the delay until the next poll."""
+        previous, self._planned = self._planned, None
+        expected = self.expected_publish()
+        if expected is None:
+            return self.scan_interval
+
+        # A poll lands a little after the time it was planned for (jitter, the
+        # request itself). Spacing the next one from 'now' would add that every
+        # time and push the polls a whole cadence later, so it is spaced from
+        # the planned time as long as the poll came in on time.
+        earliest = now + self.scan_interval
+        if self._on_schedule(now, previous):
+            earliest = previous + self.scan_interval
+
+        cadence = self.cadence
+        if now < expected:
+            self._late_retries = 0
+        elif new_data or not self._late_retries:
+            # The period after the newest one should be out by now, so its lag
+            # is longer than thought. Look for it later, more so each time.
+            # While the API brings nothing new at all it is stuck, and how long
+            # it has been says nothing more about the lag.
+            step = LATE_RETRY_DELAYS[min(self._late_retries, len(LATE_RETRY_DELAYS) - 1)]
+            self._floor = (now - self._newest_end - cadence).total_seconds() + step
+            self._floor_polls = _SAMPLES // 2
+            self._late_retries += 1
+            if self._late_retries > 1:
+                # Late again, not a one-off: the publish has moved, forget the lags it disproves
+                self._lags = deque((lag for lag in self._lags if lag >= self._floor - step), maxlen=_SAMPLES)
+            expected = self.expected_publish()
+
+        # Next publish time in phase, a scan interval after the previous poll
+        target = earliest + (expected + timedelta(seconds=PUBLISH_MARGIN) - earliest) % cadence
+        periods = round((target - expected) / cadence)
+        self._planned = target
+        self._planned_end = self._newest_end + cadence * (1 + periods)
+        return target - now
+
+    def as_dict(self) -> dict:
+        """Return the planner state, for diagnostics."""
+        expected = self.expected_publish()
+        return {
+            "cadence": self.cadence.total_seconds() if self.cadence else None,
+            "publish_lag": self.publish_lag.total_seconds() if self.publish_lag is not None else None,
+            "expected_publish": expected.isoformat() if expected else None,
+            "planned_poll": self._planned.isoformat() if self._planned else None,
+            "late_retries": self._late_retries,
+        }
@@ -0,0 +1,108 @@
+"""Rolling self-sufficiency and self-consumption for Elisa Kotiakku.
+
+The integrator's energy totals are running (prefix) sums, so the energy of any
+window is the current total minus the total at the start of the window. Each
+window keeps samples of the four totals it needs, at most RATIO_WINDOW_SAMPLES
+spread over its length, and drops those that fall out at the front. Every
+measurement appends at most one sample and drops a few, whatever the length
+of the window, and the ratios are worked out from two samples:
+
+    self-sufficiency = 1 - grid_to_house / house
+    self-consumption = (solar - solar_to_grid) / solar
+"""
+
+from collections import deque
+from datetime import datetime, timedelta
+
+from homeassistant.util import dt as dt_util
+
+from .const import RATIO_MIN_ENERGY, RATIO_WINDOW_SAMPLES, RATIO_WINDOWS
+
+# Energy totals sampled, in this order
+RATIO_INPUTS = ("solar_energy_kwh", "solar_to_grid_kwh", "grid_to_house_kwh", "house_energy_kwh")
+
+
+def _percent(part: float, whole: float) -> float | None:
+    """Return part / whole as a percentage within 0..100, None for too little energy."""
+    if whole < RATIO_MIN_ENERGY:
+        return None
+    return round(100 * min(1.0, max(0.0, part / whole)), 1)
+
+
+class KotiakkuRollingRatios:
+    """Self-sufficiency and solar self-consumption over the RATIO_WINDOWS."""
+
+    def __init__(self, integrator):
+        self._accumulators = integrator.resolve(*RATIO_INPUTS)
+        # (time, totals) samples per window, oldest first
+        self._samples: dict[str, deque] = {window: deque() for window in RATIO_WINDOWS}
+        self._last: tuple[datetime, tuple[float, ...]] | None = None
+
+    def advance(self, timestamp: datetime) -> None:
+        """Sample the totals at timestamp, the newest measurement integrated."""
+        # Totals jump when they are restored, sample them only after that
+        if not all(accumulator.restored for accumulator in self._accumulators):
+            return
+        totals = tuple(accumulator.value for accumulator in self._accumulators)
+        self._last = (timestamp, totals)
+
+        for window, seconds in RATIO_WINDOWS.items():
+            samples = self._samples[window]
+            if not samples or (timestamp - samples[-1][0]).total_seconds() >= seconds / RATIO_WINDOW_SAMPLES:
+                samples.append(self._last)
+            # Keep the newest sample at or before the window start
+            start = timestamp - timedelta(seconds=seconds)
+            while len(samples) > 1 and samples[1][0] <= start:
+                samples.popleft()
+
+    def _sums(self, window: str) -> tuple[float, ...] | None:
+        """Return the energy (kWh) of each input over the window."""
+        samples = self._samples[window]
+        if not samples or self._last is None:
+            return None
+        first = samples[0][1]
+        return tuple(total - before for total, before in zip(self._last[1], first))
+
+    def self_sufficiency(self, window: str) -> float | None:
+        """Return the share (%) of the house consumption not taken from the grid."""
+        sums = self._sums(window)
+        if sums is None:
+            return None
+        _, _, grid_to_house, house = sums
+        return _percent(house - grid_to_house, house)
+
+    def self_consumption(self, window: str) -> float | None:
+        """Return the share (%) of the solar energy not sold to the grid."""
+        sums = self._sums(window)
+        if sums is None:
+            return None
+        solar, solar_to_grid, _, _ = sums
+        return _percent(solar - solar_to_grid, solar)
+
+    def covered_hours(self, window: str) -> float | None:
+        """Return the hours the window has data for, up to its length."""
+        samples = self._samples[window]
+        if not samples or self._last is None:
+            return None
+        seconds = min((self._last[0] - samples[0][0]).total_seconds(), RATIO_WINDOWS[window])
+        return round(seconds / 3600, 2)
+
+    def as_dict(self) -> dict:
+        """Return the samples, to continue after a restart."""
+        return {
+            window: [[time.isoformat(), *totals] for time, totals in samples]
+            for window, samples in self._samples.items()
+        }
+
+    def load(self, state: dict) -> None:
+        """Continue from a state saved by as_dict()."""
+        for window, samples in state.items():
+            if window not in self._samples:
+                continue
+            self._samples[window] = deque(
+                (dt_util.parse_datetime(time), tuple(float(total) for total in totals))
+                for time, *totals in samples
+                if len(totals) == len(RATIO_INPUTS)
+            )
+        newest = [samples[-1] for samples in self._samples.values() if samples]
+        self._last = max(newest, key=lambda sample: sample[0]) if newest else None
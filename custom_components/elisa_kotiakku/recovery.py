@@ -0,0 +1,263 @@
+"""Gap recovery for Elisa Kotiakku.
+
+When Home Assistant was down or the API could not be reached, the measurements
+in between never passed through the integrator. Instead of dropping the energy
+of such a gap (or stretching one measurement across it), the missing time range
+is requested from the API once it is reachable again and integrated exactly.
+
+Gaps come from two places:
+
+- The coordinator sees a measurement that does not follow the previous one.
+- The integrator state stored by the coordinator, or without one the
+  checkpoint restored by the energy sensors: the period the totals were
+  integrated up to, and any gaps that were still pending at shutdown.
+
+Periods still found in the measurement history file (e.g. written just before
+a crash) are used as they are. The range is only requested from the API when
+the history doesn't cover it, one RECOVERY_CHUNK at a time. Parsing, derivation and the
+integration itself run in an executor as one vectorized pass, so days of data
+don't block the event loop.
+
+Failed recoveries back off on their own (see backoff.py), apart from the live
+polls, and are retried after a successful poll once the delay is over. Gaps
+older than MAX_RECOVERY_AGE are given up.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any
+
+import numpy as np
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.restore_state import ExtraStoredData
+from homeassistant.util import dt as dt_util
+
+from .backoff import KotiakkuBackoff, KotiakkuFetchError, classify_exception
+from .const import ATTR_PERIOD_START, MAX_RECOVERY_AGE, RECOVERY_CHUNK, TIMEOUT_MAX
+from .derivation import derive_columns
+from .fetcher import async_get_fetch_scheduler
+from .measurement import RAW_FIELDS, parse_measurements, to_float
+from .tariff import tariff_slot
+
+_LOGGER = logging.getLogger(__name__)
+
+
+@dataclass
+class KotiakkuCheckpoint(ExtraStoredData):
+    """Where a restored total stands: integrated up to 'time', except 'gaps'."""
+
+    time: datetime | None
+    gaps: list[tuple[datetime, datetime]] = field(default_factory=list)
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "time": self.time.isoformat() if self.time else None,
+            "gaps": [[start.isoformat(), end.isoformat()] for start, end in self.gaps],
+        }
+
+    @classmethod
+    def from_dict(cls, restored: dict[str, Any]) -> KotiakkuCheckpoint | None:
+        try:
+            time = dt_util.parse_datetime(restored["time"]) if restored.get("time") else None
+            gaps = [
+                (dt_util.parse_datetime(start), dt_util.parse_datetime(end))
+                for start, end in restored.get("gaps", [])
+            ]
+        except (KeyError, TypeError, ValueError):
+            return None
+        if None in (bound for gap in gaps for bound in gap):
+            return None
+        return cls(time, gaps)
+
+
+def integrate_gap(integrator, ctx, raw_pages, start, end):
+    """Parse, derive and integrate the measurements of a gap (executor job).
+
+    Returns (measurements, totals): the (period start, measurement) pairs within
+    [start, end], oldest first, and what each accumulator gains over them.
+    """
+    timed = {}
+    for raw_data in raw_pages:
+        for period_start, measurement in parse_measurements(raw_data)[0]:
+            if start <= period_start <= end:
+                timed.setdefault(period_start, measurement)
+    measurements = sorted(timed.items(), key=lambda item: item[0])
+    if len(measurements) < 2:
+        return measurements, {}
+
+    # Missing raw values are NaN for the integration, but 0 for the
+    # derivations, like on the live path
+    raw_columns = {
+        key: np.array([to_float(measurement.get(key)) for _, measurement in measurements])
+        for key in RAW_FIELDS
+    }
+    inputs = {key: np.nan_to_num(column) for key, column in raw_columns.items()}
+    inputs["tariff_slot"] = [tariff_slot(period_start) for period_start, _ in measurements]
+    columns = derive_columns(inputs, ctx)
+    columns.update(raw_columns)
+
+    times = [period_start.timestamp() for period_start, _ in measurements]
+    return measurements, integrator.integrate_columns(times, columns)
+
+
+class KotiakkuGapRecovery:
+    """Keeps track of unrecovered gaps of a coordinator and recovers them."""
+
+    def __init__(self, hass: HomeAssistant, coordinator):
+        self.hass = hass
+        self.coordinator = coordinator
+        self.gaps: list[tuple[datetime, datetime]] = []
+        # Restored checkpoint waiting for the first measurement of this run
+        self.resume_from: datetime | None = None
+        self._resumed = False
+        self._task = None
+        # Gap the running recovery is working on, left alone by _drop_expired()
+        self._recovering: tuple[datetime, datetime] | None = None
+        # Range request failures, kept apart from the live polls
+        self.backoff = KotiakkuBackoff()
+
+    @callback
+    def async_resume(self, checkpoint: KotiakkuCheckpoint | None):
+        """Take in the checkpoint restored by a total sensor (first one wins)."""
+        if checkpoint is None or self._resumed:
+            return
+        self._resumed = True
+
+        for start, end in checkpoint.gaps:
+            self.async_add_gap(start, end)
+
+        first_time = self.coordinator.integrator.first_time
+        if checkpoint.time is None:
+            return
+        if first_time is None:
+            self.resume_from = checkpoint.time
+        elif first_time > checkpoint.time:
+            self.async_add_gap(checkpoint.time, first_time)
+
+    @callback
+    def async_restore_gaps(self, gaps):
+        """Take in the gaps stored with the integrator state.
+
+        The stored integrator state is newer than any sensor checkpoint, so
+        those are ignored from now on.
+        """
+        self._resumed = True
+        for start, end in gaps:
+            if start is not None and end is not None:
+                self.async_add_gap(start, end)
+
+    @callback
+    def async_add_gap(self, start: datetime, end: datetime):
+        """Queue the range [start, end] for recovery and start working on it."""
+        start = max(start, dt_util.utcnow() - timedelta(seconds=MAX_RECOVERY_AGE))
+        if start >= end:
+            return
+
+        # Gaps never overlap: each one ends where the integrator picked up again
+        if (start, end) in self.gaps:
+            return
+        self.gaps = sorted(self.gaps + [(start, end)])
+
+        _LOGGER.debug("Measurement gap %s - %s queued for recovery", start, end)
+        self.async_retry()
+
+    @callback
+    def async_retry(self):
+        """Start recovering the pending gaps, unless already running or backing off."""
+        self._drop_expired()
+        if self.backoff.delay(dt_util.utcnow()):
+            return
+        if self.gaps and self._task is None:
+            self._task = self.hass.async_create_background_task(
+                self._async_recover(), f"{self.coordinator.name} gap recovery"
+            )
+
+    @callback
+    def async_cancel(self):
+        """Stop a recovery in progress."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def async_stop(self):
+        """Stop a recovery in progress and wait until it has."""
+        task = self._task
+        self.async_cancel()
+        if task is not None:
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+
+    def _drop_expired(self):
+        """Give up the parts of gaps that are older than MAX_RECOVERY_AGE."""
+        oldest = dt_util.utcnow() - timedelta(seconds=MAX_RECOVERY_AGE)
+        if not self.gaps or self.gaps[0][0] >= oldest:
+            return
+        gaps = []
+        for start, end in self.gaps:
+            if (start, end) == self._recovering:
+                # Its range is being fetched already, whatever it brings is kept
+                gaps.append((start, end))
+            elif end <= oldest:
+                _LOGGER.warning("Measurement gap %s - %s is too old to recover, its energy is lost", start, end)
+            else:
+                gaps.append((max(start, oldest), end))
+        self.gaps = gaps
+
+    def _covers(self, measurements, start, end):
+        """Return True if the measurements span [start, end] without missing periods."""
+        if not measurements:
+            return False
+        max_step = (self.coordinator.poll_planner.cadence or self.coordinator.poll_planner.scan_interval) * 1.5
+        starts = [dt_util.parse_datetime(item[ATTR_PERIOD_START]) for item in measurements]
+        if starts[0] != start or starts[-1] != end:
+            return False
+        return all(current - previous <= max_step for previous, current in zip(starts, starts[1:]))
+
+    async def _async_recover(self):
+        """Recover the pending gaps oldest first, stop at the first failure."""
+        scheduler = async_get_fetch_scheduler(self.hass)
+        integrator = self.coordinator.integrator
+        try:
+            while self.gaps:
+                start, end = self._recovering = self.gaps[0]
+                history = self.coordinator.history
+                pages = [await self.hass.async_add_executor_job(history.measurements, start, end)]
+
+                chunk_start = start
+                if self._covers(pages[0], start, end):
+                    chunk_start = end
+                while chunk_start < end:
+                    chunk_end = min(chunk_start + timedelta(seconds=RECOVERY_CHUNK), end)
+                    pages.append(await scheduler.async_fetch_range(self.coordinator, chunk_start, chunk_end))
+                    chunk_start = chunk_end
+
+                measurements, totals = await self.hass.async_add_executor_job(
+                    integrate_gap, integrator, self.coordinator.derivation_context(), pages, start, end
+                )
+
+                self.gaps.remove((start, end))
+                integrator.add(totals)
+                if measurements:
+                    self.coordinator.statistics.async_add_measurements(measurements)
+                _LOGGER.debug(
+                    "Recovered %s measurements for the gap %s - %s", len(measurements), start, end
+                )
+                self.backoff.record_success()
+                self.coordinator.async_update_listeners()
+                self.coordinator.async_schedule_save()
+        except Exception as err:  # pylint: disable=broad-except
+            # Retried after a successful poll, once the backoff allows
+            if not isinstance(err, KotiakkuFetchError):
+                err = classify_exception(err, TIMEOUT_MAX)
+            self.backoff.record_failure(err, dt_util.utcnow())
+            log = _LOGGER.warning if self.backoff.failures == 1 else _LOGGER.debug
+            log("Gap recovery failed (%s), retrying in %s: %s", err.kind, self.backoff.delay(dt_util.utcnow()), err)
+        finally:
+            self._task = None
+            self._recovering = None
@@ -1,6 +1,7 @@
 """Sensors for Elisa Kotiakku integration."""
 
-from homeassistant.util import dt as dt_util
+from datetime import timedelta
+
 from homeassistant.components.sensor import (
     SensorEntity,
     RestoreEntity,
@@ -14,12 +15,27 @@ from homeassistant.const import (
     PERCENTAGE,
 )
 
-from homeassistant.helpers import entity_registry as er
 from homeassistant.const import UnitOfTime
+from homeassistant.core import callback
+from homeassistant.helpers import entity_registry as er
 from homeassistant.helpers.entity import EntityCategory
 from homeassistant.helpers.update_coordinator import CoordinatorEntity
-from homeassistant.util import slugify
+from homeassistant.util import dt as dt_util, slugify
 from .const import DOMAIN, MANUFACTURER, MODEL, CONF_NAME, DEFAULT_NAME, CONF_POWER_UNIT, DEFAULT_POWER_UNIT, UNIT_W, CONF_BATTERY_CAPACITY, DEFAULT_BATTERY_CAPACITY
+from .const import (
+    STATE_HEARTBEAT,
+    DEADBAND_POWER,
+    DEADBAND_ENERGY,
+    DEADBAND_TEMPERATURE,
+    DEADBAND_PERCENT,
+    DEADBAND_SAVINGS_RATE,
+    DEADBAND_SAVINGS,
+    RATIO_WINDOWS,
+)
+from .derivation import format_target_time
+from .measurement import FIELD_INDEX
+from .meters import METERED_KEYS, PERIOD_WEEKLY, PERIODS, meter_key
+from .recovery import KotiakkuCheckpoint
 
 # Mapping of sensor keys to Material Design Icons (MDI)
 # If a key is not here or set to None, HA will fall back to DeviceClass defaults
@@ -50,7 +66,26 @@ ICON_MAP = {
     "battery_to_grid_kwh": "mdi:home-battery",
     "total_battery_charge_kwh": "mdi:battery-charging",
     "total_grid_export_kwh": "mdi:transmission-tower-import",
+    "solar_energy_daily_kwh": "mdi:solar-power-variant",
+    "solar_energy_weekly_kwh": "mdi:solar-power-variant",
+    "solar_energy_monthly_kwh": "mdi:solar-power-variant",
+    "house_energy_daily_kwh": "mdi:home-lightning-bolt",
+    "house_energy_weekly_kwh": "mdi:home-lightning-bolt",
+    "house_energy_monthly_kwh": "mdi:home-lightning-bolt",
+    "total_grid_import_daily_kwh": "mdi:transmission-tower-export",
+    "total_grid_import_weekly_kwh": "mdi:transmission-tower-export",
+    "total_grid_import_monthly_kwh": "mdi:transmission-tower-export",
+    "total_grid_export_daily_kwh": "mdi:transmission-tower-import",
+    "total_grid_export_weekly_kwh": "mdi:transmission-tower-import",
+    "total_grid_export_monthly_kwh": "mdi:transmission-tower-import",
+    "total_battery_charge_daily_kwh": "mdi:battery-charging",
+    "total_battery_charge_weekly_kwh": "mdi:battery-charging",
+    "total_battery_charge_monthly_kwh": "mdi:battery-charging",
+    "total_battery_discharge_daily_kwh": "mdi:battery-arrow-down",
+    "total_battery_discharge_weekly_kwh": "mdi:battery-arrow-down",
+    "total_battery_discharge_monthly_kwh": "mdi:battery-arrow-down",
     "spot_price_cents_per_kwh":  "mdi:cash-fast",
+    "import_price_cents_per_kwh": "mdi:cash-fast",
     "battery_efficiency_ratio": "mdi:percent",
     "battery_charge_efficiency": "mdi:battery-charging-70",
     "battery_discharge_efficiency": "mdi:battery-arrow-down",
@@ -58,9 +93,35 @@ ICON_MAP = {
     "time_to_90_percent": "mdi:clock-outline",
     "time_to_15_percent": "mdi:clock-outline",
     "net_savings_rate": "mdi:calculator",
-    "battery_loss_kwh": "mdi:heat-wave"
+    "battery_loss_kwh": "mdi:heat-wave",
+    "grid_to_house_cost_eur": "mdi:cash-minus",
+    "grid_to_battery_cost_eur": "mdi:cash-minus",
+    "battery_to_house_savings_eur": "mdi:cash-plus",
+    "solar_to_grid_value_eur": "mdi:cash-plus",
+    "grid_import_hour_projection_kw": "mdi:transmission-tower-export",
+    "grid_import_month_peak_kw": "mdi:chart-bell-curve-cumulative",
+    "self_sufficiency_1h_percent": "mdi:home-percent",
+    "self_sufficiency_24h_percent": "mdi:home-percent",
+    "self_sufficiency_7d_percent": "mdi:home-percent",
+    "self_sufficiency_30d_percent": "mdi:home-percent",
+    "self_consumption_1h_percent": "mdi:solar-power-variant",
+    "self_consumption_24h_percent": "mdi:solar-power-variant",
+    "self_consumption_7d_percent": "mdi:solar-power-variant",
+    "self_consumption_30d_percent": "mdi:solar-power-variant",
+    "fetch_latency_p50_ms": "mdi:timer-outline",
+    "fetch_latency_p95_ms": "mdi:timer-alert-outline",
+    "last_update_duration_ms": "mdi:timer-sand",
+    "skipped_updates": "mdi:skip-next-circle-outline",
     }
 
+# Diagnostic sensors: key -> value read from the coordinator
+TIMING_VALUES = {
+    "fetch_latency_p50_ms": lambda coordinator: coordinator.timings.fetch.percentile(0.5),
+    "fetch_latency_p95_ms": lambda coordinator: coordinator.timings.fetch.percentile(0.95),
+    "last_update_duration_ms": lambda coordinator: coordinator.timings.last_update,
+    "skipped_updates": lambda coordinator: coordinator.skipped_updates,
+}
+
 async def async_setup_entry(hass, entry, async_add_entities):
     """Set up sensor platform from a ConfigEntry.
     
@@ -88,24 +149,28 @@ async def async_setup_entry(hass, entry, async_add_entities):
         KotiakkuPowerSensor(coordinator, "battery_to_house_kw", device_id, device_slug, entry),
         KotiakkuPowerSensor(coordinator, "battery_to_grid_kw", device_id, device_slug, entry),
         KotiakkuPowerSensor(coordinator, "battery_loss_kw", device_id, device_slug, entry),
+
+        # Power tariff: hourly average grid import
+        KotiakkuPeakSensor(coordinator, "grid_import_hour_projection_kw", device_id, device_slug, entry),
+        KotiakkuPeakSensor(coordinator, "grid_import_month_peak_kw", device_id, device_slug, entry),
         
-        # Energy Sensors (kWh) - Calculated totals using Riemann sum integration
-        # These take a Power sensor key as input to calculate the Energy over time
-        KotiakkuEnergySensor(coordinator, "solar_energy_kwh", "solar_power_kw", device_id, device_slug, entry),
-        KotiakkuEnergySensor(coordinator, "solar_to_house_kwh", "solar_to_house_kw", device_id, device_slug, entry),
-        KotiakkuEnergySensor(coordinator, "solar_to_battery_kwh", "solar_to_battery_kw", device_id, device_slug, entry),
-        KotiakkuEnergySensor(coordinator, "solar_to_grid_kwh", "solar_to_grid_kw", device_id, device_slug, entry),
-        KotiakkuEnergySensor(coordinator, "grid_to_house_kwh", "grid_to_house_kw", device_id, device_slug, entry),
-        KotiakkuEnergySensor(coordinator, "grid_to_battery_kwh", "grid_to_battery_kw", device_id, device_slug, entry),
-        KotiakkuEnergySensor(coordinator, "battery_to_house_kwh", "battery_to_house_kw", device_id, device_slug, entry),
-        KotiakkuEnergySensor(coordinator, "battery_to_grid_kwh", "battery_to_grid_kw", device_id, device_slug, entry),
-        KotiakkuEnergySensor(coordinator, "house_energy_kwh", "house_power_kw", device_id, device_slug, entry),
-
-        KotiakkuEnergySensor(coordinator, "total_battery_charge_kwh", "battery_charge_total_kw", device_id, device_slug, entry),
-        KotiakkuEnergySensor(coordinator, "total_battery_discharge_kwh", "battery_discharge_total_kw", device_id, device_slug, entry),
-        KotiakkuEnergySensor(coordinator, "total_grid_import_kwh", "total_grid_import_kw", device_id, device_slug, entry),
-        KotiakkuEnergySensor(coordinator, "total_grid_export_kwh", "total_grid_export_kw", device_id, device_slug, entry),
-        KotiakkuEnergySensor(coordinator, "battery_loss_kwh", "battery_loss_kw", device_id, device_slug, entry),
+        # Energy Sensors (kWh) - Totals integrated from power by the coordinator
+        # The source power key of each total is defined in integrator.ENERGY_ACCUMULATORS
+        KotiakkuEnergySensor(coordinator, "solar_energy_kwh", device_id, device_slug, entry),
+        KotiakkuEnergySensor(coordinator, "solar_to_house_kwh", device_id, device_slug, entry),
+        KotiakkuEnergySensor(coordinator, "solar_to_battery_kwh", device_id, device_slug, entry),
+        KotiakkuEnergySensor(coordinator, "solar_to_grid_kwh", device_id, device_slug, entry),
+        KotiakkuEnergySensor(coordinator, "grid_to_house_kwh", device_id, device_slug, entry),
+        KotiakkuEnergySensor(coordinator, "grid_to_battery_kwh", device_id, device_slug, entry),
+        KotiakkuEnergySensor(coordinator, "battery_to_house_kwh", device_id, device_slug, entry),
+        KotiakkuEnergySensor(coordinator, "battery_to_grid_kwh", device_id, device_slug, entry),
+        KotiakkuEnergySensor(coordinator, "house_energy_kwh", device_id, device_slug, entry),
+
+        KotiakkuEnergySensor(coordinator, "total_battery_charge_kwh", device_id, device_slug, entry),
+        KotiakkuEnergySensor(coordinator, "total_battery_discharge_kwh", device_id, device_slug, entry),
+        KotiakkuEnergySensor(coordinator, "total_grid_import_kwh", device_id, device_slug, entry),
+        KotiakkuEnergySensor(coordinator, "total_grid_export_kwh", device_id, device_slug, entry),
+        KotiakkuEnergySensor(coordinator, "battery_loss_kwh", device_id, device_slug, entry),
 
 
         #KotiakkuSumEnergySensor(coordinator, "total_battery_charge_kwh", ["solar_to_battery_kwh", "grid_to_battery_kwh"], device_id, device_slug, entry),
@@ -117,6 +182,7 @@ async def async_setup_entry(hass, entry, async_add_entities):
         KotiakkuTemperatureSensor(coordinator, "battery_temperature_celsius", device_id, device_slug, entry),
         KotiakkuBatterySensor(coordinator, "state_of_charge_percent", device_id, device_slug, entry),
         KotiakkuPriceSensor(coordinator, "spot_price_cents_per_kwh", device_id, device_slug, entry),
+        KotiakkuPriceSensor(coordinator, "import_price_cents_per_kwh", device_id, device_slug, entry),
         KotiakkuChargeEfficiencySensor(coordinator, "battery_charge_efficiency", device_id, device_slug, entry),
         KotiakkuDischargeEfficiencySensor(coordinator, "battery_discharge_efficiency", device_id, device_slug, entry),
         KotiakkuEfficiencySensor(
@@ -144,17 +210,67 @@ async def async_setup_entry(hass, entry, async_add_entities):
         KotiakkuTotalSavingsSensor(
             coordinator, 
             "total_savings_eur", 
-            "net_savings_rate", 
             device_id, 
             device_slug, 
             entry
         ),
 
+        # Cost and value of each flow, priced per measurement period
+        KotiakkuTotalSavingsSensor(coordinator, "grid_to_house_cost_eur", device_id, device_slug, entry),
+        KotiakkuTotalSavingsSensor(coordinator, "grid_to_battery_cost_eur", device_id, device_slug, entry),
+        KotiakkuTotalSavingsSensor(coordinator, "battery_to_house_savings_eur", device_id, device_slug, entry),
+        KotiakkuTotalSavingsSensor(coordinator, "solar_to_grid_value_eur", device_id, device_slug, entry),
+
     ]
 
+    # Energy of the current day, week and month, see meters.py
+    sensors.extend(
+        KotiakkuPeriodMeterSensor(coordinator, key, period, device_id, device_slug, entry)
+        for key in METERED_KEYS
+        for period in PERIODS
+    )
+
+    # Self-sufficiency and self-consumption over rolling windows, see ratios.py
+    sensors.extend(
+        KotiakkuRatioSensor(coordinator, f"{ratio}_{window}_percent", ratio, window, device_id, device_slug, entry)
+        for ratio in ("self_sufficiency", "self_consumption")
+        for window in RATIO_WINDOWS
+    )
+
+    # Update timings, disabled by default
+    sensors.extend(
+        KotiakkuTimingSensor(coordinator, key, device_id, device_slug, entry)
+        for key in TIMING_VALUES
+    )
+
     # Register entities in HA
     async_add_entities(sensors)
 
+@callback
+def async_apply_power_unit(hass, entity_id, unit):
+    """Set the display unit of a power entity when the integration preference changed.
+    
+    The suggested unit only applies when an entity is first registered. The
+    preference last applied is remembered in the entity options, so a unit the
+    user picked in the entity settings is kept until the preference changes again.
+    """
+    ent_reg = er.async_get(hass)
+    entry = ent_reg.async_get(entity_id)
+    if entry is None or entry.options.get(DOMAIN, {}).get(CONF_POWER_UNIT) == unit:
+        return
+
+    ent_reg.async_update_entity_options(
+        entity_id, "sensor", {**entry.options.get("sensor", {}), "unit_of_measurement": unit}
+    )
+    ent_reg.async_update_entity_options(entity_id, DOMAIN, {CONF_POWER_UNIT: unit})
+
+def beyond_deadband(written, value, deadband):
+    """Return True if 'value' differs from the 'written' one by more than 'deadband'."""
+    numbers = (int, float)
+    if isinstance(written, numbers) and isinstance(value, numbers):
+        return abs(value - written) > deadband
+    return value != written
+
 class KotiakkuSensor(CoordinatorEntity, SensorEntity):
     """Base sensor class for Elisa Kotiakku.
     
@@ -166,6 +282,9 @@ class KotiakkuSensor(CoordinatorEntity, SensorEntity):
     _attr_state_class = SensorStateClass.MEASUREMENT
     _attr_suggested_display_precision = 3
 
+    # Smallest change of the value worth a state write, see _write_due
+    _deadband = 0
+
     def __init__(self, coordinator, key, device_name, device_slug, entry):
         """Initialize the base sensor with shared properties."""
         super().__init__(coordinator)
@@ -185,6 +304,13 @@ class KotiakkuSensor(CoordinatorEntity, SensorEntity):
             self._attr_icon = ICON_MAP.get(key)
 
         self.entity_id = f"sensor.{device_slug}_{key}"
+
+        # Position of this sensor's field in the measurement record, if it has one
+        self._index = FIELD_INDEX.get(key)
+
+        # (available, value) and time of the last state write
+        self._written = None
+        self._written_at = None
         
 
     @property
@@ -200,9 +326,12 @@ class KotiakkuSensor(CoordinatorEntity, SensorEntity):
     @property
     def native_value(self):
         """Return the current value from the coordinator's cached data."""
-        if self.coordinator.data is None:
+        data = self.coordinator.data
+        if data is None:
             return None
-        return self.coordinator.data.get(self.key)
+        if self._index is None:
+            return data.get(self.key)
+        return data.value(self._index)
 
     @property
     def _unit_pref(self):
@@ -211,136 +340,169 @@ class KotiakkuSensor(CoordinatorEntity, SensorEntity):
             self._entry.data.get(CONF_POWER_UNIT, DEFAULT_POWER_UNIT)
         )
 
+    def _write_due(self):
+        """Return True if the value moved beyond the deadband, or the heartbeat is due."""
+        if self._written is None or dt_util.utcnow() - self._written_at >= timedelta(seconds=STATE_HEARTBEAT):
+            return True
+        available, value = self._written
+        return self.available != available or beyond_deadband(value, self.native_value, self._deadband)
+
+    @callback
+    def _handle_coordinator_update(self):
+        """Write the state only for a meaningful change, or as a heartbeat."""
+        if self._write_due():
+            self.async_write_ha_state()
+        else:
+            self.coordinator.timings.count_suppressed_write()
+
+    @callback
+    def async_write_ha_state(self):
+        """Write the state, counting the writes made by coordinator updates."""
+        self.coordinator.timings.count_state_write(self.key)
+        self._written = (self.available, self.native_value)
+        self._written_at = dt_util.utcnow()
+        super().async_write_ha_state()
+
 class KotiakkuEnergySensor(RestoreEntity, KotiakkuSensor):
-    """Calculates Energy (kWh) from Power (kW) via Riemann sum.
+    """Energy (kWh) total integrated from Power (kW) by the coordinator.
     
-    Inherits RestoreEntity to ensure energy totals are saved across HA restarts.
-    This class performs a mathematical integration of power over time.
+    The Riemann sum itself runs in the coordinator's integrator, which advances
+    all totals together per measurement. This entity restores its previous total
+    into the integrator at startup and then simply reads the running value.
     """
 
     _attr_device_class = SensorDeviceClass.ENERGY
     _attr_native_unit_of_measurement = UnitOfEnergy.KILO_WATT_HOUR
     _attr_state_class = SensorStateClass.TOTAL_INCREASING
     _attr_last_reset = None
+    _deadband = DEADBAND_ENERGY
 
-    def __init__(self, coordinator, key, power_key, device_id, device_slug, entry, direction=None):
-        """Initialize energy sensor with a reference to its source power key."""
+    def __init__(self, coordinator, key, device_id, device_slug, entry):
+        """Initialize energy sensor with a reference to its integrator accumulator."""
         super().__init__(coordinator, key, device_id, device_slug, entry)
-        self._power_key = power_key
-        self._state = None
-        self._last_run = None
+        self._accumulator = coordinator.integrator.accumulators.get(key)
         self._restored = False
-        self._direction = direction
+        self._checkpoint = None
 
     async def async_added_to_hass(self):
         """Called when entity is added to HA. Restores previous state from database."""
         await super().async_added_to_hass()
         state = await self.async_get_last_state()
         
+        restored = 0.0
         if state is not None and state.state not in ("unknown", "unavailable"):
             try:
-                self._state = float(state.state)
+                restored = float(state.state)
             except ValueError:
-                self._state = 0.0
-        else:
-            self._state = 0.0
-    
-        self._restored = True
-        self._last_run = dt_util.utcnow()
-        
-    def _handle_coordinator_update(self) -> None:
-        """Calculate and return the cumulative energy total.
-        
-        Uses the time difference between the current update and the last update
-        to add (Power * Time) to the total state.
-        """
+                restored = 0.0
 
-        if not self._restored:
-            return
-
-        # Get the timestamp of the last successful API update
-        now = dt_util.utcnow()
-
-        if self.coordinator.data is None:
-            return
-
-        power_val = self.coordinator.data.get(self._power_key)
-        if power_val is None:
-            return
-        power_val = abs(power_val)
-
-        # Initial run sets the timestamp without adding energy
-        if self._last_run is None:
-            self._last_run = now
-            return
+        if self._accumulator is not None:
+            self.coordinator.integrator.restore(self.key, restored)
+        self._restored = True
 
-        # Calculate time delta in hours (for kWh)
-        diff = (now - self._last_run).total_seconds() / 3600
-        
-        if 2.0 > diff > 0:
-            new_state = (self._state or 0.0) + (power_val * diff)
-            if self._state is None or new_state > self._state:
-                self._state = new_state
-        
-        self._last_run = now
+        # Recover the measurements missed since the restored total was written
+        extra = await self.async_get_last_extra_data()
+        if extra is not None:
+            self._checkpoint = KotiakkuCheckpoint.from_dict(extra.as_dict())
+            self.coordinator.recovery.async_resume(self._checkpoint)
+
+    @callback
+    def _handle_coordinator_update(self):
+        # Remember which periods the total we are about to write contains. A
+        # suppressed write keeps the checkpoint of the total last written.
+        if self._write_due():
+            self._checkpoint = KotiakkuCheckpoint(
+                self.coordinator.integrator.last_time, list(self.coordinator.recovery.gaps)
+            )
         super()._handle_coordinator_update()
+
+    @property
+    def extra_restore_state_data(self):
+        return self._checkpoint
     
     @property
     def native_value(self):
-        if not self._restored:
+        if not self._restored or self._accumulator is None:
             return None
-        return round(self._state, 3)
+        return round(self._accumulator.value, 3)
         
 class KotiakkuSumEnergySensor(KotiakkuEnergySensor):
-    """Sums multiple ENERGY entities (kWh), not power."""
+    """Sums multiple ENERGY accumulators (kWh), not power."""
     def __init__(self, coordinator, key, source_keys, device_id, device_slug, entry):
-        # We don't use power_key here, so we pass None to parent
-        super().__init__(coordinator, key, None, device_id, device_slug, entry)
-        self._source_keys = source_keys
-        self._device_slug = device_slug
+        super().__init__(coordinator, key, device_id, device_slug, entry)
+        # Computed from the source accumulators, not integrated
+        self._accumulator = None
+        self._sources = coordinator.integrator.resolve(*source_keys)
 
     @property
     def native_value(self):
-        total = 0.0
-        for k in self._source_keys:
-            # We look for the already calculated energy entities in the state machine
-            state = self.hass.states.get(f"sensor.{self._device_slug}_{k}")
-            if state and state.state not in ("unknown", "unavailable"):
-                total += float(state.state)
-        return round(total, 3)
+        if not all(source.restored for source in self._sources):
+            return None
+        return round(sum(source.value for source in self._sources), 3)
 
 class KotiakkuPowerSensor(KotiakkuSensor):
-    """Sensor for Power (kW) measurements."""
+    """Sensor for Power measurements.
+    
+    The value is always reported in kW. The W/kW preference is applied by
+    Home Assistant's own unit conversion through the suggested unit.
+    """
     _attr_device_class = SensorDeviceClass.POWER
+    _attr_native_unit_of_measurement = UnitOfPower.KILO_WATT
+    _deadband = DEADBAND_POWER
 
-    @property
-    def suggested_display_precision(self) -> int:
-        return self.coordinator.data.get("power_decimals", 3)
+    def __init__(self, coordinator, key, device_name, device_slug, entry):
+        super().__init__(coordinator, key, device_name, device_slug, entry)
+        self._attr_suggested_unit_of_measurement = self._unit_pref
 
-    @property
-    def suggested_unit_of_measurement(self):
-        return self.coordinator.data.get("power_display_unit", "kW")
+    async def async_added_to_hass(self):
+        """Apply a changed W/kW preference to an already registered entity."""
+        await super().async_added_to_hass()
+        async_apply_power_unit(self.hass, self.entity_id, self._unit_pref)
+        self.async_on_remove(self._entry.add_update_listener(self._async_entry_updated))
 
-    @property
-    def native_unit_of_measurement(self):
-        """Return W or kW based on user preference."""
-        return self.coordinator.data.get("power_display_unit", "kW")
+    async def _async_entry_updated(self, hass, entry):
+        """Apply a W/kW preference changed in the options, without a reload."""
+        async_apply_power_unit(hass, self.entity_id, self._unit_pref)
+
+class KotiakkuPeakSensor(KotiakkuPowerSensor):
+    """Hourly average grid import (kW) from the coordinator's peak tracker.
+
+    grid_import_hour_projection_kw: the current hour, if the import stays as it is.
+    grid_import_month_peak_kw: the highest finished hour of the month, with the
+    month's highest hours as attributes.
+    """
 
     @property
     def native_value(self):
-        # Point to the '_display' version created in the coordinator
-        return self.coordinator.data.get(f"{self.key}_display")
+        peaks = self.coordinator.peaks
+        value = peaks.projection() if self.key == "grid_import_hour_projection_kw" else peaks.peak
+        return round(value, 3) if value is not None else None
+
+    @property
+    def extra_state_attributes(self):
+        if self.key != "grid_import_month_peak_kw":
+            return None
+        peaks = self.coordinator.peaks.peaks
+        return {
+            "peak_hours": [
+                {"start": hour.isoformat(), "average_kw": round(average, 3)} for hour, average in peaks
+            ],
+            "mean_of_peaks_kw": round(sum(average for _, average in peaks) / len(peaks), 3) if peaks else None,
+            "previous_month_peak_kw": self.coordinator.peaks.previous_month_peak,
+        }
 
 class KotiakkuTemperatureSensor(KotiakkuSensor):
     """Sensor for Temperature (C) measurements."""
     _attr_device_class = SensorDeviceClass.TEMPERATURE
     _attr_native_unit_of_measurement = UnitOfTemperature.CELSIUS
+    _deadband = DEADBAND_TEMPERATURE
     _attr_suggested_display_precision = 1
 
 class KotiakkuBatterySensor(KotiakkuSensor):
     """Sensor for Battery State of Charge (%)."""
     _attr_device_class = SensorDeviceClass.BATTERY
     _attr_native_unit_of_measurement = PERCENTAGE
+    _deadband = DEADBAND_PERCENT
     _attr_suggested_display_precision = 0
 
 class KotiakkuPriceSensor(KotiakkuSensor):
@@ -354,63 +516,46 @@ class KotiakkuEfficiencySensor(KotiakkuSensor):
     """
     _attr_native_unit_of_measurement = PERCENTAGE
     _attr_suggested_display_precision = 1
+    _deadband = DEADBAND_PERCENT
 
-    def __init__(self, coordinator, key, discharge_unique_suffix, charge_unique_suffix, device_id, device_slug, entry):
-        """Initialize with keys for discharge and charge energy entities."""
+    def __init__(self, coordinator, key, discharge_key, charge_key, device_id, device_slug, entry):
+        """Initialize with the discharge and charge energy accumulators."""
         super().__init__(coordinator, key, device_id, device_slug, entry)
-        self._discharge_suffix = discharge_unique_suffix
-        self._charge_suffix = charge_unique_suffix
-        self._entry_id = entry.entry_id
+        self._discharge, self._charge = coordinator.integrator.resolve(discharge_key, charge_key)
 
     @property
     def native_value(self):
-        """Calculate efficiency using the current states of Energy entities."""
-        # Use the slugified entity IDs to pull directly from the HA state machine
-        ent_reg = er.async_get(self.hass)
-        charge_uid = f"{self._entry_id}_{self._charge_suffix}"
-        discharge_uid = f"{self._entry_id}_{self._discharge_suffix}"
-        charge_entity_id = ent_reg.async_get_entity_id("sensor", "elisa_kotiakku", charge_uid)
-        discharge_entity_id = ent_reg.async_get_entity_id("sensor", "elisa_kotiakku", discharge_uid)
-
-        if not charge_entity_id or not discharge_entity_id:
+        """Calculate efficiency from the integrator's energy totals."""
+        # Guard: If the totals haven't been restored yet, return None
+        if not self._charge.restored or not self._discharge.restored:
             return None
-        
-        charge_state = self.hass.states.get(charge_entity_id)
-        discharge_state = self.hass.states.get(discharge_entity_id)
 
-        # Guard: If entities aren't ready yet, return None
-        if not charge_state or not discharge_state:
+        c = self._charge.value
+        d = self._discharge.value
+        
+        # Avoid Division by Zero if the battery hasn't charged yet
+        if c <= 0:
             return None
             
-        try:
-            c = float(charge_state.state)
-            d = float(discharge_state.state)
-            
-            # Avoid Division by Zero if the battery hasn't charged yet
-            if c <= 0:
-                return None
-                
-            # Efficiency calculation
-            efficiency = (d / c) * 100
-            
-            # Cap at 100% to prevent weird spikes if sensors desync
-            return round(min(efficiency, 100.0), 1)
-            
-        except (ValueError, TypeError):
-            # Handles 'unknown' or 'unavailable' strings in the state machine
-            return None
+        # Efficiency calculation
+        efficiency = (d / c) * 100
+        
+        # Cap at 100% to prevent weird spikes if totals desync
+        return round(min(efficiency, 100.0), 1)
     
 class KotiakkuChargeEfficiencySensor(KotiakkuSensor):
     """Instantaneous battery charge efficiency."""
 
     _attr_native_unit_of_measurement = PERCENTAGE
     _attr_suggested_display_precision = 1
+    _deadband = DEADBAND_PERCENT
     
 class KotiakkuDischargeEfficiencySensor(KotiakkuSensor):
     """Instantaneous battery discharge efficiency."""
 
     _attr_native_unit_of_measurement = PERCENTAGE
     _attr_suggested_display_precision = 1
+    _deadband = DEADBAND_PERCENT
     
 class KotiakkuTimeTargetSensor(KotiakkuSensor):
     """Estimates time remaining to reach a specific SoC target."""
@@ -420,10 +565,18 @@ class KotiakkuTimeTargetSensor(KotiakkuSensor):
     _attr_unit_of_measurement = None
     _attr_suggested_display_precision = None
 
+    @property
+    def native_value(self):
+        data = self.coordinator.data
+        if data is None:
+            return None
+        return format_target_time(data.value(self._index))
+
 class KotiakkuNetSavingsRateSensor(KotiakkuSensor):
     """Real-time net savings rate in €/h (Earnings minus Charging Costs)."""
     _attr_native_unit_of_measurement = "€/h"
     _attr_suggested_display_precision = 3
+    _deadband = DEADBAND_SAVINGS_RATE
 
 class KotiakkuCycleCounterSensor(KotiakkuSensor):
     """Calculates total battery cycles (Total Discharge / Rated Capacity)."""
@@ -434,29 +587,30 @@ class KotiakkuCycleCounterSensor(KotiakkuSensor):
 
     def __init__(self, coordinator, key, discharge_energy_key, capacity, device_id, device_slug, entry):
         super().__init__(coordinator, key, device_id, device_slug, entry)
-        self._discharge_suffix = discharge_energy_key
-        self._entry_id = entry.entry_id
+        (self._discharge,) = coordinator.integrator.resolve(discharge_energy_key)
         self._capacity = float(capacity)
 
+    async def async_added_to_hass(self):
+        await super().async_added_to_hass()
+        self.async_on_remove(self._entry.add_update_listener(self._async_entry_updated))
+
+    async def _async_entry_updated(self, hass, entry):
+        """Count cycles against a battery capacity changed in the options, without a reload."""
+        capacity = float(entry.options.get(CONF_BATTERY_CAPACITY, entry.data.get(CONF_BATTERY_CAPACITY, DEFAULT_BATTERY_CAPACITY)))
+        if capacity != self._capacity:
+            self._capacity = capacity
+            self.async_write_ha_state()
+
     @property
     def suggested_display_precision(self) -> int:
         return 0
 
     @property
     def native_value(self):
-        ent_reg = er.async_get(self.hass)
-        discharge_uid = f"{self._entry_id}_{self._discharge_suffix}"
-        discharge_entity_id = ent_reg.async_get_entity_id("sensor", "elisa_kotiakku", discharge_uid)
-
-        if not discharge_entity_id:
+        if not self._discharge.restored or self._capacity <= 0:
             return None
         
-        discharge_state = self.hass.states.get(discharge_entity_id)
-        
-        if discharge_state is None or discharge_state.state in ("unknown", "unavailable") or self._capacity <= 0:
-            return None
-        
-        cycles = float(discharge_state.state) / self._capacity
+        cycles = self._discharge.value / self._capacity
         return int(cycles)
     
 class KotiakkuBatteryStateSensor(KotiakkuSensor):
@@ -491,62 +645,150 @@ class KotiakkuBatteryStateSensor(KotiakkuSensor):
         return "mdi:battery"
 
 class KotiakkuTotalSavingsSensor(KotiakkuSensor, RestoreEntity):
-    """Integrates Net Savings Rate (€/h) into Total Savings (€) using Riemann sum."""
+    """Total Savings (€), the Net Savings Rate (€/h) integrated by the coordinator."""
 
     _attr_state_class = SensorStateClass.TOTAL
     _attr_native_unit_of_measurement = "€"
     _attr_icon = "mdi:cash-plus"
     _attr_suggested_display_precision = 2
+    _deadband = DEADBAND_SAVINGS
 
-    def __init__(self, coordinator, key, rate_key, device_id, device_slug, entry):
+    def __init__(self, coordinator, key, device_id, device_slug, entry):
         super().__init__(coordinator, key, device_id, device_slug, entry)
-        self._rate_key = rate_key
-        self._state = 0.0  # Initialize to 0.0
-        self._last_run = None
+        self._accumulator = coordinator.integrator.accumulators[key]
         self._restored = False
+        self._checkpoint = None
 
     async def async_added_to_hass(self):
-        """Restore previous savings total from the database."""
+        """Restore previous savings total from the database into the integrator."""
         await super().async_added_to_hass()
         state = await self.async_get_last_state()
+        restored = 0.0
         if state is not None and state.state not in ("unknown", "unavailable"):
             try:
-                self._state = float(state.state)
+                restored = float(state.state)
             except ValueError:
-                self._state = 0.0
+                restored = 0.0
     
+        self.coordinator.integrator.restore(self.key, restored)
         self._restored = True
-        self._last_run = dt_util.utcnow()
+
+        extra = await self.async_get_last_extra_data()
+        if extra is not None:
+            self._checkpoint = KotiakkuCheckpoint.from_dict(extra.as_dict())
+            self.coordinator.recovery.async_resume(self._checkpoint)
         # No need to write state here, the coordinator update will handle it
-        
-    def _handle_coordinator_update(self) -> None:
-        """Calculate the new total exactly when the coordinator gets new data."""
-        # 1. Check if we have data
-        if self.coordinator.data is None:
-            return
-
-        rate_val = self.coordinator.data.get(self._rate_key)
-        now = dt_util.utcnow()
-
-        # 2. Skip if it's the very first run to establish a baseline time
-        if self._last_run is None:
-            self._last_run = now
-            return
-
-        # 3. Calculate the delta
-        if rate_val is not None:
-            diff = (now - self._last_run).total_seconds() / 3600
-            if diff > 0:
-                # The Math: Rate (€/h) * Time (h)
-                self._state += float(rate_val) * diff
-        
-        # 4. Update the timestamp and tell HA to refresh the UI
-        self._last_run = now
-        super()._handle_coordinator_update() # IMPORTANT: Call the parent's update logic
+
+    @callback
+    def _handle_coordinator_update(self):
+        if self._write_due():
+            self._checkpoint = KotiakkuCheckpoint(
+                self.coordinator.integrator.last_time, list(self.coordinator.recovery.gaps)
+            )
+        super()._handle_coordinator_update()
+
+    @property
+    def extra_restore_state_data(self):
+        return self._checkpoint
 
     @property
     def native_value(self):
-        # We just return the internal state that was calculated in the update handler
+        # The integrator keeps the running total, we only present it
         if not self._restored:
             return None
-        return round(self._state, 3)
\ No newline at end of file
+        return round(self._accumulator.value, 3)
+
+class KotiakkuPeriodMeterSensor(KotiakkuSensor):
+    """Energy (kWh) of an energy total in the current day, week or month.
+
+    Read from the coordinator's period meters; last_reset is the local start
+    of the period. The weekly meters are disabled by default.
+    """
+
+    _attr_device_class = SensorDeviceClass.ENERGY
+    _attr_native_unit_of_measurement = UnitOfEnergy.KILO_WATT_HOUR
+    _attr_state_class = SensorStateClass.TOTAL
+    _deadband = DEADBAND_ENERGY
+
+    def __init__(self, coordinator, source, period, device_id, device_slug, entry):
+        super().__init__(coordinator, meter_key(source, period), device_id, device_slug, entry)
+        self._source = source
+        self._period = period
+        self._written_reset = None
+        if period == PERIOD_WEEKLY:
+            self._attr_entity_registry_enabled_default = False
+
+    def _write_due(self):
+        # A new period is written right away, however little it holds yet
+        return super()._write_due() or self.last_reset != self._written_reset
+
+    @callback
+    def async_write_ha_state(self):
+        self._written_reset = self.last_reset
+        super().async_write_ha_state()
+
+    @property
+    def native_value(self):
+        return self.coordinator.meters.value(self._source, self._period)
+
+    @property
+    def last_reset(self):
+        return self.coordinator.meters.starts.get(self._period)
+
+class KotiakkuRatioSensor(KotiakkuSensor):
+    """Self-sufficiency or solar self-consumption (%) over a rolling window.
+
+    Read from the coordinator's rolling ratios; covered_hours tells how much
+    of the window there is data for.
+    """
+
+    _attr_native_unit_of_measurement = PERCENTAGE
+    _attr_suggested_display_precision = 1
+    _deadband = DEADBAND_PERCENT
+
+    def __init__(self, coordinator, key, ratio, window, device_id, device_slug, entry):
+        super().__init__(coordinator, key, device_id, device_slug, entry)
+        self._ratio = getattr(coordinator.ratios, ratio)
+        self._window = window
+
+    @property
+    def native_value(self):
+        return self._ratio(self._window)
+
+    @property
+    def extra_state_attributes(self):
+        return {"covered_hours": self.coordinator.ratios.covered_hours(self._window)}
+
+class KotiakkuTimingSensor(KotiakkuSensor):
+    """Update timings and counters of the coordinator, for diagnosing slow or skipped updates.
+
+    Written after every update, including those that changed no data, rather
+    than with the other entities.
+    """
+
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_entity_registry_enabled_default = False
+    _attr_suggested_display_precision = 1
+
+    def __init__(self, coordinator, key, device_id, device_slug, entry):
+        super().__init__(coordinator, key, device_id, device_slug, entry)
+        self._value = TIMING_VALUES[key]
+        if key.endswith("_ms"):
+            self._attr_device_class = SensorDeviceClass.DURATION
+            self._attr_native_unit_of_measurement = UnitOfTime.MILLISECONDS
+        else:
+            self._attr_state_class = SensorStateClass.TOTAL_INCREASING
+            self._attr_suggested_display_precision = 0
+
+    async def async_added_to_hass(self):
+        await super().async_added_to_hass()
+        self.async_on_remove(self.coordinator.timings.async_add_listener(self.async_write_ha_state))
+
+    @callback
+    def _handle_coordinator_update(self):
+        # Written by the timings listener instead
+        pass
+
+    @property
+    def native_value(self):
+        return self._value(self.coordinator)
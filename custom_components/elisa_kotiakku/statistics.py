@@ -0,0 +1,256 @@
+"""Long-term statistics import for Elisa Kotiakku.
+
+The measurements endpoint returns a list of measurement periods on every poll.
+Instead of relying on the recorder to compile statistics from one entity state
+per poll, every returned period is folded into hourly buckets and the touched
+hours are pushed to the recorder as external statistics, one bulk call per field:
+
+- Power and other measurement fields as hourly mean/min/max.
+- The energy of every flow as hourly sums (kWh), the period's power times its
+  length, with the running total as the sum.
+
+Buckets are kept for STATISTICS_WINDOW hours and stored with the coordinator
+state. A period arriving late (e.g. recovered after a gap) is folded into its
+own hour, and only that hour and the sums of the hours after it are imported
+again. Periods older than the window are not imported.
+"""
+
+import logging
+from datetime import datetime, timedelta
+
+from homeassistant.components.recorder.models import StatisticData, StatisticMetaData
+from homeassistant.components.recorder.statistics import async_add_external_statistics
+from homeassistant.const import PERCENTAGE, UnitOfEnergy, UnitOfPower, UnitOfTemperature
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.util import dt as dt_util
+
+from .const import ATTR_PERIOD_END, DOMAIN, STATISTICS_PERIOD, STATISTICS_WINDOW
+from .measurement import parse_period_time
+
+_LOGGER = logging.getLogger(__name__)
+
+# Measurement fields imported as hourly mean/min/max statistics
+# key: (statistic name suffix, unit)
+STATISTIC_FIELDS = {
+    "battery_power_kw": ("Battery power", UnitOfPower.KILO_WATT),
+    "solar_power_kw": ("Solar power", UnitOfPower.KILO_WATT),
+    "grid_power_kw": ("Grid power", UnitOfPower.KILO_WATT),
+    "house_power_kw": ("House power consumption", UnitOfPower.KILO_WATT),
+    "solar_to_house_kw": ("Solar power to house", UnitOfPower.KILO_WATT),
+    "solar_to_battery_kw": ("Solar power to battery", UnitOfPower.KILO_WATT),
+    "solar_to_grid_kw": ("Solar power to grid", UnitOfPower.KILO_WATT),
+    "grid_to_house_kw": ("Grid power to house", UnitOfPower.KILO_WATT),
+    "grid_to_battery_kw": ("Grid power to battery", UnitOfPower.KILO_WATT),
+    "battery_to_house_kw": ("Battery power to house", UnitOfPower.KILO_WATT),
+    "battery_to_grid_kw": ("Battery power to grid", UnitOfPower.KILO_WATT),
+    "state_of_charge_percent": ("State of charge", PERCENTAGE),
+    "battery_temperature_celsius": ("Battery temperature", UnitOfTemperature.CELSIUS),
+    "spot_price_cents_per_kwh": ("Spot price", "c/kWh"),
+}
+
+# Energy flows imported as hourly sums, integrated from a power field
+# key: (statistic name suffix, power field)
+ENERGY_STATISTIC_FIELDS = {
+    "solar_energy_kwh": ("Solar energy", "solar_power_kw"),
+    "house_energy_kwh": ("House energy consumption", "house_power_kw"),
+    "solar_to_house_kwh": ("Solar energy to house", "solar_to_house_kw"),
+    "solar_to_battery_kwh": ("Solar energy to battery", "solar_to_battery_kw"),
+    "solar_to_grid_kwh": ("Solar energy to grid", "solar_to_grid_kw"),
+    "grid_to_house_kwh": ("Grid energy to house", "grid_to_house_kw"),
+    "grid_to_battery_kwh": ("Grid energy to battery", "grid_to_battery_kw"),
+    "battery_to_house_kwh": ("Battery energy to house", "battery_to_house_kw"),
+    "battery_to_grid_kwh": ("Battery energy to grid", "battery_to_grid_kw"),
+}
+
+
+class _HourBucket:
+    """Running mean/min/max of one field within one clock hour."""
+
+    __slots__ = ("count", "total", "minimum", "maximum")
+
+    def __init__(self, value):
+        self.count = 1
+        self.total = value
+        self.minimum = value
+        self.maximum = value
+
+    def add(self, value):
+        self.count += 1
+        self.total += value
+        if value < self.minimum:
+            self.minimum = value
+        if value > self.maximum:
+            self.maximum = value
+
+
+class _Hour:
+    """The periods, field buckets and flow energies of one clock hour."""
+
+    __slots__ = ("periods", "fields", "energy")
+
+    def __init__(self):
+        self.periods: set[datetime] = set()
+        self.fields: dict[str, _HourBucket] = {}
+        self.energy: dict[str, float] = {}
+
+    def add(self, start: datetime, measurement: dict) -> None:
+        for key in STATISTIC_FIELDS:
+            value = measurement.get(key)
+            if value is None:
+                continue
+            bucket = self.fields.get(key)
+            if bucket is None:
+                self.fields[key] = _HourBucket(float(value))
+            else:
+                bucket.add(float(value))
+
+        end = parse_period_time(measurement, ATTR_PERIOD_END)
+        seconds = (end - start).total_seconds() if end is not None and end > start else STATISTICS_PERIOD
+        hours = min(seconds, 3600) / 3600
+        for key, (_, source) in ENERGY_STATISTIC_FIELDS.items():
+            value = measurement.get(source)
+            if value is not None:
+                self.energy[key] = self.energy.get(key, 0.0) + abs(float(value)) * hours
+
+        self.periods.add(start)
+
+    def as_list(self, hour: datetime) -> list:
+        """Return the hour in a compact form: period minutes, field buckets, energies."""
+        return [
+            sorted(int((start - hour).total_seconds() // 60) for start in self.periods),
+            [
+                [bucket.count, bucket.total, bucket.minimum, bucket.maximum]
+                if (bucket := self.fields.get(key)) is not None
+                else None
+                for key in STATISTIC_FIELDS
+            ],
+            [self.energy.get(key) for key in ENERGY_STATISTIC_FIELDS],
+        ]
+
+    @classmethod
+    def from_list(cls, hour: datetime, stored: list) -> "_Hour":
+        minutes, fields, energy = stored
+        item = cls()
+        item.periods = {hour + timedelta(minutes=minute) for minute in minutes}
+        for key, values in zip(STATISTIC_FIELDS, fields):
+            if values is not None:
+                bucket = item.fields[key] = _HourBucket(values[1])
+                bucket.count, bucket.total, bucket.minimum, bucket.maximum = values
+        for key, value in zip(ENERGY_STATISTIC_FIELDS, energy):
+            if value is not None:
+                item.energy[key] = value
+        return item
+
+
+class KotiakkuStatisticsImporter:
+    """Folds measurement periods into hourly buckets and imports them.
+
+    Every hour remembers the periods folded into it, so overlapping lists from
+    consecutive polls and recovered ranges are never counted twice.
+    """
+
+    def __init__(self, hass: HomeAssistant, device_slug: str, device_name: str):
+        self.hass = hass
+        self._device_slug = device_slug
+        self._device_name = device_name
+        self._hours: dict[datetime, _Hour] = {}
+        # Energy sums of the hours that dropped out of the window
+        self._sums = {key: 0.0 for key in ENERGY_STATISTIC_FIELDS}
+        self._closed: datetime | None = None  # hours before this are no longer imported
+
+    def statistic_id(self, key: str) -> str:
+        """Return the external statistic id used for a measurement field."""
+        return f"{DOMAIN}:{self._device_slug}_{key}"
+
+    @callback
+    def async_add_measurements(self, measurements: list[tuple[datetime, dict]]) -> None:
+        """Fold (period start, measurement) pairs in and import the touched hours."""
+        if "recorder" not in self.hass.config.components:
+            return
+
+        touched = set()
+        for start, measurement in measurements:
+            hour = start.replace(minute=0, second=0, microsecond=0)
+            if self._closed is not None and hour < self._closed:
+                continue
+            item = self._hours.get(hour)
+            if item is None:
+                item = self._hours[hour] = _Hour()
+            elif start in item.periods:
+                continue
+            item.add(start, measurement)
+            touched.add(hour)
+
+        if not touched:
+            return
+
+        hours = sorted(touched)
+        for key, (name, unit) in STATISTIC_FIELDS.items():
+            statistics = [
+                StatisticData(
+                    start=hour,
+                    mean=bucket.total / bucket.count,
+                    min=bucket.minimum,
+                    max=bucket.maximum,
+                )
+                for hour in hours
+                if (bucket := self._hours[hour].fields.get(key)) is not None
+            ]
+            if statistics:
+                self._async_import(key, name, unit, statistics, has_mean=True)
+
+        # A late hour changes the running totals of every hour after it
+        since = hours[0]
+        retained = sorted(self._hours)
+        for key, (name, _) in ENERGY_STATISTIC_FIELDS.items():
+            total = self._sums[key]
+            statistics = []
+            for hour in retained:
+                energy = self._hours[hour].energy.get(key)
+                if energy is None:
+                    continue
+                total += energy
+                if hour >= since:
+                    statistics.append(StatisticData(start=hour, state=total, sum=total))
+            if statistics:
+                self._async_import(key, name, UnitOfEnergy.KILO_WATT_HOUR, statistics, has_sum=True)
+
+        _LOGGER.debug("Imported statistics for %s hour(s)", len(hours))
+        self._close_before(max(self._hours) - timedelta(hours=STATISTICS_WINDOW))
+
+    def _async_import(self, key, name, unit, statistics, has_mean=False, has_sum=False):
+        metadata = StatisticMetaData(
+            has_mean=has_mean,
+            has_sum=has_sum,
+            name=f"{self._device_name} {name}",
+            source=DOMAIN,
+            statistic_id=self.statistic_id(key),
+            unit_of_measurement=unit,
+        )
+        async_add_external_statistics(self.hass, metadata, statistics)
+
+    def _close_before(self, closed: datetime) -> None:
+        """Drop the hours before 'closed', keeping their energy in the sums."""
+        for hour in [hour for hour in self._hours if hour < closed]:
+            for key, energy in self._hours.pop(hour).energy.items():
+                self._sums[key] += energy
+        if self._closed is None or closed > self._closed:
+            self._closed = closed
+
+    def as_dict(self) -> dict:
+        """Return the buckets and sums, to continue after a restart."""
+        return {
+            "closed": self._closed.isoformat() if self._closed else None,
+            "sums": dict(self._sums),
+            "hours": {hour.isoformat(): item.as_list(hour) for hour, item in self._hours.items()},
+        }
+
+    def load(self, state: dict) -> None:
+        """Continue from a state saved by as_dict()."""
+        for key, value in state.get("sums", {}).items():
+            if key in self._sums:
+                self._sums[key] = float(value)
+        self._closed = dt_util.parse_datetime(state["closed"]) if state.get("closed") else None
+        for hour, stored in state.get("hours", {}).items():
+            start = dt_util.parse_datetime(hour)
+            self._hours[start] = _Hour.from_list(start, stored)
@@ -0,0 +1,87 @@
+"""Electricity tariff for Elisa Kotiakku.
+
+The measurements carry the spot price only. What a kWh bought from the grid
+really costs adds the seller's margin, the transfer fee (often time-of-use),
+the electricity tax and VAT on top of it. These settings are compiled once
+into a table with one fixed price component per tariff slot, an hour of the
+local day on a weekday or on a weekend, so pricing a measurement period is
+
+    import price = spot price * VAT factor + table[slot]
+
+which the derivation table evaluates for a single record and for NumPy
+columns alike. Energy sold to the grid is valued at the spot price.
+"""
+
+from datetime import datetime
+
+import numpy as np
+
+from homeassistant.util import dt as dt_util
+
+from .const import (
+    CONF_TARIFF_DAY_END,
+    CONF_TARIFF_DAY_START,
+    CONF_TARIFF_MARGIN,
+    CONF_TARIFF_TAX,
+    CONF_TARIFF_TRANSFER_DAY,
+    CONF_TARIFF_TRANSFER_NIGHT,
+    CONF_TARIFF_VAT,
+    CONF_TARIFF_WEEKEND_NIGHT,
+    DEFAULT_TARIFF_DAY_END,
+    DEFAULT_TARIFF_DAY_START,
+)
+
+# Hours of the local day on weekdays, then on weekends
+TARIFF_SLOTS = 48
+
+
+def tariff_slot(timestamp: datetime | None) -> int:
+    """Return the tariff slot of a period start, the current one for None."""
+    local = dt_util.as_local(timestamp) if timestamp is not None else dt_util.now()
+    return local.hour + (24 if local.weekday() >= 5 else 0)
+
+
+class KotiakkuTariff:
+    """The fixed price components (c/kWh, VAT included) per tariff slot."""
+
+    def __init__(
+        self,
+        margin=0.0,
+        transfer_day=0.0,
+        transfer_night=0.0,
+        tax=0.0,
+        vat=0.0,
+        day_start=DEFAULT_TARIFF_DAY_START,
+        day_end=DEFAULT_TARIFF_DAY_END,
+        weekend_night=False,
+    ):
+        self.vat_factor = 1 + vat / 100
+        table = np.empty(TARIFF_SLOTS)
+        for slot in range(TARIFF_SLOTS):
+            hour, weekend = slot % 24, slot >= 24
+            day = day_start <= hour < day_end and not (weekend and weekend_night)
+            transfer = transfer_day if day else transfer_night
+            table[slot] = (margin + transfer + tax) * self.vat_factor
+        self.table = table
+
+    @classmethod
+    def from_options(cls, option) -> "KotiakkuTariff":
+        """Compile the tariff from the entry settings; 'option(key, default)' reads one."""
+        return cls(
+            margin=option(CONF_TARIFF_MARGIN, 0.0),
+            transfer_day=option(CONF_TARIFF_TRANSFER_DAY, 0.0),
+            transfer_night=option(CONF_TARIFF_TRANSFER_NIGHT, 0.0),
+            tax=option(CONF_TARIFF_TAX, 0.0),
+            vat=option(CONF_TARIFF_VAT, 0.0),
+            day_start=option(CONF_TARIFF_DAY_START, DEFAULT_TARIFF_DAY_START),
+            day_end=option(CONF_TARIFF_DAY_END, DEFAULT_TARIFF_DAY_END),
+            weekend_night=option(CONF_TARIFF_WEEKEND_NIGHT, False),
+        )
+
+    def import_price(self, spot, slot, ops):
+        """Return the price (c/kWh) of grid energy at 'spot' price in tariff 'slot'."""
+        return spot * self.vat_factor + ops.take(self.table, slot)
+
+
+# Spot price only, when nothing is configured
+SPOT_TARIFF = KotiakkuTariff()
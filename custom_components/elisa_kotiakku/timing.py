@@ -0,0 +1,254 @@
+"""Update timings for Elisa Kotiakku.
+
+Every update is timed in phases:
+
+- connect: DNS lookup and connection setup, zero on a kept-alive connection
+- ttfb: from the request being sent until the response headers arrived
+- body: reading the response body
+- decode: decoding the JSON payload
+- derive: turning the payload into the coordinator data
+- fan_out: notifying the entities, i.e. writing their states
+
+Durations (ms) and payload sizes are counted in histograms with a fixed number
+of logarithmic buckets, so they take the same memory however long Home
+Assistant runs. The last DIAGNOSTIC_CYCLES updates are also kept one by one
+(time, phases, HTTP status, payload size, measurement period, skipped or not,
+accumulator deltas) for the diagnostics download.
+"""
+
+import math
+import time
+from bisect import bisect_left
+from collections import Counter, deque
+from datetime import datetime
+
+import aiohttp
+
+from homeassistant.core import CALLBACK_TYPE, callback
+from homeassistant.util import dt as dt_util
+
+from .const import DIAGNOSTIC_CYCLES
+
+PHASES = ("connect", "ttfb", "body", "decode", "derive", "fan_out")
+FETCH_PHASES = ("connect", "ttfb", "body", "decode")
+
+# (smallest bucket edge, factor between edges, buckets)
+DURATION_BUCKETS = (0.1, 1.25, 64)  # 0.1 ms .. ~100 s
+SIZE_BUCKETS = (256, 1.5, 32)  # 256 B .. ~50 MB
+
+
+class KotiakkuHistogram:
+    """Counts of values in fixed logarithmic buckets.
+
+    Bucket i counts the values up to edges[i], the last bucket everything
+    larger. A percentile is reported as the upper edge of its bucket, so it
+    is at most one bucket factor above the real value.
+    """
+
+    __slots__ = ("edges", "counts", "count", "total")
+
+    def __init__(self, smallest: float, factor: float, buckets: int):
+        self.edges = [smallest * factor**index for index in range(buckets - 1)]
+        self.counts = [0] * buckets
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, value: float) -> None:
+        self.counts[bisect_left(self.edges, value)] += 1
+        self.count += 1
+        self.total += value
+
+    def percentile(self, share: float) -> float | None:
+        """Return the value that 'share' (0..1) of the counted values do not exceed."""
+        if not self.count:
+            return None
+        rank = max(1, math.ceil(share * self.count))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                break
+        return self.edges[min(index, len(self.edges) - 1)]
+
+    def as_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else None,
+            "p50": self.percentile(0.5),
+            "p95": self.percentile(0.95),
+            "p99": self.percentile(0.99),
+        }
+
+
+class KotiakkuFetchTrace:
+    """Phase durations (ms) and payload size of one request, filled in while it runs."""
+
+    __slots__ = ("started", "connect", "ttfb", "body", "decode", "total", "bytes", "status", "_mark")
+
+    def __init__(self):
+        self.started = self._mark = None
+        self.connect = self.ttfb = self.body = self.decode = self.total = None
+        self.bytes = self.status = None
+
+    def start(self) -> None:
+        self.started = self._mark = time.perf_counter()
+
+    def lap(self) -> float:
+        """Return the ms since the previous lap and start the next one."""
+        now = time.perf_counter()
+        elapsed, self._mark = (now - self._mark) * 1000, now
+        return elapsed
+
+    def finish(self) -> None:
+        self.total = (time.perf_counter() - self.started) * 1000
+
+
+def _trace(context) -> KotiakkuFetchTrace | None:
+    trace = context.trace_request_ctx
+    return trace if isinstance(trace, KotiakkuFetchTrace) else None
+
+
+async def _on_connection_create_start(session, context, params):
+    if trace := _trace(context):
+        trace.lap()
+
+
+async def _on_connection_create_end(session, context, params):
+    if trace := _trace(context):
+        trace.connect = trace.lap()
+
+
+async def _on_connection_reuseconn(session, context, params):
+    if trace := _trace(context):
+        trace.lap()
+        trace.connect = 0.0
+
+
+async def _on_request_end(session, context, params):
+    # Sent once the response headers have been read
+    if trace := _trace(context):
+        trace.ttfb = trace.lap()
+
+
+def request_trace_config() -> aiohttp.TraceConfig:
+    """Return the aiohttp tracing that fills in the KotiakkuFetchTrace passed as trace_request_ctx."""
+    config = aiohttp.TraceConfig()
+    config.on_connection_create_start.append(_on_connection_create_start)
+    config.on_connection_create_end.append(_on_connection_create_end)
+    config.on_connection_reuseconn.append(_on_connection_reuseconn)
+    config.on_request_end.append(_on_request_end)
+    return config
+
+
+class KotiakkuUpdateTimings:
+    """Phase timings, payload sizes and state writes of one coordinator's updates."""
+
+    def __init__(self):
+        self.phases = {phase: KotiakkuHistogram(*DURATION_BUCKETS) for phase in PHASES}
+        self.fetch = KotiakkuHistogram(*DURATION_BUCKETS)  # request sent to payload decoded
+        self.update = KotiakkuHistogram(*DURATION_BUCKETS)  # whole update, fetch to fan-out
+        self.payload_bytes = KotiakkuHistogram(*SIZE_BUCKETS)
+        self.last = {}  # phase durations of the last update
+        self.last_update = None
+        self.last_payload_bytes = None
+        self.state_writes = Counter()  # by entity key, during updates only
+        self.last_state_writes = 0
+        self.suppressed_writes = 0  # within the deadband of their sensor
+        self.last_suppressed_writes = 0
+        self.cycles = deque(maxlen=DIAGNOSTIC_CYCLES)
+        self._cycle = None
+        self._started = None
+        self._listeners = []
+
+    @callback
+    def async_begin(self, source: str) -> None:
+        """Start timing an update; 'source' is what started it, e.g. 'poll'."""
+        self._started = time.perf_counter()
+        self._cycle = {"time": dt_util.utcnow(), "source": source}
+        self.last = {}
+        self.last_state_writes = 0
+        self.last_suppressed_writes = 0
+
+    def note(self, **details) -> None:
+        """Add details to the record of the update in progress."""
+        if self._cycle is not None:
+            self._cycle.update(details)
+
+    def add(self, phase: str, elapsed: float) -> None:
+        self.phases[phase].add(elapsed)
+        self.last[phase] = elapsed
+
+    def add_fetch(self, trace: KotiakkuFetchTrace) -> None:
+        """Count the phases of a request, finished or failed."""
+        self.note(status=trace.status, bytes=trace.bytes)
+        for phase in FETCH_PHASES:
+            elapsed = getattr(trace, phase)
+            if elapsed is not None:
+                self.add(phase, elapsed)
+        if trace.total is not None:
+            self.fetch.add(trace.total)
+        if trace.bytes is not None:
+            self.payload_bytes.add(trace.bytes)
+            self.last_payload_bytes = trace.bytes
+
+    def count_state_write(self, key: str) -> None:
+        if self._started is not None:
+            self.state_writes[key] += 1
+            self.last_state_writes += 1
+
+    def count_suppressed_write(self) -> None:
+        if self._started is not None:
+            self.suppressed_writes += 1
+            self.last_suppressed_writes += 1
+
+    @callback
+    def async_finish(self) -> None:
+        """Stop timing the update and notify the listeners."""
+        if self._started is None:
+            return
+        self.last_update = (time.perf_counter() - self._started) * 1000
+        self.update.add(self.last_update)
+        self._cycle.update(
+            phases=self.last,
+            duration=self.last_update,
+            state_writes=self.last_state_writes,
+            suppressed_writes=self.last_suppressed_writes,
+        )
+        self.cycles.append(self._cycle)
+        self._started = self._cycle = None
+        for update_callback in list(self._listeners):
+            update_callback()
+
+    @callback
+    def async_add_listener(self, update_callback: CALLBACK_TYPE) -> CALLBACK_TYPE:
+        """Call update_callback after every timed update; returns a callback that removes it."""
+        self._listeners.append(update_callback)
+
+        @callback
+        def remove():
+            self._listeners.remove(update_callback)
+
+        return remove
+
+    def as_dict(self) -> dict:
+        return {
+            "last": {**self.last, "update": self.last_update},
+            "update": self.update.as_dict(),
+            "fetch": self.fetch.as_dict(),
+            "phases": {phase: histogram.as_dict() for phase, histogram in self.phases.items()},
+            "payload_bytes": {**self.payload_bytes.as_dict(), "last": self.last_payload_bytes},
+            "state_writes": {
+                "last_update": self.last_state_writes,
+                "total": dict(self.state_writes),
+                "suppressed": self.suppressed_writes,
+                "last_update_suppressed": self.last_suppressed_writes,
+            },
+            # Newest first
+            "cycles": [
+                {
+                    key: value.isoformat() if isinstance(value, datetime) else value
+                    for key, value in cycle.items()
+                }
+                for cycle in reversed(self.cycles)
+            ],
+        }
@@ -0,0 +1 @@
+"""Soak runs for Elisa Kotiakku."""
@@ -0,0 +1,202 @@
+"""Fixtures for the Elisa Kotiakku soak runs.
+
+A soak run sets up many config entries against the local Gridle stand-in
+(gridle_stand_in.py) and lets simulated time run for hours or days. The
+simulated clock replaces dt_util.utcnow(); polls are driven by the harness at
+the update_interval each coordinator asks for, so a simulated day takes
+seconds while the coordinator, fetch scheduler and recovery code run as is.
+"""
+import asyncio
+import gc
+import logging
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+import pytest
+from aiohttp.test_utils import TestServer
+from pytest_homeassistant_custom_component.common import MockConfigEntry
+
+from homeassistant.helpers.update_coordinator import DataUpdateCoordinator
+
+from custom_components.elisa_kotiakku.const import DOMAIN
+
+from .gridle_stand_in import PATH, GridleStandIn, StandInConfig
+
+QUIET_LOGGERS = ("custom_components.elisa_kotiakku", "aiohttp.access")
+
+# Event loop callbacks running longer than this count as stalls (seconds)
+STALL_THRESHOLD = 0.05
+
+START = datetime(2026, 6, 1, 0, 0, 7, tzinfo=timezone.utc)
+
+# Polls land this long after the time the coordinator asked for, as a real
+# request (and the fetch jitter, switched off here) would make them
+POLL_DELAY = timedelta(seconds=0.2)
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("soak")
+    group.addoption("--soak-hours", type=float, default=24, help="Simulated hours per run")
+    group.addoption("--soak-entries", type=int, default=12, help="Config entries per run")
+    group.addoption("--soak-keys", type=int, default=3, help="API keys shared by the entries")
+
+
+@pytest.fixture(autouse=True)
+def auto_enable_custom_integrations(enable_custom_integrations):
+    """Enable custom integrations for all soak runs."""
+    yield
+
+
+class SimClock:
+    """Simulated UTC time, moved only by the harness."""
+
+    def __init__(self, start):
+        self._now = start
+
+    def now(self):
+        return self._now
+
+    def set(self, when):
+        self._now = max(self._now, when)
+
+
+class LoopStallMonitor(logging.Handler):
+    """Records the event loop callbacks that ran for too long.
+
+    In debug mode asyncio times every callback and logs those slower than
+    loop.slow_callback_duration; this handler keeps the longest of them.
+    """
+
+    def __init__(self, loop, threshold):
+        super().__init__(logging.WARNING)
+        self.loop = loop
+        self.threshold = threshold
+        self.stalls = 0
+        self.longest = 0.0
+        self.culprit = None
+        self._debug = None
+
+    def emit(self, record):
+        if isinstance(record.msg, str) and record.msg.startswith("Executing") and len(record.args) == 2:
+            self.stalls += 1
+            if record.args[1] > self.longest:
+                self.longest = record.args[1]
+                self.culprit = record.args[0]
+
+    def start(self):
+        self._debug = (self.loop.get_debug(), self.loop.slow_callback_duration)
+        self.loop.set_debug(True)
+        self.loop.slow_callback_duration = self.threshold
+        logging.getLogger("asyncio").addHandler(self)
+
+    def stop(self):
+        logging.getLogger("asyncio").removeHandler(self)
+        self.loop.set_debug(self._debug[0])
+        self.loop.slow_callback_duration = self._debug[1]
+
+
+class SoakRun:
+    """Config entries, the stand-in server and the simulated clock of one run."""
+
+    def __init__(self, hass, server, clock):
+        self.hass = hass
+        self.server = server
+        self.clock = clock
+        self.coordinators = []
+        self.stalls = LoopStallMonitor(hass.loop, STALL_THRESHOLD)
+        self.memory = []  # traced bytes after each phase
+        self._due = {}
+
+    async def async_setup(self, url, entries, keys):
+        for index in range(entries):
+            entry = MockConfigEntry(
+                domain=DOMAIN,
+                title=f"Kotiakku {index}",
+                data={"name": f"Kotiakku {index}", "url": url, "api_key": f"soak_key_{index % keys}"},
+                entry_id=f"soak_{index}",
+            )
+            entry.add_to_hass(self.hass)
+            assert await self.hass.config_entries.async_setup(entry.entry_id)
+            coordinator = self.hass.data[DOMAIN][entry.entry_id]
+            self.coordinators.append(coordinator)
+            self._reschedule(coordinator)
+            # Shared payloads handed over by the fetch scheduler push the next poll back
+            coordinator.async_add_listener(lambda c=coordinator: self._reschedule(c))
+        await self.async_settle()
+
+    def _reschedule(self, coordinator):
+        self._due[coordinator] = self.clock.now() + coordinator.update_interval + POLL_DELAY
+
+    async def async_run(self, duration: timedelta):
+        """Let simulated time run, polling every coordinator when it is due."""
+        end = self.clock.now() + duration
+        while (when := min(self._due.values())) <= end:
+            self.clock.set(when)
+            due = [c for c, at in self._due.items() if at <= when]
+            await asyncio.gather(*(c.async_refresh() for c in due))
+            for coordinator in due:
+                self._reschedule(coordinator)
+            await self.async_settle()
+        self.clock.set(end)
+
+    async def async_settle(self):
+        """Wait for entity updates, gap recoveries and history writes to finish."""
+        await self.hass.async_block_till_done()
+        for coordinator in self.coordinators:
+            for task in (coordinator.recovery._task, coordinator.history._writer):
+                if task is not None:
+                    await task
+        await self.hass.async_block_till_done()
+
+    async def async_sample_memory(self):
+        # Collected in the executor, so it doesn't count as an event loop stall
+        await self.hass.async_add_executor_job(gc.collect)
+        self.memory.append(tracemalloc.get_traced_memory()[0])
+
+
+@pytest.fixture
+async def soak(hass, socket_enabled, request):
+    """Return a function that starts a soak run against a stand-in with the given behaviour."""
+    servers = []
+    runs = []
+    clock = SimClock(START)
+    options = request.config.getoption
+
+    async def start(**behaviour):
+        server = GridleStandIn(StandInConfig(clock=clock.now, **behaviour))
+        test_server = TestServer(server.app, host="127.0.0.1")
+        await test_server.start_server()
+        servers.append(test_server)
+
+        run = SoakRun(hass, server, clock)
+        runs.append(run)
+        await run.async_setup(
+            str(test_server.make_url(PATH)), options("--soak-entries"), options("--soak-keys")
+        )
+        run.stalls.start()
+        return run
+
+    # Captured log records keep their arguments (payloads among them) alive
+    # until the test ends, which would look like a leak
+    loggers = {logging.getLogger(name): logging.getLogger(name).level for name in QUIET_LOGGERS}
+    for logger in loggers:
+        logger.setLevel(logging.WARNING)
+
+    # Polls are driven by SoakRun, the coordinators' own timers stay off
+    with patch("homeassistant.util.dt.utcnow", clock.now), patch(
+        "custom_components.elisa_kotiakku.fetcher.FETCH_JITTER", 0
+    ), patch.object(DataUpdateCoordinator, "_schedule_refresh", lambda self: None):
+        tracemalloc.start()
+        try:
+            yield start
+        finally:
+            tracemalloc.stop()
+            for logger, level in loggers.items():
+                logger.setLevel(level)
+            for run in runs:
+                run.stalls.stop()
+            for entry in hass.config_entries.async_entries(DOMAIN):
+                await hass.config_entries.async_unload(entry.entry_id)
+            for test_server in servers:
+                await test_server.close()
@@ -0,0 +1,228 @@
+"""Local stand-in for the Gridle measurements endpoint.
+
+Serves a deterministic measurement series the way the real API does: one
+period every 'cadence' seconds, published 'publish_lag' seconds after the
+period has ended, newest first. Latency, jitter and error responses can be
+injected, and a recorded measurement list can be replayed instead of the
+generated series. Time range requests (start_time / end_time) are answered
+with every published period in the range.
+
+The series is a pure function of the period index, so the exact energy of any
+time range is known (see energy()), which lets a soak run check the totals the
+integration accumulated.
+
+Run standalone, e.g. against a development Home Assistant instance:
+
+    python -m soak.gridle_stand_in --port 8000 --server-error-rate 0.05
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Callable
+
+from aiohttp import web
+
+PATH = "/api/public/measurements"
+
+
+def _utcnow():
+    return datetime.now(timezone.utc)
+
+
+@dataclass
+class StandInConfig:
+    """Behaviour of the stand-in server."""
+
+    cadence: int = 300  # seconds between two published periods
+    publish_lag: float = 20.0  # seconds after the end of a period until it is published
+    list_size: int = 12  # periods in a plain (non-range) response
+    latency: float = 0.0  # seconds added to every response
+    jitter: float = 0.0  # extra latency, uniformly 0..jitter seconds
+    unauthorized_rate: float = 0.0  # share of requests answered 401
+    rate_limited_rate: float = 0.0  # share of requests answered 429 (with Retry-After)
+    server_error_rate: float = 0.0  # share of requests answered 500/502/503
+    retry_after: int = 60  # Retry-After seconds of a 429 response
+    api_keys: tuple | None = None  # accepted keys, None accepts any key
+    seed: int = 0
+    replay: list | None = None  # recorded measurements to cycle through
+    outages: list = field(default_factory=list)  # (start, end) datetimes answered 503
+    clock: Callable[[], datetime] = _utcnow
+
+
+class GridleStandIn:
+    """The stand-in server: an aiohttp application plus request bookkeeping."""
+
+    def __init__(self, config: StandInConfig | None = None):
+        self.config = config or StandInConfig()
+        self.requests = Counter()  # by API key
+        self.responses = Counter()  # by status
+        self._rng = random.Random(self.config.seed)
+        self.app = web.Application()
+        self.app.router.add_get(PATH, self._handle)
+
+    # --- Series ---
+
+    def period_start(self, index: int) -> datetime:
+        return datetime.fromtimestamp(index * self.config.cadence, timezone.utc)
+
+    def newest_published(self) -> int:
+        """Index of the newest period that has been published by now."""
+        now = self.config.clock().timestamp()
+        return math.floor((now - self.config.publish_lag) / self.config.cadence) - 1
+
+    def measurement(self, index: int) -> dict:
+        """Return the measurement of period 'index'."""
+        start = self.period_start(index)
+        end = start + timedelta(seconds=self.config.cadence)
+        if self.config.replay:
+            values = {
+                key: value
+                for key, value in self.config.replay[index % len(self.config.replay)].items()
+                if key not in ("period_start", "period_end")
+            }
+        else:
+            values = self._generate(index, start)
+        return {
+            "period_start": start.isoformat().replace("+00:00", "Z"),
+            "period_end": end.isoformat().replace("+00:00", "Z"),
+            **values,
+        }
+
+    def _generate(self, index, start):
+        """A plausible, energy-balanced period: solar by daylight, battery follows surplus."""
+        rng = random.Random(self.config.seed * 1_000_003 + index)
+        hour = start.hour + start.minute / 60
+        solar = round(max(0.0, 5.0 * math.sin(math.pi * (hour - 6) / 12)) * rng.uniform(0.7, 1.0), 3)
+        house = round(rng.uniform(0.3, 2.5), 3)
+
+        solar_to_house = min(solar, house)
+        surplus = solar - solar_to_house
+        deficit = house - solar_to_house
+        solar_to_battery = round(min(surplus, 3.0), 3)
+        solar_to_grid = round(surplus - solar_to_battery, 3)
+        battery_to_house = round(min(deficit, 2.0) if hour >= 17 or hour < 1 else 0.0, 3)
+        grid_to_house = round(deficit - battery_to_house, 3)
+        grid_to_battery = round(rng.uniform(1.0, 2.0), 3) if 2 <= hour < 4 else 0.0
+
+        charge = solar_to_battery + grid_to_battery
+        discharge = battery_to_house
+        battery_power = round(discharge * 1.04 - charge * 0.96, 3)
+
+        return {
+            "battery_power_kw": battery_power,
+            "state_of_charge_percent": round(50 + 40 * math.sin(math.pi * hour / 24), 1),
+            "solar_power_kw": solar,
+            "grid_power_kw": round(grid_to_house + grid_to_battery - solar_to_grid, 3),
+            "house_power_kw": house,
+            "solar_to_house_kw": round(solar_to_house, 3),
+            "solar_to_battery_kw": solar_to_battery,
+            "solar_to_grid_kw": solar_to_grid,
+            "grid_to_house_kw": grid_to_house,
+            "grid_to_battery_kw": grid_to_battery,
+            "battery_to_house_kw": battery_to_house,
+            "battery_to_grid_kw": 0.0,
+            "spot_price_cents_per_kwh": round(rng.uniform(1.0, 15.0), 3),
+            "battery_temperature_celsius": round(rng.uniform(18.0, 26.0), 1),
+        }
+
+    def energy(self, key: str, start: datetime, end: datetime) -> float:
+        """Exact energy (kWh) of a power field over the periods starting in [start, end)."""
+        cadence = self.config.cadence
+        first = math.ceil(start.timestamp() / cadence)
+        last = math.ceil(end.timestamp() / cadence)
+        return sum(abs(self.measurement(index).get(key, 0.0)) * cadence / 3600 for index in range(first, last))
+
+    # --- HTTP ---
+
+    async def _handle(self, request: web.Request) -> web.StreamResponse:
+        config = self.config
+        api_key = request.headers.get("x-api-key", "")
+        self.requests[api_key] += 1
+
+        delay = config.latency + (self._rng.uniform(0, config.jitter) if config.jitter else 0.0)
+        if delay:
+            await asyncio.sleep(delay)
+
+        # Responses are mappings (of their state), so test for None explicitly
+        response = self._error(api_key)
+        if response is None:
+            response = self._measurements(request)
+        self.responses[response.status] += 1
+        return response
+
+    def _error(self, api_key):
+        config = self.config
+        if config.api_keys is not None and api_key not in config.api_keys:
+            return web.Response(status=401)
+
+        now = config.clock()
+        if any(start <= now < end for start, end in config.outages):
+            return web.Response(status=503)
+
+        roll = self._rng.random()
+        if roll < config.unauthorized_rate:
+            return web.Response(status=401)
+        roll -= config.unauthorized_rate
+        if roll < config.rate_limited_rate:
+            return web.Response(status=429, headers={"Retry-After": str(config.retry_after)})
+        roll -= config.rate_limited_rate
+        if roll < config.server_error_rate:
+            return web.Response(status=self._rng.choice((500, 502, 503)))
+        return None
+
+    def _measurements(self, request):
+        newest = self.newest_published()
+        start_param = request.query.get("start_time")
+        end_param = request.query.get("end_time")
+
+        if start_param and end_param:
+            cadence = self.config.cadence
+            start = datetime.fromisoformat(start_param).timestamp()
+            end = datetime.fromisoformat(end_param).timestamp()
+            first = math.ceil(start / cadence)
+            last = min(math.floor(end / cadence), newest)
+            indexes = range(last, first - 1, -1)
+            return web.json_response([self.measurement(index) for index in indexes])
+
+        etag = f'"{newest}"'
+        if request.headers.get("If-None-Match") == etag:
+            return web.Response(status=304, headers={"ETag": etag})
+
+        indexes = range(newest, newest - self.config.list_size, -1)
+        return web.json_response(
+            [self.measurement(index) for index in indexes], headers={"ETag": etag}
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--replay", help="JSON file with a recorded measurement list")
+    for name, value in vars(StandInConfig()).items():
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            parser.add_argument(f"--{name.replace('_', '-')}", type=type(value), default=value)
+    args = parser.parse_args()
+
+    options = {
+        name: getattr(args, name)
+        for name, value in vars(StandInConfig()).items()
+        if isinstance(value, (int, float)) and not isinstance(value, bool)
+    }
+    if args.replay:
+        with open(args.replay, encoding="utf-8") as handle:
+            options["replay"] = list(reversed(json.load(handle)))
+
+    server = GridleStandIn(StandInConfig(**options))
+    print(f"Serving http://{args.host}:{args.port}{PATH}")
+    web.run_app(server.app, host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Soak runs: many config entries against the Gridle stand-in at accelerated time."""
+from datetime import timedelta
+
+import pytest
+
+from custom_components.elisa_kotiakku.integrator import ENERGY_ACCUMULATORS
+
+# Checked against the stand-in's exact series
+CHECKED_TOTALS = [
+    "solar_energy_kwh",
+    "house_energy_kwh",
+    "grid_to_house_kwh",
+    "grid_to_battery_kwh",
+    "battery_to_house_kwh",
+]
+
+# Longest an event loop callback may run (seconds). Generous, as asyncio debug
+# mode and tracemalloc are on, and both slow everything down.
+MAX_STALL = 0.5
+# Traced memory may grow this much over the second half of a run
+MAX_MEMORY_GROWTH = 2 * 1024 * 1024
+
+SCENARIOS = {
+    "steady": {},
+    "flaky": {
+        "latency": 0.002,
+        "jitter": 0.01,
+        "list_size": 3,
+        "unauthorized_rate": 0.01,
+        "rate_limited_rate": 0.02,
+        "server_error_rate": 0.05,
+    },
+}
+
+
+@pytest.mark.parametrize("scenario", SCENARIOS)
+async def test_soak(soak, request, scenario):
+    """Verify request counts, loop lag, memory growth and energy totals over a long run."""
+    hours = request.config.getoption("--soak-hours")
+    duration = timedelta(hours=hours)
+    run = await soak(**SCENARIOS[scenario])
+    server = run.server
+    start = run.clock.now()
+    if scenario == "flaky":
+        # An outage long enough to need the range API afterwards
+        outage = start + duration / 3
+        server.config.outages.append((outage, outage + timedelta(hours=2)))
+
+    await run.async_run(duration / 2)
+    await run.async_sample_memory()
+    await run.async_run(duration / 2)
+    await run.async_sample_memory()
+
+    # A calm last hour for the retries and recoveries to catch up
+    server.config.unauthorized_rate = server.config.rate_limited_rate = 0
+    server.config.server_error_rate = 0
+    await run.async_run(timedelta(hours=1))
+
+    # Entries sharing a key share their requests: about a poll per period plus
+    # retries and recoveries, whatever the number of entries per key
+    periods = (duration + timedelta(hours=1)) / timedelta(seconds=server.config.cadence)
+    for key, count in server.requests.items():
+        assert count <= periods * 1.5 + 20, f"{key}: {count} requests for {periods:.0f} periods"
+        if scenario == "steady":
+            # Nor fewer, that would leave periods unseen until the next poll
+            assert count >= periods * 0.9, f"{key}: {count} requests for {periods:.0f} periods"
+
+    stalls = run.stalls
+    assert stalls.longest < MAX_STALL, f"event loop blocked for {stalls.longest:.3f} s by {stalls.culprit}"
+
+    growth = run.memory[1] - run.memory[0]
+    assert growth < MAX_MEMORY_GROWTH, f"traced memory grew {growth} bytes"
+
+    newest = server.period_start(server.newest_published())
+    for coordinator in run.coordinators:
+        integrator = coordinator.integrator
+        assert coordinator.last_update_success
+        assert coordinator.recovery.gaps == []
+        # Real connections, so every request phase was traced
+        assert coordinator.timings.phases["ttfb"].count > 0
+        assert coordinator.timings.phases["connect"].count > 0
+        # At most one published period not picked up yet
+        assert integrator.last_time >= newest - timedelta(seconds=server.config.cadence)
+        for key in CHECKED_TOTALS:
+            expected = server.energy(ENERGY_ACCUMULATORS[key], integrator.first_time, integrator.last_time)
+            assert integrator.accumulators[key].value == pytest.approx(expected, rel=1e-9, abs=1e-9), (
+                f"{coordinator.name} {key}"
+            )
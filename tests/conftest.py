@@ -3,6 +3,7 @@ import pytest
 from unittest.mock import MagicMock
 from pytest_homeassistant_custom_component.common import MockConfigEntry
 from custom_components.elisa_kotiakku.const import DOMAIN
+from custom_components.elisa_kotiakku.integrator import KotiakkuEnergyIntegrator
 
 @pytest.fixture(autouse=True)
 def auto_enable_custom_integrations(enable_custom_integrations):
@@ -28,5 +29,6 @@ def mock_coordinator():
     """Return a mock coordinator."""
     coordinator = MagicMock()
     coordinator.data = {}
+    coordinator.integrator = KotiakkuEnergyIntegrator()
     coordinator.last_update_success = None
     return coordinator
\ No newline at end of file
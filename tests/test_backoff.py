@@ -0,0 +1,168 @@
+"""Tests for the Elisa Kotiakku backoff and circuit breaker."""
+import asyncio
+from datetime import timedelta
+from unittest.mock import MagicMock, patch
+
+import aiohttp
+import pytest
+from aioresponses import aioresponses
+
+from homeassistant.util import dt as dt_util
+
+from custom_components.elisa_kotiakku.backoff import (
+    BREAKER_CLOSED,
+    ERROR_AUTH,
+    BREAKER_HALF_OPEN,
+    BREAKER_OPEN,
+    ERROR_CIRCUIT_OPEN,
+    ERROR_NETWORK,
+    ERROR_RATE_LIMITED,
+    ERROR_SERVER,
+    ERROR_TIMEOUT,
+    KotiakkuBackoff,
+    KotiakkuFetchError,
+    classify_exception,
+    parse_retry_after,
+)
+from custom_components.elisa_kotiakku.const import (
+    BACKOFF_BASE,
+    BACKOFF_MAX,
+    BREAKER_THRESHOLD,
+    FETCH_TIMEOUT,
+    TIMEOUT_MAX,
+    TIMEOUT_MIN,
+    TIMEOUT_SAMPLES,
+)
+from custom_components.elisa_kotiakku.coordinator import KotiakkuDataUpdateCoordinator
+from custom_components.elisa_kotiakku.fetcher import async_get_fetch_scheduler
+
+URL = "http://127.0.0.1:8000/api/v1/status"
+NOW = dt_util.parse_datetime("2026-01-01T10:00:00+00:00")
+
+def _coordinator():
+    coordinator = MagicMock()
+    coordinator.api_url = URL
+    coordinator.api_key = "test_key"
+    return coordinator
+
+def test_delay_doubles_with_jitter():
+    """Verify that the retry delay doubles per failure, within the jitter, up to the maximum."""
+    backoff = KotiakkuBackoff()
+    for failures in range(1, 12):
+        backoff.record_failure(KotiakkuFetchError("boom", ERROR_SERVER), NOW)
+        full = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (failures - 1))
+        assert full / 2 <= backoff.delay(NOW).total_seconds() <= full
+
+    backoff.record_success()
+    assert backoff.delay(NOW) is None
+    assert backoff.failures == 0
+
+def test_auth_failure_waits_the_maximum():
+    """Verify that a rejected API key is not retried at the backoff pace."""
+    backoff = KotiakkuBackoff()
+    backoff.record_failure(KotiakkuFetchError("bad key", ERROR_AUTH, 401), NOW)
+    assert backoff.delay(NOW) == timedelta(seconds=BACKOFF_MAX)
+
+def test_retry_after_is_honoured():
+    """Verify that Retry-After (seconds or HTTP date) is the minimum delay."""
+    assert parse_retry_after("120", NOW) == 120
+    assert parse_retry_after("Thu, 01 Jan 2026 10:05:00 GMT", NOW) == 300
+    assert parse_retry_after("soon", NOW) is None
+
+    backoff = KotiakkuBackoff()
+    backoff.record_failure(KotiakkuFetchError("slow down", ERROR_RATE_LIMITED, 429, retry_after=600), NOW)
+    assert backoff.delay(NOW) == timedelta(seconds=600)
+
+def test_breaker_opens_and_recovers():
+    """Verify the closed -> open -> half-open trial -> closed cycle."""
+    backoff = KotiakkuBackoff()
+    for _ in range(BREAKER_THRESHOLD - 1):
+        backoff.record_failure(KotiakkuFetchError("boom", ERROR_SERVER), NOW)
+        assert backoff.check(NOW) is False
+    backoff.record_failure(KotiakkuFetchError("boom", ERROR_SERVER), NOW)
+
+    assert backoff.state(NOW) == BREAKER_OPEN
+    with pytest.raises(KotiakkuFetchError) as raised:
+        backoff.check(NOW)
+    assert raised.value.kind == ERROR_CIRCUIT_OPEN
+
+    later = backoff.retry_at
+    assert backoff.check(later) is True
+    assert backoff.state(later) == BREAKER_HALF_OPEN
+    # Only one trial at a time
+    with pytest.raises(KotiakkuFetchError):
+        backoff.check(later)
+
+    backoff.record_success()
+    backoff.end_trial()
+    assert backoff.state(later) == BREAKER_CLOSED
+    assert backoff.as_dict(later)["breaker_opened"] == 1
+
+def test_timeout_follows_latency():
+    """Verify the default, adaptive and after-timeout request timeouts."""
+    backoff = KotiakkuBackoff()
+    assert backoff.timeout() == FETCH_TIMEOUT
+
+    for _ in range(TIMEOUT_SAMPLES):
+        backoff.record_success(80.0)
+    assert backoff.timeout() == TIMEOUT_MIN
+    for _ in range(TIMEOUT_SAMPLES * 2):
+        backoff.record_success(3000.0)
+    assert TIMEOUT_MIN < backoff.timeout() < TIMEOUT_MAX
+
+    backoff.record_failure(KotiakkuFetchError("slow", ERROR_TIMEOUT), NOW)
+    assert backoff.timeout() == TIMEOUT_MAX
+
+def test_exceptions_are_classified():
+    """Verify the failure kind of transport errors."""
+    assert classify_exception(asyncio.TimeoutError(), 10).kind == ERROR_TIMEOUT
+    assert classify_exception(aiohttp.ClientConnectionError("refused"), 10).kind == ERROR_NETWORK
+    assert classify_exception(ValueError("not json"), 10).kind == "payload"
+
+async def test_scheduler_backs_off_and_breaks(hass):
+    """Verify that the scheduler honours Retry-After and stops calling a failing API."""
+    scheduler = async_get_fetch_scheduler(hass)
+    coordinator = _coordinator()
+
+    with aioresponses() as m:
+        m.get(URL, status=429, headers={"Retry-After": "90"})
+        with pytest.raises(KotiakkuFetchError) as raised:
+            await scheduler.async_fetch(coordinator)
+        assert raised.value.kind == ERROR_RATE_LIMITED
+        assert scheduler.retry_delay(coordinator) >= timedelta(seconds=89)
+
+        m.get(URL, status=503, repeat=True)
+        for _ in range(BREAKER_THRESHOLD - 1):
+            with pytest.raises(KotiakkuFetchError):
+                await scheduler.async_fetch(coordinator)
+        calls = len(list(m.requests.values())[0])
+
+        with pytest.raises(KotiakkuFetchError) as raised:
+            await scheduler.async_fetch(coordinator)
+        assert raised.value.kind == ERROR_CIRCUIT_OPEN
+        assert len(list(m.requests.values())[0]) == calls
+
+    assert scheduler.backoff_state(coordinator)["breaker"] == BREAKER_OPEN
+
+async def test_coordinator_waits_for_backoff(hass, mock_config_entry):
+    """Verify that a failed update is retried when the backoff allows, not at the scan interval."""
+    coordinator = KotiakkuDataUpdateCoordinator(hass, mock_config_entry)
+
+    with aioresponses() as m, patch("custom_components.elisa_kotiakku.backoff.BACKOFF_JITTER", 0):
+        m.get(mock_config_entry.data["url"], status=500)
+        await coordinator.async_refresh()
+
+    assert not coordinator.last_update_success
+    assert coordinator.update_interval.total_seconds() == pytest.approx(BACKOFF_BASE, abs=1)
+    assert coordinator.timings.cycles[-1]["error_kind"] == ERROR_SERVER
+
+async def test_coordinator_retries_no_sooner_than_scan_interval(hass, mock_config_entry):
+    """Verify that a short Retry-After doesn't make the coordinator poll faster than its scan interval."""
+    coordinator = KotiakkuDataUpdateCoordinator(hass, mock_config_entry)
+
+    with aioresponses() as m:
+        m.get(mock_config_entry.data["url"], status=429, headers={"Retry-After": "5"})
+        await coordinator.async_refresh()
+
+    assert not coordinator.last_update_success
+    assert coordinator.update_interval == coordinator.poll_planner.scan_interval
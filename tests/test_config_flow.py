@@ -5,13 +5,16 @@ Elisa Kotiakku custom integration, ensuring users can configure
 their battery devices correctly.
 """
 
-from unittest.mock import patch
+from datetime import timedelta
+from unittest.mock import MagicMock, patch
 from aioresponses import aioresponses
+from pytest_homeassistant_custom_component.common import async_fire_time_changed
 
 from homeassistant import config_entries, data_entry_flow
 from homeassistant.core import HomeAssistant
 
 from custom_components.elisa_kotiakku.config_flow import validate_input
+from custom_components.elisa_kotiakku.fetcher import async_get_fetch_scheduler
 from custom_components.elisa_kotiakku.const import (
     DOMAIN, 
     CONF_POWER_UNIT, 
@@ -19,7 +22,9 @@ from custom_components.elisa_kotiakku.const import (
     UNIT_KW,
     CONF_SCAN_INTERVAL,
     CONF_API_KEY,
-    CONF_URL
+    CONF_URL,
+    SEED_MAX_AGE,
+    DATA_FETCH_SCHEDULER,
 )
 
 # --- Config Flow Tests ---
@@ -122,4 +127,69 @@ async def test_validate_input_cannot_connect(hass: HomeAssistant):
         # Simulate a generic server-side error (500)
         mock.get(data[CONF_URL], status=500)
         result = await validate_input(hass, data)
-        assert result == "cannot_connect"
\ No newline at end of file
+        assert result == "cannot_connect"
+async def test_validated_payload_serves_first_refresh(hass: HomeAssistant):
+    """Test that setting up an entry costs one API call, the one made by the validation."""
+    url = "http://127.0.0.1:8000/api/v1/status"
+    payload = [{"period_start": "2026-01-01T10:00:00+00:00", "state_of_charge_percent": 77}]
+    result = await hass.config_entries.flow.async_init(
+        DOMAIN, context={"source": config_entries.SOURCE_USER}
+    )
+
+    with aioresponses() as mock:
+        mock.get(url, status=200, payload=payload, headers={"ETag": '"v1"'})
+        result2 = await hass.config_entries.flow.async_configure(
+            result["flow_id"],
+            {"name": "Test Battery", "url": url, "api_key": "valid_key", CONF_POWER_UNIT: UNIT_KW},
+        )
+        await hass.async_block_till_done()
+        calls = len(list(mock.requests.values())[0])
+
+    assert result2["type"] == data_entry_flow.FlowResultType.CREATE_ENTRY
+    coordinator = hass.data[DOMAIN][result2["result"].entry_id]
+    assert coordinator.data["state_of_charge_percent"] == 77
+    assert calls == 1
+    assert coordinator.timings.cycles[-1]["seeded"] is True
+
+    await hass.config_entries.async_unload(result2["result"].entry_id)
+    await hass.async_block_till_done()
+
+async def test_validated_payload_expires(hass: HomeAssistant, freezer):
+    """Test that an old validation response is not used for the first refresh."""
+    data = {CONF_API_KEY: "valid_key", CONF_URL: "https://api.elisa.fi/battery"}
+    coordinator = MagicMock(api_url=data[CONF_URL], api_key=data[CONF_API_KEY])
+
+    with aioresponses() as mock:
+        mock.get(data[CONF_URL], status=200, payload=["validated"])
+        mock.get(data[CONF_URL], status=200, payload=["fresh"])
+        assert await validate_input(hass, data) is None
+        freezer.tick(timedelta(seconds=SEED_MAX_AGE + 1))
+        assert await async_get_fetch_scheduler(hass).async_fetch(coordinator) == ["fresh"]
+
+async def test_validate_input_caps_body(hass: HomeAssistant):
+    """Test that an oversized body still validates the URL, but is not kept."""
+    data = {CONF_API_KEY: "valid_key", CONF_URL: "https://api.elisa.fi/battery"}
+    coordinator = MagicMock(api_url=data[CONF_URL], api_key=data[CONF_API_KEY])
+
+    with aioresponses() as mock, patch(
+        "custom_components.elisa_kotiakku.fetcher.MAX_PAYLOAD_BYTES", 16
+    ):
+        mock.get(data[CONF_URL], status=200, payload=["x" * 100])
+        mock.get(data[CONF_URL], status=200, payload=["small"])
+        assert await validate_input(hass, data) is None
+        assert await async_get_fetch_scheduler(hass).async_fetch(coordinator) == ["small"]
+
+async def test_abandoned_seed_is_dropped(hass: HomeAssistant, freezer):
+    """Test that a validation response no entry picked up doesn't stay in memory."""
+    data = {CONF_API_KEY: "valid_key", CONF_URL: "https://api.elisa.fi/battery"}
+
+    with aioresponses() as mock:
+        mock.get(data[CONF_URL], status=200, payload=["validated"])
+        assert await validate_input(hass, data) is None
+
+    assert DATA_FETCH_SCHEDULER in hass.data
+    freezer.tick(timedelta(seconds=SEED_MAX_AGE + 1))
+    async_fire_time_changed(hass)
+    await hass.async_block_till_done()
+
+    assert DATA_FETCH_SCHEDULER not in hass.data
@@ -1,6 +1,8 @@
 """Tests for Elisa Kotiakku DataUpdateCoordinator."""
 
 import re
+from datetime import timedelta
+
 import pytest
 from aioresponses import aioresponses
 
@@ -50,7 +52,7 @@ async def test_coordinator_update_success(hass, mock_config_entry):
         
         coordinator = hass.data[DOMAIN][mock_config_entry.entry_id]
         assert coordinator.data["state_of_charge_percent"] == 85
-        assert coordinator.data["battery_power_kw_display"] == 1200.0
+        assert coordinator.data["battery_power_kw"] == 1.2
 
     await hass.config_entries.async_unload(mock_config_entry.entry_id)
     await hass.async_block_till_done()
@@ -135,4 +137,82 @@ async def test_coordinator_network_error(hass, mock_config_entry):
     with aioresponses() as m:
         m.get(mock_config_entry.data["url"], status=500)
         with pytest.raises(UpdateFailed, match="Error communicating with API"):
-            await coordinator._async_update_data()
\ No newline at end of file
+            await coordinator._async_update_data()
+
+# --- Measurement List Ingestion Tests ---
+
+def test_parse_measurements_sorts_and_deduplicates():
+    """Test that the measurement list is sorted oldest first without duplicates."""
+    from custom_components.elisa_kotiakku.coordinator import parse_measurements
+
+    raw = [
+        {"period_start": "2026-01-01T10:10:00+00:00", "solar_power_kw": 3.0},
+        {"period_start": "2026-01-01T10:00:00+00:00", "solar_power_kw": 1.0},
+        {"period_start": "2026-01-01T10:10:00+00:00", "solar_power_kw": 9.9},
+        {"period_start": "2026-01-01T10:05:00+00:00", "solar_power_kw": 2.0},
+        {"solar_power_kw": 5.0},
+    ]
+
+    timed, untimed = parse_measurements(raw)
+
+    assert [m["solar_power_kw"] for _, m in timed] == [1.0, 2.0, 3.0]
+    assert untimed == [{"solar_power_kw": 5.0}]
+
+async def test_coordinator_uses_newest_measurement(hass, mock_config_entry):
+    """Test that the newest period of the list becomes the current data."""
+    mock_config_entry.add_to_hass(hass)
+    coordinator = KotiakkuDataUpdateCoordinator(hass, mock_config_entry)
+
+    payload = [
+        {"period_start": "2026-01-01T10:05:00+00:00", "state_of_charge_percent": 51, "battery_power_kw": 0.0},
+        {"period_start": "2026-01-01T10:00:00+00:00", "state_of_charge_percent": 50, "battery_power_kw": 0.0},
+    ]
+
+    with aioresponses() as m:
+        m.get(mock_config_entry.data["url"], status=200, payload=payload)
+        data = await coordinator._async_update_data()
+
+    assert data["state_of_charge_percent"] == 51
+
+async def test_coordinator_takes_shared_payload(hass, mock_config_entry):
+    """Test that a payload fetched for another entry becomes our data without a request."""
+    mock_config_entry.add_to_hass(hass)
+    coordinator = KotiakkuDataUpdateCoordinator(hass, mock_config_entry)
+    payload = [{"state_of_charge_percent": 42, "battery_power_kw": 0.0}]
+
+    coordinator.async_handle_shared_payload(payload)
+
+    assert coordinator.data["state_of_charge_percent"] == 42
+    # The shared payload itself is left untouched
+    assert "battery_charge_total_kw" not in payload[0]
+
+# --- Unchanged Payload Tests ---
+
+async def test_coordinator_skips_unchanged_period(hass, mock_config_entry):
+    """Test that a repeated measurement period returns the previous data object."""
+    mock_config_entry.add_to_hass(hass)
+    coordinator = KotiakkuDataUpdateCoordinator(hass, mock_config_entry)
+    payload = [{"period_start": "2026-01-01T10:00:00+00:00", "battery_power_kw": 1.0}]
+
+    coordinator.data = coordinator._process_payload(payload)
+    again = coordinator._process_payload([dict(payload[0])])
+
+    assert again is coordinator.data
+    assert coordinator.skipped_updates == 1
+
+    newer = coordinator._process_payload(
+        [{"period_start": "2026-01-01T10:05:00+00:00", "battery_power_kw": 1.0}]
+    )
+    assert newer is not coordinator.data
+
+async def test_unchanged_untimed_payload_still_integrates(hass, mock_config_entry, freezer):
+    """Test that repeated values without timestamps still account for elapsed time."""
+    mock_config_entry.add_to_hass(hass)
+    coordinator = KotiakkuDataUpdateCoordinator(hass, mock_config_entry)
+    payload = [{"solar_power_kw": 2.0}]
+
+    coordinator.data = coordinator._process_payload(payload)
+    freezer.tick(timedelta(minutes=30))
+    assert coordinator._process_payload(payload) is coordinator.data
+
+    assert coordinator.integrator.accumulators["solar_energy_kwh"].value == 1.0
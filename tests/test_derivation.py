@@ -0,0 +1,81 @@
+"""Tests for the Elisa Kotiakku derivation table."""
+import math
+
+import numpy as np
+import pytest
+
+from custom_components.elisa_kotiakku.derivation import (
+    DERIVED_FIELDS,
+    DerivationContext,
+    derive,
+    derive_columns,
+    format_target_time,
+    target_minutes,
+)
+
+CTX = DerivationContext(battery_capacity=10.0)
+
+MEASUREMENTS = [
+    # Charging from solar and grid
+    {"state_of_charge_percent": 50.0, "battery_power_kw": -2.0, "solar_to_battery_kw": 2.0,
+     "grid_to_battery_kw": 0.5, "spot_price_cents_per_kwh": 10.0},
+    # Discharging to house and grid
+    {"state_of_charge_percent": 50.0, "battery_power_kw": 2.0, "battery_to_house_kw": 1.5,
+     "battery_to_grid_kw": 0.3, "spot_price_cents_per_kwh": 5.0},
+    # Idle
+    {"state_of_charge_percent": 90.0, "battery_power_kw": 0.0, "grid_to_house_kw": 0.4},
+]
+
+def test_derive_single_measurement():
+    """Verify the live path against hand-calculated values."""
+    data = derive(dict(MEASUREMENTS[0]), CTX)
+
+    assert data["battery_charge_total_kw"] == 2.5
+    assert data["battery_loss_kw"] == 0.5
+    assert data["battery_charge_efficiency"] == 80.0
+    assert data["net_savings_rate"] == pytest.approx(-0.05)
+    assert data["time_to_90_percent"] == 120
+    assert math.isnan(data["time_to_15_percent"])
+
+def test_columns_match_live_path():
+    """Verify that the vectorized evaluator agrees with the live path row by row."""
+    keys = sorted({key for m in MEASUREMENTS for key in m})
+    columns = {key: [m.get(key, 0) for m in MEASUREMENTS] for key in keys}
+
+    result = derive_columns(columns, CTX)
+
+    for row, measurement in enumerate(MEASUREMENTS):
+        expected = derive(dict(measurement), CTX)
+        for field in DERIVED_FIELDS:
+            assert result[field.key][row] == pytest.approx(expected[field.key], nan_ok=True), field.key
+
+def test_columns_missing_inputs_are_zero():
+    """Verify that fields missing from all rows are evaluated as zeros."""
+    result = derive_columns({"battery_power_kw": np.array([0.0, 1.0])}, CTX)
+
+    assert result["total_grid_import_kw"].tolist() == [0.0, 0.0]
+    assert result["battery_loss_kw"].tolist() == [0.0, 1.0]
+
+@pytest.mark.parametrize(
+    "soc, power, target, expected",
+    [
+        (50.0, -2.0, 90, "2h 0m"),
+        (50.0, 2.0, 15, "1h 45m"),
+        (50.0, 2.0, 90, "-"),
+        (89.8, -2.0, 90, "-"),
+        (50.0, -0.01, 90, "-"),
+        (80.0, -3.0, 90, "20m"),
+    ],
+)
+def test_target_time(soc, power, target, expected):
+    """Verify time-to-target formatting for the supported cases."""
+    assert format_target_time(target_minutes(soc, power, target, 10.0)) == expected
+
+def test_target_minutes_vectorized():
+    """Verify that target_minutes also accepts arrays."""
+    from custom_components.elisa_kotiakku.derivation import VECTOR_OPS
+
+    minutes = target_minutes(np.array([50.0, 50.0]), np.array([-2.0, 2.0]), 90, 10.0, VECTOR_OPS)
+
+    assert minutes[0] == 120
+    assert math.isnan(minutes[1])
@@ -1,12 +1,62 @@
 """Tests for Elisa Kotiakku diagnostics."""
+import json
+import re
+from unittest.mock import patch
+
+import pytest
+from aioresponses import aioresponses
+
 from custom_components.elisa_kotiakku.diagnostics import async_get_config_entry_diagnostics
+from custom_components.elisa_kotiakku.measurement import MeasurementRecord
 
 async def test_diagnostics_redaction(hass, mock_config_entry, mock_coordinator):
     """Verify that sensitive information is redacted in diagnostics."""
-    mock_coordinator.data = {"battery_power_kw": 1.0, "api_key": "SECRET_KEY_123"}
+    mock_coordinator.data = MeasurementRecord.from_raw(
+        None, {"battery_power_kw": 1.0, "api_key": "SECRET_KEY_123"}
+    )
     hass.data["elisa_kotiakku"] = {mock_config_entry.entry_id: mock_coordinator}
 
     diag = await async_get_config_entry_diagnostics(hass, mock_config_entry)
 
     # Check that 'api_key' is now '**REDACTED**'
-    assert diag["data"]["api_key"] == "**REDACTED**"
\ No newline at end of file
+    assert diag["data"]["api_key"] == "**REDACTED**"
+    assert diag["data"]["battery_power_kw"] == 1.0
+
+async def test_diagnostics_fetch_cycles(hass, mock_config_entry):
+    """Verify the recorded fetch cycles and scheduler state, newest cycle first."""
+    mock_config_entry.add_to_hass(hass)
+    first = [{"period_start": "2026-01-01T10:00:00+00:00", "solar_power_kw": 1.0}]
+    second = [{"period_start": "2026-01-01T10:05:00+00:00", "solar_power_kw": 2.0}]
+
+    with aioresponses() as m, patch("custom_components.elisa_kotiakku.fetcher.FETCH_JITTER", 0):
+        m.get(re.compile(r".*"), status=200, payload=first)
+        m.get(re.compile(r".*"), status=200, payload=second)
+        m.get(re.compile(r".*"), status=200, payload=second)
+        m.get(re.compile(r".*"), status=503)
+        await hass.config_entries.async_setup(mock_config_entry.entry_id)
+        await hass.async_block_till_done()
+        coordinator = hass.data["elisa_kotiakku"][mock_config_entry.entry_id]
+        for _ in range(3):
+            await coordinator.async_refresh()
+
+        diag = await async_get_config_entry_diagnostics(hass, mock_config_entry)
+
+    failed, skipped, new, initial = diag["timings"]["cycles"]
+    assert initial["status"] == 200 and initial["source"] == "poll"
+    assert initial["period"] == "2026-01-01T10:00:00+00:00"
+    # The first measurement is the baseline, the second one integrates the interval
+    assert initial["deltas"] == {}
+    assert new["deltas"]["solar_energy_kwh"] == pytest.approx(1.0 * 5 / 60)
+    assert new["skipped"] is False and new["bytes"] > 0 and "body" in new["phases"]
+    assert skipped["skipped"] is True and skipped["deltas"] == {}
+    assert failed["status"] == 503 and "503" in failed["error"]
+
+    json.dumps(diag)
+    scheduler = diag["scheduler"]
+    assert scheduler["next_poll"] == failed["next_poll"]
+    assert scheduler["skipped_updates"] == 1
+    assert scheduler["fetch"]["subscribers"] == 1
+    assert scheduler["poll_planner"]["late_retries"] == 0
+
+    await hass.config_entries.async_unload(mock_config_entry.entry_id)
+    await hass.async_block_till_done()
@@ -0,0 +1,179 @@
+"""Tests for the Elisa Kotiakku shared fetch scheduler."""
+import asyncio
+import re
+from datetime import datetime, timezone
+from unittest.mock import MagicMock, patch
+
+from aioresponses import aioresponses
+
+from homeassistant.helpers.update_coordinator import UpdateFailed
+
+from custom_components.elisa_kotiakku.backoff import ERROR_CANCELLED, KotiakkuFetchError
+from custom_components.elisa_kotiakku.const import DATA_FETCH_SCHEDULER, FETCH_JITTER
+from custom_components.elisa_kotiakku.fetcher import async_get_fetch_scheduler
+
+URL = "http://127.0.0.1:8000/api/v1/status"
+
+def _coordinator(api_key="test_key"):
+    coordinator = MagicMock()
+    coordinator.api_url = URL
+    coordinator.api_key = api_key
+    return coordinator
+
+async def test_concurrent_fetches_are_coalesced(hass):
+    """Verify that simultaneous polls for the same URL and key make one call."""
+    scheduler = async_get_fetch_scheduler(hass)
+    release = asyncio.Event()
+    calls = []
+
+    async def fake_request(url, api_key):
+        calls.append((url, api_key))
+        await release.wait()
+        return [{"battery_power_kw": 1.0}], True
+
+    with patch.object(scheduler, "_async_request", side_effect=fake_request):
+        first = hass.async_create_task(scheduler.async_fetch(_coordinator()))
+        second = hass.async_create_task(scheduler.async_fetch(_coordinator()))
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(first, second)
+
+    assert len(calls) == 1
+    assert results[0] is results[1]
+
+async def test_different_keys_are_not_coalesced(hass):
+    """Verify that different API keys get their own requests."""
+    scheduler = async_get_fetch_scheduler(hass)
+
+    with patch.object(scheduler, "_async_request", return_value=([], True)) as mock_request:
+        await scheduler.async_fetch(_coordinator("key_a"))
+        await scheduler.async_fetch(_coordinator("key_b"))
+
+    assert mock_request.call_count == 2
+
+async def test_result_fanned_out_to_subscribers(hass):
+    """Verify that other subscribers of the same URL and key receive the response."""
+    scheduler = async_get_fetch_scheduler(hass)
+    leader, follower, other = _coordinator(), _coordinator(), _coordinator("other_key")
+    for coordinator in (leader, follower, other):
+        scheduler.async_subscribe(coordinator)
+
+    with patch.object(scheduler, "_async_request", return_value=(["payload"], True)):
+        await scheduler.async_fetch(leader)
+
+    follower.async_handle_shared_payload.assert_called_once_with(["payload"])
+    leader.async_handle_shared_payload.assert_not_called()
+    other.async_handle_shared_payload.assert_not_called()
+
+async def test_errors_reach_every_waiter(hass):
+    """Verify that a failed request fails all coalesced callers and nothing is fanned out."""
+    scheduler = async_get_fetch_scheduler(hass)
+    follower = _coordinator()
+    scheduler.async_subscribe(follower)
+
+    async def failing_request(url, api_key):
+        await asyncio.sleep(0)
+        raise UpdateFailed("boom")
+
+    with patch.object(scheduler, "_async_request", side_effect=failing_request):
+        first = hass.async_create_task(scheduler.async_fetch(_coordinator()))
+        second = hass.async_create_task(scheduler.async_fetch(_coordinator()))
+        results = await asyncio.gather(first, second, return_exceptions=True)
+
+    assert all(isinstance(result, UpdateFailed) for result in results)
+    follower.async_handle_shared_payload.assert_not_called()
+
+async def test_jitter_is_shared_by_the_group(hass):
+    """Verify that polls arriving during another entry's jitter wait for its request."""
+    scheduler = async_get_fetch_scheduler(hass)
+    calls = []
+
+    async def fake_request(url, api_key):
+        calls.append((url, api_key))
+        return ["payload"], True
+
+    # The real jitter range, scaled down so the test is quick
+    with patch.object(scheduler, "_async_request", side_effect=fake_request), patch(
+        "custom_components.elisa_kotiakku.fetcher.random.uniform", side_effect=lambda low, high: high / 200
+    ) as uniform:
+        first = hass.async_create_task(scheduler.async_fetch(_coordinator(), jitter=True))
+        await asyncio.sleep(0.01)
+        second = hass.async_create_task(scheduler.async_fetch(_coordinator(), jitter=True))
+        results = await asyncio.gather(first, second)
+
+    assert len(calls) == 1
+    assert results[0] is results[1]
+    uniform.assert_called_once_with(0, FETCH_JITTER)
+
+async def test_cancelled_leader_releases_waiters(hass):
+    """Verify that the waiters of a cancelled request fail instead of hanging."""
+    scheduler = async_get_fetch_scheduler(hass)
+    started = asyncio.Event()
+
+    async def slow_request(url, api_key):
+        started.set()
+        await asyncio.sleep(60)
+
+    with patch.object(scheduler, "_async_request", side_effect=slow_request):
+        leader = hass.async_create_task(scheduler.async_fetch(_coordinator()))
+        await started.wait()
+        waiter = hass.async_create_task(scheduler.async_fetch(_coordinator()))
+        await asyncio.sleep(0)
+        leader.cancel()
+        result = await asyncio.wait_for(asyncio.gather(waiter, return_exceptions=True), 1)
+
+    assert leader.cancelled()
+    assert isinstance(result[0], KotiakkuFetchError)
+    assert result[0].kind == ERROR_CANCELLED
+    assert not scheduler._inflight
+
+async def test_scheduler_removed_with_last_subscriber(hass):
+    """Verify that the scheduler is dropped once no entry uses it."""
+    scheduler = async_get_fetch_scheduler(hass)
+    unsubscribe = scheduler.async_subscribe(_coordinator())
+
+    unsubscribe()
+
+    assert DATA_FETCH_SCHEDULER not in hass.data
+
+async def test_not_modified_is_not_fanned_out(hass):
+    """Verify that a 304 response is not handed to the other subscribers."""
+    scheduler = async_get_fetch_scheduler(hass)
+    leader, follower = _coordinator(), _coordinator()
+    scheduler.async_subscribe(follower)
+
+    with patch.object(scheduler, "_async_request", return_value=(["payload"], False)):
+        assert await scheduler.async_fetch(leader) == ["payload"]
+
+    follower.async_handle_shared_payload.assert_not_called()
+
+async def test_conditional_request_reuses_payload(hass):
+    """Verify that validators are sent back and a 304 returns the previous payload."""
+    scheduler = async_get_fetch_scheduler(hass)
+    payload = [{"battery_power_kw": 1.0}]
+
+    with aioresponses() as m:
+        m.get(URL, status=200, payload=payload, headers={"ETag": '"v1"'})
+        m.get(URL, status=304)
+        first = await scheduler.async_fetch(_coordinator())
+        second = await scheduler.async_fetch(_coordinator())
+        requests = list(m.requests.values())[0]
+
+    assert second is first
+    assert requests[1].kwargs["headers"]["if-none-match"] == '"v1"'
+
+async def test_range_request_is_not_conditional(hass):
+    """Verify that a gap recovery request carries the range and no validators."""
+    scheduler = async_get_fetch_scheduler(hass)
+    start = datetime(2026, 1, 1, 10, 0, tzinfo=timezone.utc)
+
+    with aioresponses() as m:
+        m.get(URL, status=200, payload=[], headers={"ETag": '"v1"'})
+        m.get(re.compile(r".*start_time.*"), status=200, payload=[{"battery_power_kw": 2.0}])
+        await scheduler.async_fetch(_coordinator())
+        result = await scheduler.async_fetch_range(_coordinator(), start, start.replace(hour=11))
+        request = [call for calls in m.requests.values() for call in calls][-1]
+
+    assert result == [{"battery_power_kw": 2.0}]
+    assert "if-none-match" not in request.kwargs["headers"]
+    assert request.kwargs["params"]["start_time"] == start.isoformat()
@@ -0,0 +1,72 @@
+"""Tests for the Elisa Kotiakku measurement history file."""
+from datetime import datetime, timedelta, timezone
+
+from custom_components.elisa_kotiakku.history import KotiakkuHistory, _HEADER_SIZE, _RECORD_DTYPE
+
+T0 = datetime(2026, 1, 1, 12, 0, tzinfo=timezone.utc)
+
+def _periods(*minutes):
+    return [(T0 + timedelta(minutes=m), {"solar_power_kw": float(m)}) for m in minutes]
+
+def _history(tmp_path, capacity=4):
+    history = KotiakkuHistory(None, str(tmp_path / "kotiakku.history"), capacity)
+    history.open()
+    return history
+
+def test_append_and_read_range(tmp_path):
+    """Verify that records come back by period start, oldest first."""
+    history = _history(tmp_path)
+    history.append(_periods(0, 5, 10))
+
+    records = history.read(T0 + timedelta(minutes=5), T0 + timedelta(minutes=10))
+
+    assert records["solar_power_kw"].tolist() == [5.0, 10.0]
+    # Fields the measurement didn't have are stored as missing
+    assert history.measurements(T0, T0)[0] == {
+        "period_start": T0.isoformat(), "solar_power_kw": 0.0
+    }
+    history.close()
+
+def test_ring_keeps_newest_records(tmp_path):
+    """Verify that the oldest records are overwritten and old periods are not appended."""
+    history = _history(tmp_path)
+    history.append(_periods(0, 5, 10, 15, 20, 25))
+
+    assert history.append(_periods(20)) == 0
+    records = history.read(T0, T0 + timedelta(hours=1))
+    assert records["solar_power_kw"].tolist() == [10.0, 15.0, 20.0, 25.0]
+    history.close()
+
+def test_reopen_ignores_torn_record(tmp_path):
+    """Verify that the head is found again and a torn record is treated as empty."""
+    history = _history(tmp_path)
+    history.append(_periods(0, 5, 10, 15, 20))
+    history.close()
+
+    # Tear the newest record (slot 0 after wrapping around)
+    with open(history.path, "r+b") as handle:
+        handle.seek(_HEADER_SIZE + 8)
+        handle.write(b"\xff" * 8)
+
+    history.open()
+    records = history.read(T0, T0 + timedelta(hours=1))
+    assert records["solar_power_kw"].tolist() == [5.0, 10.0, 15.0]
+    assert history.newest == (T0 + timedelta(minutes=15)).timestamp()
+
+    # Writing continues into the torn slot
+    history.append(_periods(25))
+    assert history.read(T0, T0 + timedelta(hours=1))["solar_power_kw"].tolist() == [5.0, 10.0, 15.0, 25.0]
+    history.close()
+
+def test_other_layout_is_replaced(tmp_path):
+    """Verify that a file with another header is recreated empty."""
+    history = _history(tmp_path)
+    history.append(_periods(0))
+    history.close()
+
+    history = _history(tmp_path, capacity=8)
+
+    assert history.newest is None
+    assert len(history.read(T0, T0 + timedelta(hours=1))) == 0
+    history.close()
+    assert (tmp_path / "kotiakku.history").stat().st_size == _HEADER_SIZE + 8 * _RECORD_DTYPE.itemsize
@@ -48,4 +48,134 @@ async def test_setup_entry_auth_failure(hass, mock_config_entry):
         assert mock_config_entry.state in [ConfigEntryState.SETUP_ERROR, ConfigEntryState.SETUP_RETRY]
 
     await hass.config_entries.async_unload(mock_config_entry.entry_id)
-    await hass.async_block_till_done()
\ No newline at end of file
+    await hass.async_block_till_done()
+async def test_setup_entry_warm_start(hass, hass_storage, mock_config_entry):
+    """Test that a stored measurement lets setup finish while the API is down."""
+    from homeassistant.util import dt as dt_util
+
+    hass_storage[f"{DOMAIN}.{mock_config_entry.entry_id}"] = {
+        "version": 1,
+        "key": f"{DOMAIN}.{mock_config_entry.entry_id}",
+        "data": {
+            "fetched": dt_util.utcnow().isoformat(),
+            "measurement": {"battery_power_kw": 1.5, "state_of_charge_percent": 64},
+            "integrator": {"last_time": None, "rates": None, "values": {"solar_energy_kwh": 12.5}},
+            "gaps": [],
+        },
+    }
+    mock_config_entry.add_to_hass(hass)
+
+    with aioresponses() as m:
+        m.get(re.compile(r".*"), status=500)
+        assert await hass.config_entries.async_setup(mock_config_entry.entry_id)
+        await hass.async_block_till_done()
+
+    assert mock_config_entry.state is ConfigEntryState.LOADED
+    coordinator = hass.data[DOMAIN][mock_config_entry.entry_id]
+    assert coordinator.data["state_of_charge_percent"] == 64
+    assert coordinator.integrator.accumulators["solar_energy_kwh"].value == 12.5
+    # The background refresh failed, so the entities show as unavailable
+    assert coordinator.last_update_success is False
+
+    await hass.config_entries.async_unload(mock_config_entry.entry_id)
+    await hass.async_block_till_done()
+
+async def test_unload_stores_state(hass, hass_storage, mock_config_entry):
+    """Test that the newest measurement and totals are stored on unload."""
+    mock_config_entry.add_to_hass(hass)
+
+    with aioresponses() as m:
+        m.get(re.compile(r".*"), status=200, payload={"battery_power_kw": 1.5, "solar_power_kw": 2.0})
+        await hass.config_entries.async_setup(mock_config_entry.entry_id)
+        await hass.async_block_till_done()
+
+    await hass.config_entries.async_unload(mock_config_entry.entry_id)
+    await hass.async_block_till_done()
+
+    stored = hass_storage[f"{DOMAIN}.{mock_config_entry.entry_id}"]["data"]
+    assert stored["measurement"]["solar_power_kw"] == 2.0
+    assert "solar_energy_kwh" in stored["integrator"]["values"]
+
+async def test_unload_stops_recovery_before_saving(hass, hass_storage, mock_config_entry):
+    """Test that a running gap recovery is stopped before the final save."""
+    import asyncio
+    from datetime import timedelta
+    from homeassistant.util import dt as dt_util
+    from custom_components.elisa_kotiakku import async_unload_entry
+    from custom_components.elisa_kotiakku.fetcher import async_get_fetch_scheduler
+
+    mock_config_entry.add_to_hass(hass)
+    with aioresponses() as m:
+        m.get(re.compile(r".*"), status=200, payload={"battery_power_kw": 1.5, "solar_power_kw": 2.0})
+        await hass.config_entries.async_setup(mock_config_entry.entry_id)
+        await hass.async_block_till_done()
+    coordinator = hass.data[DOMAIN][mock_config_entry.entry_id]
+    events = []
+    started = asyncio.Event()
+
+    async def fetch_range(*args):
+        started.set()
+        try:
+            await asyncio.Event().wait()
+        except asyncio.CancelledError:
+            events.append("cancelled")
+            raise
+
+    async def save():
+        events.append("saved")
+
+    now = dt_util.utcnow()
+    with patch.object(async_get_fetch_scheduler(hass), "async_fetch_range", side_effect=fetch_range), \
+            patch.object(coordinator, "async_save", side_effect=save):
+        coordinator.recovery.async_add_gap(now - timedelta(hours=1), now)
+        await started.wait()
+        # Only async_unload_entry itself, the entry's own unload callbacks run after it
+        with patch.object(hass.config_entries, "async_unload_platforms", return_value=True):
+            assert await async_unload_entry(hass, mock_config_entry)
+
+    assert events == ["cancelled", "saved"]
+
+async def test_options_applied_without_reload(hass, mock_config_entry):
+    """Verify that changed options reach the running entry without a reload or a request."""
+    from homeassistant.helpers import entity_registry as er
+
+    mock_config_entry.add_to_hass(hass)
+    payload = [{
+        "period_start": "2026-01-01T10:00:00+00:00",
+        "state_of_charge_percent": 50.0,
+        "battery_power_kw": -2.0,
+        "solar_to_battery_kw": 2.0,
+    }]
+
+    with aioresponses() as m:
+        m.get(re.compile(r".*"), status=200, payload=payload)
+        await hass.config_entries.async_setup(mock_config_entry.entry_id)
+        await hass.async_block_till_done()
+        coordinator = hass.data[DOMAIN][mock_config_entry.entry_id]
+        assert hass.states.get("sensor.kotiakku_time_to_90_percent").state == "4h 12m"
+
+        hass.config_entries.async_update_entry(
+            mock_config_entry,
+            options={"battery_capacity": 10.0, "scan_interval": 600, "power_unit": "W"},
+        )
+        await hass.async_block_till_done()
+        requests = sum(len(calls) for calls in m.requests.values())
+
+    assert hass.data[DOMAIN][mock_config_entry.entry_id] is coordinator
+    assert requests == 1
+    assert coordinator.poll_planner.scan_interval.total_seconds() == 600
+    assert hass.states.get("sensor.kotiakku_time_to_90_percent").state == "2h 0m"
+    entity = er.async_get(hass).async_get("sensor.kotiakku_solar_power_kw")
+    assert entity.options["sensor"]["unit_of_measurement"] == "W"
+
+    # A new API key can't be applied in place
+    with aioresponses() as m:
+        m.get(re.compile(r".*"), status=200, payload=payload)
+        hass.config_entries.async_update_entry(
+            mock_config_entry, data={**mock_config_entry.data, "api_key": "other_key"}
+        )
+        await hass.async_block_till_done()
+    assert hass.data[DOMAIN][mock_config_entry.entry_id] is not coordinator
+
+    await hass.config_entries.async_unload(mock_config_entry.entry_id)
+    await hass.async_block_till_done()
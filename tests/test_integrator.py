@@ -0,0 +1,126 @@
+"""Tests for the Elisa Kotiakku energy integrator."""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from custom_components.elisa_kotiakku.const import INTEGRATION_TRAPEZOIDAL
+from custom_components.elisa_kotiakku.integrator import KotiakkuEnergyIntegrator
+
+T0 = datetime(2026, 1, 1, 12, 0, tzinfo=timezone.utc)
+
+def test_left_rule_holds_previous_power():
+    """Verify that the left rule integrates each value until the next period."""
+    integrator = KotiakkuEnergyIntegrator()
+
+    integrator.advance(T0, {"solar_power_kw": 2.0})
+    integrator.advance(T0 + timedelta(minutes=30), {"solar_power_kw": 4.0})
+
+    assert integrator.accumulators["solar_energy_kwh"].value == 1.0
+
+def test_trapezoidal_rule_averages_endpoints():
+    """Verify that the trapezoidal rule uses the mean of both endpoints."""
+    integrator = KotiakkuEnergyIntegrator(method=INTEGRATION_TRAPEZOIDAL)
+
+    integrator.advance(T0, {"solar_power_kw": 2.0})
+    integrator.advance(T0 + timedelta(minutes=30), {"solar_power_kw": 4.0})
+
+    assert integrator.accumulators["solar_energy_kwh"].value == 1.5
+
+def test_totals_equal_sum_of_parts():
+    """Verify that totals and their parts integrate over identical intervals."""
+    integrator = KotiakkuEnergyIntegrator()
+    data = {
+        "grid_to_house_kw": 1.3, "grid_to_battery_kw": 0.7,
+        "total_grid_import_kw": 2.0,
+    }
+
+    for minutes in (0, 5, 11, 17, 30):
+        integrator.advance(T0 + timedelta(minutes=minutes), data)
+
+    acc = integrator.accumulators
+    assert acc["total_grid_import_kwh"].value == pytest.approx(
+        acc["grid_to_house_kwh"].value + acc["grid_to_battery_kwh"].value
+    )
+
+def test_old_and_gap_measurements():
+    """Verify that repeated periods and too long gaps add no energy."""
+    integrator = KotiakkuEnergyIntegrator()
+
+    integrator.advance(T0, {"solar_power_kw": 2.0})
+    assert not integrator.advance(T0, {"solar_power_kw": 2.0})
+    integrator.advance(T0 + timedelta(hours=3), {"solar_power_kw": 2.0})
+
+    assert integrator.accumulators["solar_energy_kwh"].value == 0.0
+    assert integrator.last_time == T0 + timedelta(hours=3)
+
+def test_unbridged_interval_adds_nothing():
+    """Verify that an interval left to gap recovery is not integrated."""
+    integrator = KotiakkuEnergyIntegrator()
+
+    integrator.advance(T0, {"solar_power_kw": 2.0})
+    integrator.advance(T0 + timedelta(minutes=30), {"solar_power_kw": 2.0}, bridge=False)
+
+    assert integrator.accumulators["solar_energy_kwh"].value == 0.0
+    assert integrator.first_time == T0
+
+def test_energy_uses_magnitude_savings_keep_sign():
+    """Verify that energy integrates |power| while savings stay signed."""
+    integrator = KotiakkuEnergyIntegrator()
+
+    integrator.advance(T0, {"battery_loss_kw": -1.0, "net_savings_rate": -1.0})
+    integrator.advance(T0 + timedelta(hours=1), {})
+
+    assert integrator.accumulators["battery_loss_kwh"].value == 1.0
+    assert integrator.accumulators["total_savings_eur"].value == -1.0
+
+def test_restore_is_applied_once():
+    """Verify that a restored total is only added once."""
+    integrator = KotiakkuEnergyIntegrator()
+
+    integrator.restore("house_energy_kwh", 5.0)
+    integrator.restore("house_energy_kwh", 5.0)
+
+    assert integrator.accumulators["house_energy_kwh"].value == 5.0
+
+def test_state_round_trip():
+    """Verify that a loaded state continues integrating where it stopped."""
+    integrator = KotiakkuEnergyIntegrator()
+    integrator.advance(T0, {"solar_power_kw": 2.0})
+    integrator.advance(T0 + timedelta(minutes=30), {"solar_power_kw": 4.0})
+
+    loaded = KotiakkuEnergyIntegrator()
+    loaded.load(integrator.as_dict())
+    loaded.advance(T0 + timedelta(hours=1), {"solar_power_kw": 0.0})
+
+    assert loaded.accumulators["solar_energy_kwh"].value == 3.0
+    assert loaded.accumulators["solar_energy_kwh"].restored
+    # A sensor total restored afterwards is ignored
+    loaded.restore("solar_energy_kwh", 100.0)
+    assert loaded.accumulators["solar_energy_kwh"].value == 3.0
+
+def test_flow_costs_use_the_price_of_each_period():
+    """Verify that each period is priced at its own spot price, live and vectorized alike."""
+    from custom_components.elisa_kotiakku.derivation import DerivationContext, derive, derive_columns
+    from custom_components.elisa_kotiakku.measurement import MeasurementRecord
+
+    raw = [
+        {"grid_to_house_kw": 2.0, "solar_to_grid_kw": 1.0, "spot_price_cents_per_kwh": 10.0},
+        {"grid_to_house_kw": 2.0, "solar_to_grid_kw": 1.0, "spot_price_cents_per_kwh": 30.0},
+        {"grid_to_house_kw": 0.0, "solar_to_grid_kw": 0.0, "spot_price_cents_per_kwh": 50.0},
+    ]
+    ctx = DerivationContext(battery_capacity=10.0)
+    times = [T0 + timedelta(minutes=30 * index) for index in range(len(raw))]
+
+    integrator = KotiakkuEnergyIntegrator()
+    for timestamp, measurement in zip(times, raw):
+        integrator.advance(timestamp, derive(MeasurementRecord.from_raw(timestamp, measurement), ctx))
+
+    acc = integrator.accumulators
+    # 1 kWh at 0.10 € plus 1 kWh at 0.30 €
+    assert acc["grid_to_house_cost_eur"].value == pytest.approx(0.4)
+    assert acc["solar_to_grid_value_eur"].value == pytest.approx(0.2)
+
+    columns = derive_columns({key: [item[key] for item in raw] for key in raw[0]}, ctx)
+    totals = KotiakkuEnergyIntegrator().integrate_columns([t.timestamp() for t in times], columns)
+    assert totals["grid_to_house_cost_eur"] == pytest.approx(0.4)
+    assert totals["solar_to_grid_value_eur"] == pytest.approx(0.2)
@@ -0,0 +1,45 @@
+"""Tests for the Elisa Kotiakku measurement record."""
+import pytest
+
+from custom_components.elisa_kotiakku.derivation import DerivationContext, derive
+from custom_components.elisa_kotiakku.measurement import FIELD_INDEX, MeasurementRecord
+
+RAW = {
+    "state_of_charge_percent": 50.0,
+    "battery_power_kw": -2.0,
+    "solar_to_battery_kw": 2.0,
+    "grid_to_battery_kw": 0.5,
+    "period_start": "2024-01-01T12:00:00Z",
+}
+
+def test_record_reads_raw_and_derived_fields():
+    """Verify dict-style and index access on a derived record."""
+    record = derive(MeasurementRecord.from_raw(None, RAW), DerivationContext(battery_capacity=10.0))
+
+    assert record["battery_power_kw"] == -2.0
+    assert record.value(FIELD_INDEX["battery_charge_total_kw"]) == 2.5
+    assert record.get("time_to_90_percent") == "2h 0m"
+    assert record.get("time_to_15_percent") == "-"
+    # Indexing formats text fields the same way
+    assert record["time_to_90_percent"] == "2h 0m"
+    assert record["time_to_15_percent"] == "-"
+    # Unknown keys fall back to the decoded item
+    assert record["period_start"] == RAW["period_start"]
+
+def test_record_missing_values():
+    """Verify that missing fields read as None / default and are not contained."""
+    record = MeasurementRecord.from_raw(None, {"solar_power_kw": None})
+
+    assert record.value(FIELD_INDEX["solar_power_kw"]) is None
+    assert record.get("solar_power_kw", 0) == 0
+    assert "solar_power_kw" not in record
+    with pytest.raises(KeyError):
+        record["solar_power_kw"]
+
+def test_record_leaves_raw_item_untouched():
+    """Verify that deriving does not write into the decoded API item."""
+    raw = dict(RAW)
+    record = derive(MeasurementRecord.from_raw(None, raw), DerivationContext(battery_capacity=10.0))
+
+    assert raw == RAW
+    assert record.as_dict()["battery_loss_kw"] == 0.5
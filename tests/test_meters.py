@@ -0,0 +1,84 @@
+"""Tests for the Elisa Kotiakku daily, weekly and monthly energy meters."""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from homeassistant.util import dt as dt_util
+
+from custom_components.elisa_kotiakku.integrator import KotiakkuEnergyIntegrator
+from custom_components.elisa_kotiakku.meters import (
+    METERED_KEYS,
+    PERIOD_DAILY,
+    PERIOD_MONTHLY,
+    PERIOD_WEEKLY,
+    KotiakkuPeriodMeters,
+)
+
+# 23:00 in Helsinki (UTC+2) on Saturday 31 January
+T0 = datetime(2026, 1, 31, 21, 0, tzinfo=timezone.utc)
+STEP = timedelta(minutes=15)
+
+@pytest.fixture
+def helsinki():
+    previous = dt_util.DEFAULT_TIME_ZONE
+    dt_util.set_default_time_zone(dt_util.get_time_zone("Europe/Helsinki"))
+    yield
+    dt_util.set_default_time_zone(previous)
+
+def _meters():
+    integrator = KotiakkuEnergyIntegrator()
+    for key in METERED_KEYS:
+        integrator.restore(key, 0.0)
+    return integrator, KotiakkuPeriodMeters(integrator)
+
+def _feed(integrator, meters, start, count, power=4.0):
+    for index in range(count):
+        timestamp = start + STEP * index
+        integrator.advance(timestamp, {"solar_power_kw": power})
+        meters.advance(timestamp)
+
+def test_resets_at_local_midnight(helsinki):
+    """Verify that the day and month reset at local midnight, not UTC, and the week runs on."""
+    integrator, meters = _meters()
+
+    # 23:00 - 00:30 local, 1 kWh per period
+    _feed(integrator, meters, T0, 7)
+    local_midnight = datetime(2026, 2, 1, tzinfo=dt_util.DEFAULT_TIME_ZONE)
+
+    # The four periods before midnight went to the previous day and month
+    assert meters.value("solar_energy_kwh", PERIOD_DAILY) == 2.0
+    assert meters.value("solar_energy_kwh", PERIOD_MONTHLY) == 2.0
+    assert meters.value("solar_energy_kwh", PERIOD_WEEKLY) == 6.0
+    assert meters.starts[PERIOD_DAILY] == local_midnight
+    assert meters.starts[PERIOD_MONTHLY] == local_midnight
+    assert meters.starts[PERIOD_WEEKLY] == datetime(2026, 1, 26, tzinfo=dt_util.DEFAULT_TIME_ZONE)
+
+def test_waits_for_restored_totals(helsinki):
+    """Verify that a meter starts once its total has been restored, not before."""
+    integrator = KotiakkuEnergyIntegrator()
+    meters = KotiakkuPeriodMeters(integrator)
+
+    _feed(integrator, meters, T0 + timedelta(hours=2), 2)
+    assert meters.value("solar_energy_kwh", PERIOD_DAILY) is None
+
+    integrator.restore("solar_energy_kwh", 100.0)
+    _feed(integrator, meters, T0 + timedelta(hours=2, minutes=30), 2)
+    assert meters.value("solar_energy_kwh", PERIOD_DAILY) == 1.0
+
+def test_state_round_trip(helsinki):
+    """Verify that a restart continues the current periods, and a restart on a new day resets."""
+    integrator, meters = _meters()
+    _feed(integrator, meters, T0 + timedelta(hours=2), 5)
+
+    restarted = KotiakkuEnergyIntegrator()
+    restarted.load(integrator.as_dict())
+    reloaded = KotiakkuPeriodMeters(restarted)
+    reloaded.load(meters.as_dict())
+    _feed(restarted, reloaded, T0 + timedelta(hours=3, minutes=15), 1)
+    assert reloaded.value("solar_energy_kwh", PERIOD_DAILY) == 5.0
+    assert reloaded.starts == meters.starts
+
+    # A day later, without data in between
+    _feed(restarted, reloaded, T0 + timedelta(days=1, hours=3), 1)
+    assert reloaded.value("solar_energy_kwh", PERIOD_DAILY) == 0.0
+    assert reloaded.value("solar_energy_kwh", PERIOD_MONTHLY) == 5.0
@@ -0,0 +1,50 @@
+"""Tests for the Elisa Kotiakku power tariff peak tracker."""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from custom_components.elisa_kotiakku.const import PEAK_HOURS
+from custom_components.elisa_kotiakku.peaks import KotiakkuPeakTracker
+
+T0 = datetime(2026, 1, 10, 12, 0, tzinfo=timezone.utc)
+
+def _feed(tracker, start, powers, step=timedelta(minutes=15)):
+    for index, power in enumerate(powers):
+        tracker.add(start + step * index, power)
+
+def test_hour_average_and_projection():
+    """Verify the projected average of the running hour and the peak of the finished one."""
+    tracker = KotiakkuPeakTracker()
+    _feed(tracker, T0, [2.0, 4.0])
+
+    # 15 minutes at 2 kW, then 4 kW for the rest of the hour
+    assert tracker.projection() == pytest.approx(3.5)
+    assert tracker.peak is None
+
+    _feed(tracker, T0 + timedelta(minutes=30), [4.0, 4.0, 1.0])
+    assert tracker.peak == pytest.approx(3.5)
+    assert tracker.projection() == pytest.approx(1.0)
+
+def test_keeps_highest_hours_of_the_month():
+    """Verify that only the PEAK_HOURS highest hours are kept, and a new month starts over."""
+    tracker = KotiakkuPeakTracker()
+    powers = [1.0, 5.0, 2.0, 7.0, 3.0, 6.0, 0.5]
+    _feed(tracker, T0, powers, step=timedelta(hours=1))
+
+    assert [average for _, average in tracker.peaks] == sorted(powers[:-1], reverse=True)[:PEAK_HOURS]
+
+    _feed(tracker, datetime(2026, 2, 1, 12, 0, tzinfo=timezone.utc), [1.0, 1.0], step=timedelta(hours=1))
+    assert tracker.previous_month_peak == 7.0
+    assert tracker.peak == 1.0
+
+def test_state_round_trip_and_old_periods():
+    """Verify that a restored tracker continues the hour and ignores periods it already has."""
+    tracker = KotiakkuPeakTracker()
+    _feed(tracker, T0, [2.0, 4.0])
+
+    restored = KotiakkuPeakTracker()
+    restored.load(tracker.as_dict())
+    assert restored.add(T0, 10.0) is False
+    _feed(restored, T0 + timedelta(minutes=30), [4.0, 4.0, 1.0])
+
+    assert restored.peak == pytest.approx(3.5)
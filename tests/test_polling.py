@@ -0,0 +1,126 @@
+"""Tests for the Elisa Kotiakku adaptive poll planner."""
+from datetime import datetime, timedelta, timezone
+
+from custom_components.elisa_kotiakku.const import LATE_RETRY_DELAYS, PUBLISH_MARGIN
+from custom_components.elisa_kotiakku.polling import KotiakkuPollPlanner
+
+T0 = datetime(2026, 1, 1, 12, 0, tzinfo=timezone.utc)
+CADENCE = timedelta(minutes=5)
+
+def _starts(newest_start, count=3):
+    return [newest_start - CADENCE * i for i in reversed(range(count))]
+
+def test_fixed_interval_without_timestamps():
+    """Verify that the scan interval is used until the cadence is known."""
+    planner = KotiakkuPollPlanner(300)
+
+    assert planner.next_interval(T0, False) == timedelta(seconds=300)
+
+def test_poll_aligned_to_next_publish():
+    """Verify that the next poll lands just after the next expected publish."""
+    planner = KotiakkuPollPlanner(300)
+    end = T0 + CADENCE
+
+    # Polled 40 s after the newest period ended
+    now = end + timedelta(seconds=40)
+    assert planner.observe(now, _starts(T0), end)
+
+    assert planner.cadence == CADENCE
+    assert planner.publish_lag == timedelta(seconds=40)
+    assert now + planner.next_interval(now, True) == end + CADENCE + timedelta(seconds=45)
+
+def test_lag_estimate_uses_fastest_observation():
+    """Verify that a poll long after the publish doesn't inflate the lag estimate."""
+    planner = KotiakkuPollPlanner(300)
+
+    planner.observe(T0 + CADENCE + timedelta(seconds=200), _starts(T0), T0 + CADENCE)
+    planner.observe(T0 + 2 * CADENCE + timedelta(seconds=30), _starts(T0 + CADENCE), T0 + 2 * CADENCE)
+
+    assert planner.publish_lag == timedelta(seconds=30)
+
+def test_planned_polls_keep_lag_estimate():
+    """Verify that polls landing on the planned time don't creep later and later."""
+    planner = KotiakkuPollPlanner(300)
+    end = T0 + CADENCE
+    now = end + timedelta(seconds=40)
+    planner.observe(now, _starts(T0), end)
+
+    # Well past the sample window, every poll on the planned time
+    for _ in range(30):
+        now += planner.next_interval(now, True)
+        end += CADENCE
+        planner.observe(now, _starts(end - CADENCE), end)
+
+    assert planner.publish_lag == timedelta(seconds=40)
+    assert now - end == timedelta(seconds=45)
+
+def test_late_poll_keeps_cadence():
+    """Verify that a poll landing a little after its planned time doesn't skip the next period."""
+    planner = KotiakkuPollPlanner(300)
+    end = T0 + CADENCE
+    now = end + timedelta(seconds=40)
+    planner.observe(now, _starts(T0), end)
+    planned = now + planner.next_interval(now, True)
+
+    # Jitter and the request itself put the poll a bit after the planned time
+    now = planned + timedelta(seconds=0.2)
+    end += CADENCE
+    planner.observe(now, _starts(end - CADENCE), end)
+
+    assert planner.next_interval(now, True) == CADENCE - timedelta(seconds=0.2)
+
+def test_regular_polls_keep_scan_interval_apart():
+    """Verify that a faster publish cadence doesn't raise the poll rate."""
+    planner = KotiakkuPollPlanner(300)
+    minute = timedelta(minutes=1)
+    starts = [T0 - minute * i for i in reversed(range(5))]
+    end = T0 + minute
+    now = end + timedelta(seconds=10)
+
+    planner.observe(now, starts, end)
+    interval = planner.next_interval(now, True)
+
+    assert interval >= timedelta(seconds=300)
+    # Still aligned to the publish phase: 10 s lag + 5 s margin past a minute boundary
+    assert (now + interval - end) % minute == timedelta(seconds=15)
+
+def _poll(lag, lateness, periods=24):
+    """Poll an API that publishes each period 'lag' after its end, each poll 'lateness' after its planned time.
+
+    The planner has learned a 40 s lag before. Returns the gaps between the
+    polls and how old (seconds) each new period was when it was picked up.
+    """
+    planner = KotiakkuPollPlanner(300)
+    end = T0 + CADENCE
+    now = end + timedelta(seconds=40)
+    planner.observe(now, _starts(T0), end)
+    interval = planner.next_interval(now, True)
+
+    spacing = []
+    ages = []
+    while len(ages) < periods:
+        spacing.append(interval + lateness)
+        now += interval + lateness
+        # Newest period out by now
+        newest_end = T0 + CADENCE * ((now - lag - T0) // CADENCE)
+        new_data = planner.observe(now, _starts(newest_end - CADENCE), newest_end)
+        if new_data:
+            ages.append((now - newest_end - lag).total_seconds())
+        interval = planner.next_interval(now, new_data)
+    return spacing, ages
+
+def test_one_request_per_period():
+    """Verify that every period is picked up soon after its publish, even when the polls land late."""
+    for lateness in (timedelta(0), timedelta(seconds=0.2), timedelta(seconds=10)):
+        spacing, ages = _poll(timedelta(seconds=40), lateness)
+        assert len(spacing) == len(ages)
+        assert max(ages) <= PUBLISH_MARGIN + lateness.total_seconds() + 1e-6
+
+def test_late_measurement_moves_polls_later():
+    """Verify that the polls follow a publish that comes later than learned, a scan interval apart."""
+    spacing, ages = _poll(timedelta(seconds=150), timedelta(seconds=0.2))
+
+    assert min(spacing) >= timedelta(seconds=300)
+    # A few late polls find the new publish time, then every period is picked up right away
+    assert len(spacing) <= len(ages) + 1
+    assert max(ages[4:]) <= PUBLISH_MARGIN + LATE_RETRY_DELAYS[-1]
@@ -0,0 +1,62 @@
+"""Tests for the Elisa Kotiakku rolling self-sufficiency and self-consumption."""
+from datetime import datetime, timedelta, timezone
+
+from custom_components.elisa_kotiakku.const import RATIO_WINDOW_SAMPLES
+from custom_components.elisa_kotiakku.integrator import KotiakkuEnergyIntegrator
+from custom_components.elisa_kotiakku.ratios import RATIO_INPUTS, KotiakkuRollingRatios
+
+T0 = datetime(2026, 6, 1, 0, 0, tzinfo=timezone.utc)
+STEP = timedelta(minutes=5)
+
+def _ratios():
+    integrator = KotiakkuEnergyIntegrator()
+    for key in RATIO_INPUTS:
+        integrator.restore(key, 0.0)
+    return integrator, KotiakkuRollingRatios(integrator)
+
+def _feed(integrator, ratios, start, hours, data):
+    for index in range(int(hours * 12)):
+        timestamp = start + STEP * index
+        integrator.advance(timestamp, data)
+        ratios.advance(timestamp)
+
+def test_ratios_over_windows():
+    """Verify the ratios of the last hour and of the whole day."""
+    integrator, ratios = _ratios()
+    # 2 h from the grid only, then 2 h of solar with half of it sold
+    _feed(integrator, ratios, T0, 2, {"house_power_kw": 1.0, "grid_to_house_kw": 1.0})
+    _feed(integrator, ratios, T0 + timedelta(hours=2), 2.1, {
+        "house_power_kw": 1.0, "solar_power_kw": 2.0, "solar_to_grid_kw": 1.0,
+    })
+
+    assert ratios.self_sufficiency("1h") == 100.0
+    assert ratios.self_consumption("1h") == 50.0
+    assert ratios.self_sufficiency("24h") == 50.0
+    assert ratios.self_consumption("24h") == 50.0
+    assert ratios.covered_hours("1h") == 1.0
+    assert ratios.covered_hours("24h") == 4.0
+
+def test_window_keeps_few_samples():
+    """Verify that a window holds about RATIO_WINDOW_SAMPLES samples, however long it runs."""
+    integrator, ratios = _ratios()
+    _feed(integrator, ratios, T0, 24 * 10, {"house_power_kw": 1.0, "grid_to_house_kw": 0.25})
+
+    assert len(ratios._samples["24h"]) <= RATIO_WINDOW_SAMPLES + 1
+    assert len(ratios._samples["1h"]) == 13
+    assert ratios.self_sufficiency("7d") == 75.0
+    assert ratios.covered_hours("24h") == 24.0
+    # Too little solar energy for a ratio
+    assert ratios.self_consumption("30d") is None
+
+def test_state_round_trip():
+    """Verify that the windows continue after a restart."""
+    integrator, ratios = _ratios()
+    _feed(integrator, ratios, T0, 3, {"house_power_kw": 2.0, "grid_to_house_kw": 1.0})
+
+    restarted = KotiakkuEnergyIntegrator()
+    restarted.load(integrator.as_dict())
+    reloaded = KotiakkuRollingRatios(restarted)
+    reloaded.load(ratios.as_dict())
+
+    assert reloaded.self_sufficiency("24h") == 50.0
+    assert reloaded.covered_hours("24h") == ratios.covered_hours("24h")
@@ -0,0 +1,167 @@
+"""Tests for Elisa Kotiakku gap recovery."""
+from datetime import timedelta
+from unittest.mock import patch
+
+import pytest
+
+from homeassistant.util import dt as dt_util
+
+from custom_components.elisa_kotiakku.const import BACKOFF_MAX, MAX_RECOVERY_AGE
+from custom_components.elisa_kotiakku.coordinator import KotiakkuDataUpdateCoordinator
+from custom_components.elisa_kotiakku.derivation import DerivationContext, derive
+from custom_components.elisa_kotiakku.fetcher import async_get_fetch_scheduler
+from custom_components.elisa_kotiakku.integrator import KotiakkuEnergyIntegrator
+from custom_components.elisa_kotiakku.measurement import MeasurementRecord
+from custom_components.elisa_kotiakku.recovery import KotiakkuCheckpoint, integrate_gap
+
+T0 = dt_util.utcnow().replace(second=0, microsecond=0) - timedelta(hours=3)
+
+def _period(minutes, **values):
+    return {"period_start": (T0 + timedelta(minutes=minutes)).isoformat(), **values}
+
+def test_integrate_gap_matches_live_path():
+    """Verify that the vectorized gap integration equals advancing one by one."""
+    raw = [
+        _period(minutes, solar_power_kw=1.0 + minutes / 10, battery_power_kw=-0.5,
+                solar_to_battery_kw=0.6, grid_to_battery_kw=0.1)
+        for minutes in range(0, 65, 5)
+    ]
+    ctx = DerivationContext(battery_capacity=10.0)
+
+    live = KotiakkuEnergyIntegrator()
+    for item in raw:
+        start = dt_util.parse_datetime(item["period_start"])
+        live.advance(start, derive(MeasurementRecord.from_raw(start, item), ctx))
+
+    measurements, totals = integrate_gap(
+        KotiakkuEnergyIntegrator(), ctx, [list(reversed(raw))], T0, T0 + timedelta(hours=1)
+    )
+
+    assert len(measurements) == 13
+    for key, accumulator in live.accumulators.items():
+        assert totals[key] == pytest.approx(accumulator.value), key
+
+def test_checkpoint_round_trip():
+    """Verify that a checkpoint survives the restore state store."""
+    checkpoint = KotiakkuCheckpoint(T0, [(T0 - timedelta(hours=1), T0 - timedelta(minutes=30))])
+
+    assert KotiakkuCheckpoint.from_dict(checkpoint.as_dict()) == checkpoint
+    assert KotiakkuCheckpoint.from_dict({"gaps": [["nonsense", None]]}) is None
+
+async def test_outage_gap_is_recovered(hass, mock_config_entry):
+    """Verify that periods missing between two polls are fetched and integrated."""
+    mock_config_entry.add_to_hass(hass)
+    coordinator = KotiakkuDataUpdateCoordinator(hass, mock_config_entry)
+    scheduler = async_get_fetch_scheduler(hass)
+
+    coordinator.data = coordinator._process_payload(
+        [_period(5, solar_power_kw=1.2), _period(0, solar_power_kw=1.2)]
+    )
+    missed = [_period(minutes, solar_power_kw=1.2) for minutes in range(5, 65, 5)]
+
+    with patch.object(scheduler, "async_fetch_range", return_value=missed) as fetch_range:
+        coordinator._process_payload([_period(60, solar_power_kw=1.2)])
+        await hass.async_block_till_done()
+
+    fetch_range.assert_called_once_with(coordinator, T0 + timedelta(minutes=5), T0 + timedelta(minutes=60))
+    # 55 minutes at 1.2 kW, nothing stretched over the gap by the live path
+    assert coordinator.integrator.accumulators["solar_energy_kwh"].value == pytest.approx(1.1)
+    assert coordinator.recovery.gaps == []
+
+async def test_failed_recovery_is_retried(hass, mock_config_entry, freezer):
+    """Verify that a gap stays queued when the range request fails, and is retried after the backoff."""
+    mock_config_entry.add_to_hass(hass)
+    coordinator = KotiakkuDataUpdateCoordinator(hass, mock_config_entry)
+    scheduler = async_get_fetch_scheduler(hass)
+    coordinator.integrator.advance(T0 + timedelta(hours=1), {})
+
+    with patch.object(scheduler, "async_fetch_range", side_effect=OSError("offline")):
+        coordinator.recovery.async_resume(KotiakkuCheckpoint(T0, []))
+        await hass.async_block_till_done()
+
+    assert coordinator.recovery.gaps == [(T0, T0 + timedelta(hours=1))]
+    # The live polls don't back off for it
+    assert scheduler.retry_delay(coordinator) is None
+
+    with patch.object(scheduler, "async_fetch_range", return_value=[]) as fetch_range:
+        coordinator.recovery.async_retry()
+        await hass.async_block_till_done()
+        fetch_range.assert_not_called()
+
+        freezer.tick(timedelta(seconds=BACKOFF_MAX))
+        coordinator.recovery.async_retry()
+        await hass.async_block_till_done()
+
+    assert coordinator.recovery.gaps == []
+
+async def test_old_gaps_are_given_up(hass, mock_config_entry, freezer):
+    """Verify that a gap is dropped once it is older than MAX_RECOVERY_AGE."""
+    mock_config_entry.add_to_hass(hass)
+    coordinator = KotiakkuDataUpdateCoordinator(hass, mock_config_entry)
+    scheduler = async_get_fetch_scheduler(hass)
+    coordinator.integrator.advance(T0 + timedelta(hours=1), {})
+
+    with patch.object(scheduler, "async_fetch_range", side_effect=OSError("offline")):
+        coordinator.recovery.async_resume(KotiakkuCheckpoint(T0, []))
+        await hass.async_block_till_done()
+
+    # Half of the gap is older than MAX_RECOVERY_AGE, only the rest is requested
+    freezer.tick(timedelta(seconds=MAX_RECOVERY_AGE) - timedelta(hours=2, minutes=30))
+    with patch.object(scheduler, "async_fetch_range", side_effect=OSError("offline")) as fetch_range:
+        coordinator.recovery.async_retry()
+        await hass.async_block_till_done()
+
+    fetch_range.assert_called_once()
+    [(start, end)] = coordinator.recovery.gaps
+    assert end == T0 + timedelta(hours=1)
+    assert start == dt_util.utcnow() - timedelta(seconds=MAX_RECOVERY_AGE)
+
+    freezer.tick(timedelta(seconds=BACKOFF_MAX))
+    with patch.object(scheduler, "async_fetch_range", return_value=[]) as fetch_range:
+        coordinator.recovery.async_retry()
+        await hass.async_block_till_done()
+
+    fetch_range.assert_not_called()
+    assert coordinator.recovery.gaps == []
+
+async def test_gap_expiring_during_recovery_is_kept(hass, mock_config_entry, freezer):
+    """Verify that a gap turning too old while its range is fetched is still recovered."""
+    mock_config_entry.add_to_hass(hass)
+    coordinator = KotiakkuDataUpdateCoordinator(hass, mock_config_entry)
+    scheduler = async_get_fetch_scheduler(hass)
+    coordinator.integrator.advance(T0 + timedelta(hours=1), {})
+    missed = [_period(minutes, solar_power_kw=1.2) for minutes in range(0, 65, 5)]
+
+    async def fetch_range(*args):
+        # A poll trims the expired gaps meanwhile
+        freezer.tick(timedelta(seconds=MAX_RECOVERY_AGE) - timedelta(hours=2, minutes=30))
+        coordinator.recovery.async_retry()
+        return missed
+
+    with patch.object(scheduler, "async_fetch_range", side_effect=fetch_range):
+        coordinator.recovery.async_resume(KotiakkuCheckpoint(T0, []))
+        await hass.async_block_till_done()
+
+    assert coordinator.recovery.gaps == []
+    assert coordinator.recovery.backoff.failures == 0
+    assert coordinator.integrator.accumulators["solar_energy_kwh"].value == pytest.approx(1.2)
+
+async def test_gap_covered_by_history_is_not_fetched(hass, mock_config_entry, tmp_path):
+    """Verify that periods kept in the history file are used without an API call."""
+    mock_config_entry.add_to_hass(hass)
+    coordinator = KotiakkuDataUpdateCoordinator(hass, mock_config_entry)
+    coordinator.history.path = str(tmp_path / "kotiakku.history")
+    await hass.async_add_executor_job(coordinator.history.open)
+    await hass.async_add_executor_job(
+        coordinator.history.append,
+        [(T0 + timedelta(minutes=m), {"solar_power_kw": 0.6}) for m in range(0, 35, 5)],
+    )
+    coordinator.integrator.advance(T0 + timedelta(minutes=30), {})
+
+    with patch.object(async_get_fetch_scheduler(hass), "async_fetch_range") as fetch_range:
+        coordinator.recovery.async_resume(KotiakkuCheckpoint(T0, []))
+        await hass.async_block_till_done()
+
+    fetch_range.assert_not_called()
+    assert coordinator.integrator.accumulators["solar_energy_kwh"].value == pytest.approx(0.3)
+    await coordinator.history.async_close()
@@ -1,6 +1,6 @@
 import pytest
 from datetime import timedelta
-from unittest.mock import MagicMock, patch
+from unittest.mock import patch
 
 from homeassistant.components.sensor import SensorStateClass, SensorDeviceClass
 from homeassistant.const import (
@@ -9,7 +9,6 @@ from homeassistant.const import (
     PERCENTAGE
 )
 from homeassistant.util import dt as dt_util
-from homeassistant.helpers import entity_registry as er
 
 from custom_components.elisa_kotiakku.sensor import (
     KotiakkuEnergySensor,
@@ -20,8 +19,10 @@ from custom_components.elisa_kotiakku.sensor import (
     KotiakkuTimeTargetSensor,
     KotiakkuNetSavingsRateSensor,
     KotiakkuEfficiencySensor,
-    KotiakkuTotalSavingsSensor
+    KotiakkuTotalSavingsSensor,
+    KotiakkuSumEnergySensor,
 )
+from custom_components.elisa_kotiakku.measurement import MeasurementRecord
 
 @pytest.mark.parametrize(
     "sensor_class, key, expected_unit, expected_device_class, expected_state_class",
@@ -36,10 +37,7 @@ async def test_sensor_metadata(
     sensor_class, key, expected_unit, expected_device_class, expected_state_class
 ):
     """Test that all sensor types have the correct metadata and classes."""
-    if sensor_class == KotiakkuEnergySensor:
-        sensor = sensor_class(mock_coordinator, key, "solar_power_kw", "Test", "test", mock_config_entry)
-    else:
-        sensor = sensor_class(mock_coordinator, key, "Test", "test", mock_config_entry)
+    sensor = sensor_class(mock_coordinator, key, "Test", "test", mock_config_entry)
 
     assert sensor.device_class == expected_device_class
     assert sensor.state_class == expected_state_class
@@ -63,100 +61,169 @@ async def test_battery_state_logic(hass, mock_coordinator, mock_config_entry):
     assert sensor.native_value == "idle"
 
 async def test_cycle_counter_math(hass, mock_coordinator, mock_config_entry):
-    """Test cycle count calculation using Registry lookup."""
-    registry = er.async_get(hass)
-    entry_id = mock_config_entry.entry_id
-    
-    # Mock the source discharge energy sensor
-    registry.async_get_or_create(
-        "sensor", "elisa_kotiakku", f"{entry_id}_total_battery_discharge_kwh",
-        suggested_object_id="test_total_battery_discharge_kwh"
-    )
-    hass.states.async_set("sensor.test_total_battery_discharge_kwh", "25.0")
+    """Test cycle count calculation from the discharge accumulator."""
+    mock_coordinator.integrator.restore("total_battery_discharge_kwh", 25.0)
 
     # 10kWh capacity
     sensor = KotiakkuCycleCounterSensor(
         mock_coordinator, "battery_cycle_count", "total_battery_discharge_kwh", 10.0, "Test", "test", mock_config_entry
     )
-    sensor.hass = hass
-    sensor._entry_id = entry_id # Match the manual ID setup in your sensor.py
 
     # 25kWh / 10kWh = 2 cycles (it returns int)
     assert sensor.native_value == 2
 
+async def test_cycle_counter_waits_for_restore(hass, mock_coordinator, mock_config_entry):
+    """Test that no cycle count is reported before the total is restored."""
+    sensor = KotiakkuCycleCounterSensor(
+        mock_coordinator, "battery_cycle_count", "total_battery_discharge_kwh", 10.0, "Test", "test", mock_config_entry
+    )
+
+    assert sensor.native_value is None
+
 async def test_efficiency_clamping(hass, mock_coordinator, mock_config_entry):
     """Test efficiency calculation and 100% clamping."""
-    registry = er.async_get(hass)
-    entry_id = mock_config_entry.entry_id
-    
-    registry.async_get_or_create("sensor", "elisa_kotiakku", f"{entry_id}_charge", suggested_object_id="t_charge")
-    registry.async_get_or_create("sensor", "elisa_kotiakku", f"{entry_id}_discharge", suggested_object_id="t_discharge")
+    integrator = mock_coordinator.integrator
 
-    sensor = KotiakkuEfficiencySensor(mock_coordinator, "eff", "discharge", "charge", "Test", "test", mock_config_entry)
-    sensor.hass = hass
+    sensor = KotiakkuEfficiencySensor(
+        mock_coordinator, "eff", "total_battery_discharge_kwh", "total_battery_charge_kwh", "Test", "test", mock_config_entry
+    )
 
     # Scenario: 11kWh discharged for 10kWh charged (Impossible 110%)
-    hass.states.async_set("sensor.t_charge", "10.0")
-    hass.states.async_set("sensor.t_discharge", "11.0")
+    integrator.restore("total_battery_charge_kwh", 10.0)
+    integrator.restore("total_battery_discharge_kwh", 11.0)
 
     assert sensor.native_value == 100.0
 
-async def test_energy_sensor_riemann_sum(hass, mock_coordinator, mock_config_entry, freezer):
-    """Test energy accumulation (Power * Time)."""
+async def test_sum_energy_sensor(hass, mock_coordinator, mock_config_entry):
+    """Test that the sum sensor adds up its source accumulators."""
+    integrator = mock_coordinator.integrator
+    integrator.restore("grid_to_house_kwh", 1.5)
+    integrator.restore("grid_to_battery_kwh", 2.25)
+
+    sensor = KotiakkuSumEnergySensor(
+        mock_coordinator, "total_grid_import_kwh", ["grid_to_house_kwh", "grid_to_battery_kwh"], "Test", "test", mock_config_entry
+    )
+
+    assert sensor.native_value == 3.75
+
+async def test_energy_sensor_reads_integrator(hass, mock_coordinator, mock_config_entry):
+    """Test that the energy sensor presents the integrator's running total."""
     now = dt_util.utcnow()
-    freezer.move_to(now)
-    
-    mock_coordinator.data = {"solar_power_kw": 2.0}
+    integrator = mock_coordinator.integrator
     
     sensor = KotiakkuEnergySensor(
-        mock_coordinator, "solar_energy_kwh", "solar_power_kw", "Test", "test", mock_config_entry
+        mock_coordinator, "solar_energy_kwh", "Test", "test", mock_config_entry
     )
-    sensor.hass = hass
-    sensor.platform = MagicMock()  # <--- Add this line to bypass the ValueError
     sensor._restored = True
-    sensor._state = 10.0
-    sensor._last_run = now
+    integrator.restore("solar_energy_kwh", 10.0)
 
-    # Move 30 mins (0.5h) -> 10.0 + (2kW * 0.5h) = 11.0
-    future = now + timedelta(minutes=30)
-    freezer.move_to(future)
-    
-    sensor._handle_coordinator_update()
+    # 2 kW for 30 mins (0.5h) -> 10.0 + (2kW * 0.5h) = 11.0
+    integrator.advance(now, {"solar_power_kw": 2.0})
+    integrator.advance(now + timedelta(minutes=30), {"solar_power_kw": 0.0})
 
     assert sensor.native_value == 11.0
     
-async def test_total_savings_riemann_sum(hass, mock_coordinator, mock_config_entry, freezer):
-    """Test currency accumulation (Savings Rate * Time)."""
+async def test_total_savings_reads_integrator(hass, mock_coordinator, mock_config_entry):
+    """Test that the savings sensor presents the integrated savings rate."""
     now = dt_util.utcnow()
-    freezer.move_to(now)
-    
-    # 2.0 €/h savings rate
-    mock_coordinator.data = {"net_savings_rate": 2.0}
+    integrator = mock_coordinator.integrator
     
     sensor = KotiakkuTotalSavingsSensor(
-        mock_coordinator, "total_savings_eur", "net_savings_rate", "Test", "test", mock_config_entry
+        mock_coordinator, "total_savings_eur", "Test", "test", mock_config_entry
     )
-    sensor.hass = hass
-    sensor.platform = MagicMock()  # <--- Add this line to bypass the ValueError
     sensor._restored = True
-    sensor._state = 5.0
-    sensor._last_run = now
+    integrator.restore("total_savings_eur", 5.0)
 
-    # Move 1 hour -> 5.0 + (2.0€/h * 1h) = 7.0
-    future = now + timedelta(hours=1)
-    freezer.move_to(future)
-    
-    sensor._handle_coordinator_update()
+    # 2.0 €/h for 1 hour -> 5.0 + (2.0€/h * 1h) = 7.0
+    integrator.advance(now, {"net_savings_rate": 2.0})
+    integrator.advance(now + timedelta(hours=1), {"net_savings_rate": 2.0})
 
     assert sensor.native_value == 7.0
 
-async def test_power_sensor_display_passthrough(hass, mock_coordinator, mock_config_entry):
-    """Test that power sensors show the coordinator's prepared display value."""
-    # Your code looks for 'key_display' in coordinator data
-    mock_coordinator.data = {"solar_power_kw_display": 1234}
+async def test_power_sensor_reads_record(hass, mock_coordinator, mock_config_entry):
+    """Test that power sensors report kW and leave the display unit to HA."""
+    mock_coordinator.data = MeasurementRecord.from_raw(None, {"solar_power_kw": 1.234})
+    
+    sensor = KotiakkuPowerSensor(
+        mock_coordinator, "solar_power_kw", "Test", "test", mock_config_entry
+    )
+    
+    assert sensor.native_value == 1.234
+    assert sensor.native_unit_of_measurement == UnitOfPower.KILO_WATT
+    assert sensor.suggested_unit_of_measurement == sensor._unit_pref
+
+async def test_power_sensor_missing_value(hass, mock_coordinator, mock_config_entry):
+    """Test that a field missing from the measurement reads as unknown."""
+    mock_coordinator.data = MeasurementRecord.from_raw(None, {})
     
     sensor = KotiakkuPowerSensor(
         mock_coordinator, "solar_power_kw", "Test", "test", mock_config_entry
     )
     
-    assert sensor.native_value == 1234
\ No newline at end of file
+    assert sensor.native_value is None
+
+async def test_state_writes_within_deadband_are_suppressed(hass, mock_coordinator, mock_config_entry, freezer):
+    """Test that small changes are not written until they add up or the heartbeat is due."""
+    from homeassistant.helpers.entity import Entity
+    from custom_components.elisa_kotiakku.const import DEADBAND_POWER, STATE_HEARTBEAT
+
+    mock_coordinator.last_update_success = True
+    sensor = KotiakkuPowerSensor(mock_coordinator, "solar_power_kw", "Test", "test", mock_config_entry)
+
+    def update(value):
+        mock_coordinator.data = MeasurementRecord.from_raw(None, {"solar_power_kw": value})
+        sensor._handle_coordinator_update()
+
+    with patch.object(Entity, "async_write_ha_state") as write:
+        update(1.0)
+        update(1.0 + DEADBAND_POWER / 2)
+        assert write.call_count == 1
+
+        # Measured from the value written, so slow drift is written eventually
+        update(1.0 + DEADBAND_POWER * 1.5)
+        assert write.call_count == 2
+
+        freezer.tick(timedelta(seconds=STATE_HEARTBEAT))
+        update(1.0 + DEADBAND_POWER * 1.5)
+        assert write.call_count == 3
+
+        # Availability is always written
+        mock_coordinator.last_update_success = False
+        update(1.0 + DEADBAND_POWER * 1.5)
+        assert write.call_count == 4
+
+async def test_period_meter_writes_within_deadband_are_suppressed(hass, mock_coordinator, mock_config_entry):
+    """Test that a period meter skips small changes, but always writes a new period."""
+    from datetime import datetime, timezone
+    from homeassistant.helpers.entity import Entity
+    from custom_components.elisa_kotiakku.const import DEADBAND_ENERGY
+    from custom_components.elisa_kotiakku.meters import PERIOD_DAILY, KotiakkuPeriodMeters
+    from custom_components.elisa_kotiakku.sensor import KotiakkuPeriodMeterSensor
+
+    mock_coordinator.last_update_success = True
+    integrator = mock_coordinator.integrator
+    integrator.restore("solar_energy_kwh", 0.0)
+    mock_coordinator.meters = KotiakkuPeriodMeters(integrator)
+    sensor = KotiakkuPeriodMeterSensor(
+        mock_coordinator, "solar_energy_kwh", PERIOD_DAILY, "Test", "test", mock_config_entry
+    )
+    accumulator = integrator.accumulators["solar_energy_kwh"]
+    day = datetime(2026, 1, 10, 12, 0, tzinfo=timezone.utc)
+
+    def update(timestamp, energy):
+        accumulator.value += energy
+        mock_coordinator.meters.advance(timestamp)
+        sensor._handle_coordinator_update()
+
+    with patch.object(Entity, "async_write_ha_state") as write:
+        update(day, 1.0)
+        update(day + timedelta(minutes=5), DEADBAND_ENERGY / 2)
+        assert write.call_count == 1
+
+        update(day + timedelta(minutes=10), DEADBAND_ENERGY)
+        assert write.call_count == 2
+
+        # The next day starts at 0, written even though it hardly changed
+        update(day + timedelta(days=1), 0.0)
+        assert sensor.native_value == 0.0
+        assert write.call_count == 3
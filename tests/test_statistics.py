@@ -0,0 +1,115 @@
+"""Tests for Elisa Kotiakku long-term statistics import."""
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+from custom_components.elisa_kotiakku.statistics import KotiakkuStatisticsImporter
+
+PATCH_TARGET = "custom_components.elisa_kotiakku.statistics.async_add_external_statistics"
+
+def _period(hour, minute, solar):
+    return (datetime(2026, 1, 1, hour, minute, tzinfo=timezone.utc), {"solar_power_kw": solar})
+
+def _imported(mock_import, statistic_id):
+    """Return the statistics of every import call for statistic_id."""
+    return [
+        call.args[2] for call in mock_import.call_args_list
+        if call.args[1]["statistic_id"] == statistic_id
+    ]
+
+async def test_hourly_buckets_imported_in_bulk(hass):
+    """Verify that all periods end up in one bulk call per field."""
+    hass.config.components.add("recorder")
+    importer = KotiakkuStatisticsImporter(hass, "kotiakku", "Kotiakku")
+
+    with patch(PATCH_TARGET) as mock_import:
+        importer.async_add_measurements([
+            _period(9, 50, 1.0),
+            _period(10, 0, 2.0),
+            _period(10, 5, 4.0),
+        ])
+
+    # Only solar power is present, so one call for its mean and one for its energy
+    assert mock_import.call_count == 2
+    (statistics,) = _imported(mock_import, "elisa_kotiakku:kotiakku_solar_power_kw")
+    assert [s["start"].hour for s in statistics] == [9, 10]
+    assert statistics[1]["mean"] == 3.0
+    assert statistics[1]["min"] == 2.0
+    assert statistics[1]["max"] == 4.0
+
+async def test_overlapping_lists_not_counted_twice(hass):
+    """Verify that periods already folded in are skipped on the next poll."""
+    hass.config.components.add("recorder")
+    importer = KotiakkuStatisticsImporter(hass, "kotiakku", "Kotiakku")
+
+    with patch(PATCH_TARGET) as mock_import:
+        importer.async_add_measurements([_period(10, 0, 2.0)])
+        importer.async_add_measurements([_period(10, 0, 2.0), _period(10, 5, 4.0)])
+        importer.async_add_measurements([_period(10, 5, 4.0)])
+
+    assert mock_import.call_count == 4
+    statistics = _imported(mock_import, "elisa_kotiakku:kotiakku_solar_power_kw")[-1]
+    assert statistics[0]["mean"] == 3.0
+
+async def test_no_import_without_recorder(hass):
+    """Verify that nothing is imported when the recorder is not loaded."""
+    importer = KotiakkuStatisticsImporter(hass, "kotiakku", "Kotiakku")
+
+    with patch(PATCH_TARGET) as mock_import:
+        importer.async_add_measurements([_period(10, 0, 2.0)])
+
+    mock_import.assert_not_called()
+
+async def test_energy_sums_follow_late_periods(hass):
+    """Verify that a late period updates its own hour and the running sums after it only."""
+    hass.config.components.add("recorder")
+    importer = KotiakkuStatisticsImporter(hass, "kotiakku", "Kotiakku")
+    energy_id = "elisa_kotiakku:kotiakku_solar_energy_kwh"
+
+    with patch(PATCH_TARGET) as mock_import:
+        # 5 minute periods: 12 kW for 5 minutes is 1 kWh
+        importer.async_add_measurements([_period(8, 0, 12.0), _period(9, 0, 12.0), _period(10, 0, 12.0)])
+        assert [s["sum"] for s in _imported(mock_import, energy_id)[-1]] == [1.0, 2.0, 3.0]
+
+        mock_import.reset_mock()
+        importer.async_add_measurements([_period(9, 30, 24.0)])
+
+    (means,) = _imported(mock_import, "elisa_kotiakku:kotiakku_solar_power_kw")
+    assert [(s["start"].hour, s["mean"]) for s in means] == [(9, 18.0)]
+    (sums,) = _imported(mock_import, energy_id)
+    assert [(s["start"].hour, s["sum"]) for s in sums] == [(9, 4.0), (10, 5.0)]
+
+async def test_buckets_survive_restart(hass):
+    """Verify that a restored importer neither counts a period twice nor restarts the sums."""
+    hass.config.components.add("recorder")
+    importer = KotiakkuStatisticsImporter(hass, "kotiakku", "Kotiakku")
+    with patch(PATCH_TARGET):
+        importer.async_add_measurements([_period(9, 0, 12.0), _period(10, 0, 12.0)])
+
+    restored = KotiakkuStatisticsImporter(hass, "kotiakku", "Kotiakku")
+    restored.load(importer.as_dict())
+    with patch(PATCH_TARGET) as mock_import:
+        restored.async_add_measurements([_period(10, 0, 12.0), _period(10, 5, 0.0)])
+
+    (means,) = _imported(mock_import, "elisa_kotiakku:kotiakku_solar_power_kw")
+    assert means[0]["mean"] == 6.0
+    (sums,) = _imported(mock_import, "elisa_kotiakku:kotiakku_solar_energy_kwh")
+    assert sums[0]["sum"] == 2.0
+
+async def test_hours_outside_window_are_closed(hass):
+    """Verify that hours dropped from the window keep their energy but take no more periods."""
+    from datetime import timedelta
+    from custom_components.elisa_kotiakku.const import STATISTICS_WINDOW
+
+    hass.config.components.add("recorder")
+    importer = KotiakkuStatisticsImporter(hass, "kotiakku", "Kotiakku")
+    first = _period(0, 0, 12.0)
+    later = (first[0] + timedelta(hours=STATISTICS_WINDOW + 1), {"solar_power_kw": 12.0})
+
+    with patch(PATCH_TARGET) as mock_import:
+        importer.async_add_measurements([first, later])
+        mock_import.reset_mock()
+        importer.async_add_measurements([_period(0, 5, 12.0)])
+
+    mock_import.assert_not_called()
+    assert len(importer.as_dict()["hours"]) == 1
+    assert importer.as_dict()["sums"]["solar_energy_kwh"] == 1.0
@@ -0,0 +1,49 @@
+"""Tests for the Elisa Kotiakku electricity tariff."""
+from datetime import datetime, timezone
+
+import numpy as np
+import pytest
+
+from homeassistant.util import dt as dt_util
+
+from custom_components.elisa_kotiakku.derivation import DerivationContext, derive, derive_columns
+from custom_components.elisa_kotiakku.measurement import MeasurementRecord
+from custom_components.elisa_kotiakku.tariff import KotiakkuTariff, tariff_slot
+
+TARIFF = KotiakkuTariff(
+    margin=0.5, transfer_day=4.0, transfer_night=2.0, tax=2.0, vat=25.0, weekend_night=True
+)
+
+def test_slots_follow_local_time(hass):
+    """Verify the tariff slot of weekday and weekend hours in the local time zone."""
+    dt_util.set_default_time_zone(dt_util.get_time_zone("Europe/Helsinki"))
+    # Friday 22:30 UTC is Saturday 00:30 in Helsinki
+    assert tariff_slot(datetime(2026, 1, 2, 22, 30, tzinfo=timezone.utc)) == 24
+    assert tariff_slot(datetime(2026, 1, 2, 10, 0, tzinfo=timezone.utc)) == 12
+
+def test_table_prices_every_slot():
+    """Verify the fixed components of day, night and weekend hours, with VAT."""
+    assert TARIFF.table[12] == pytest.approx((0.5 + 4.0 + 2.0) * 1.25)
+    assert TARIFF.table[3] == pytest.approx((0.5 + 2.0 + 2.0) * 1.25)
+    assert TARIFF.table[24 + 12] == TARIFF.table[3]
+    assert KotiakkuTariff(transfer_day=4.0).table[24 + 12] == 4.0
+
+def test_savings_use_the_tariff():
+    """Verify that costs and savings are priced by the tariff, live and vectorized alike."""
+    ctx = DerivationContext(battery_capacity=10.0, tariff=TARIFF)
+    raw = {"grid_to_house_kw": 1.0, "battery_to_house_kw": 2.0, "solar_to_grid_kw": 1.0,
+           "spot_price_cents_per_kwh": 8.0}
+    start = datetime(2026, 1, 5, 10, 0, tzinfo=timezone.utc)
+
+    record = derive(MeasurementRecord.from_raw(start, raw), ctx)
+    price = 8.0 * 1.25 + TARIFF.table[tariff_slot(start)]
+    assert record["import_price_cents_per_kwh"] == pytest.approx(price)
+    assert record["net_savings_rate"] == pytest.approx(2.0 * price / 100)
+    assert record["grid_to_house_cost_rate"] == pytest.approx(price / 100)
+    assert record["solar_to_grid_value_rate"] == pytest.approx(0.08)
+
+    columns = derive_columns(
+        {**{key: np.array([value]) for key, value in raw.items()}, "tariff_slot": [tariff_slot(start)]}, ctx
+    )
+    for key in ("import_price_cents_per_kwh", "net_savings_rate", "grid_to_house_cost_rate"):
+        assert columns[key][0] == pytest.approx(record[key])
@@ -0,0 +1,110 @@
+"""Tests for the Elisa Kotiakku update timings."""
+import re
+from unittest.mock import patch
+
+import pytest
+from aioresponses import aioresponses
+
+from homeassistant.helpers import entity_registry as er
+from homeassistant.helpers.entity import EntityCategory
+
+from custom_components.elisa_kotiakku.const import DOMAIN
+from custom_components.elisa_kotiakku.timing import (
+    DURATION_BUCKETS,
+    KotiakkuFetchTrace,
+    KotiakkuHistogram,
+    KotiakkuUpdateTimings,
+)
+
+def test_histogram_percentiles():
+    """Verify that percentiles land on the bucket edge just above the value."""
+    histogram = KotiakkuHistogram(*DURATION_BUCKETS)
+    assert histogram.percentile(0.5) is None
+
+    for value in [1.0] * 90 + [100.0] * 10:
+        histogram.add(value)
+
+    smallest, factor, _ = DURATION_BUCKETS
+    p50, p95 = histogram.percentile(0.5), histogram.percentile(0.95)
+    assert 1.0 <= p50 < 1.0 * factor
+    assert 100.0 <= p95 < 100.0 * factor
+    assert histogram.as_dict()["mean"] == pytest.approx(10.9)
+
+def test_histogram_has_fixed_size():
+    """Verify that values beyond the largest edge are counted in the last bucket."""
+    histogram = KotiakkuHistogram(*DURATION_BUCKETS)
+    histogram.add(1e9)
+    histogram.add(0.0)
+
+    assert len(histogram.counts) == DURATION_BUCKETS[2]
+    assert histogram.counts[0] == histogram.counts[-1] == 1
+    assert histogram.percentile(1.0) == histogram.edges[-1]
+
+def test_state_writes_counted_during_updates_only():
+    """Verify that only state writes between begin and finish count, and listeners run on finish."""
+    timings = KotiakkuUpdateTimings()
+    finished = []
+    remove = timings.async_add_listener(lambda: finished.append(timings.last_update))
+
+    timings.count_state_write("solar_power_kw")
+    timings.async_begin("poll")
+    timings.count_state_write("solar_power_kw")
+    timings.count_state_write("house_power_kw")
+    trace = KotiakkuFetchTrace()
+    trace.start()
+    trace.body, trace.bytes = 2.0, 1234
+    trace.finish()
+    timings.add_fetch(trace)
+    timings.async_finish()
+
+    assert timings.last_state_writes == 2
+    assert timings.state_writes == {"solar_power_kw": 1, "house_power_kw": 1}
+    assert timings.last == {"body": 2.0}
+    assert timings.last_payload_bytes == 1234
+    assert timings.fetch.count == 1
+    assert finished == [timings.last_update]
+
+    remove()
+    timings.async_begin("poll")
+    timings.async_finish()
+    assert len(finished) == 1
+
+async def test_updates_are_timed(hass, mock_config_entry):
+    """Verify the phases recorded by a setup and the disabled diagnostic sensors."""
+    mock_config_entry.add_to_hass(hass)
+    first = [{"period_start": "2026-01-01T10:00:00+00:00", "battery_power_kw": 1.0}]
+    second = [{"period_start": "2026-01-01T10:05:00+00:00", "battery_power_kw": 2.0}]
+
+    # Refreshes after the first one are jittered
+    with aioresponses() as m, patch("custom_components.elisa_kotiakku.fetcher.FETCH_JITTER", 0):
+        m.get(re.compile(r".*"), status=200, payload=first)
+        m.get(re.compile(r".*"), status=200, payload=second, repeat=True)
+        await hass.config_entries.async_setup(mock_config_entry.entry_id)
+        await hass.async_block_till_done()
+
+        coordinator = hass.data[DOMAIN][mock_config_entry.entry_id]
+        timings = coordinator.timings
+        assert {"body", "decode", "derive"} <= set(timings.last)
+        assert timings.fetch.count == timings.update.count == 1
+
+        await coordinator.async_refresh()
+        assert {"body", "decode", "derive", "fan_out"} <= set(timings.last)
+        assert timings.last_payload_bytes > 0
+        # Every enabled entity was written once
+        assert timings.last_state_writes > 0
+        assert set(timings.state_writes.values()) == {1}
+
+        # An unchanged period is timed too, without any state writes
+        await coordinator.async_refresh()
+        assert coordinator.skipped_updates == 1
+        assert timings.update.count == 3
+        assert timings.last_state_writes == 0
+        assert "fan_out" not in timings.last
+
+    entity = er.async_get(hass).async_get("sensor.kotiakku_fetch_latency_p95_ms")
+    assert entity.disabled_by is er.RegistryEntryDisabler.INTEGRATION
+    assert entity.entity_category is EntityCategory.DIAGNOSTIC
+    assert hass.states.get("sensor.kotiakku_skipped_updates") is None
+
+    await hass.config_entries.async_unload(mock_config_entry.entry_id)
+    await hass.async_block_till_done()